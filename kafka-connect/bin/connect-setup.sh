@@ -1,11 +1,9 @@
 #!/bin/sh
 echo "Kafka Connect started. Registering Debezium connector..."
 
-printf "Registering Debezium connector...\n"
-curl -X POST -H "Accept: application/json" -H "Content-Type: application/json" http://connect:8083/connectors/ -d @/kafka-connect/bin/debezium-source.json
-printf "Debezium connector registered.\n\n"
-
+# debezium-source-unwrapped.json streams flattened rows instead of the full envelopes
+CONNECTOR_CONFIG="${CONNECTOR_CONFIG:-debezium-source.json}"
 
-printf "Registering Elasticsearch Sink connector...\n"
-curl -X POST -H "Accept: application/json" -H "Content-Type: application/json" http://connect:8083/connectors/ -d @/kafka-connect/bin/elasticsearch-sink.json
-printf "Elasticsearch Sink connector registered.\n\n"
+printf "Registering Debezium connector with %s...\n" "$CONNECTOR_CONFIG"
+curl -X POST -H "Accept: application/json" -H "Content-Type: application/json" http://connect:8083/connectors/ -d @/kafka-connect/bin/$CONNECTOR_CONFIG
+printf "Debezium connector registered.\n\n"
@@ -0,0 +1,50 @@
+import logging
+from typing import Callable
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from src.domain.video_repository import VideoRepository
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteVideoInput(BaseModel):
+    id: UUID
+    # Version of the deletion, an older one than the saved video is ignored by the repository
+    version: int | None = None
+
+
+class DeleteVideo:
+    def __init__(
+        self,
+        repository: VideoRepository,
+        invalidations: list[Callable[[UUID], None]] | None = None,
+    ) -> None:
+        """
+        :param repository: Video repository
+        :param invalidations: Called with the id of each deleted video, e.g. to evict it from read caches
+        """
+        self._repository = repository
+        self._invalidations = invalidations or []
+
+    def execute(self, input: DeleteVideoInput) -> None:
+        logger.info(f"Deleting video with id: {input.id}")
+        self._repository.delete(input.id, version=input.version)
+        self._invalidate([input.id])
+        logger.info(f"Video with id {input.id} deleted")
+
+    def execute_many(self, inputs: list[DeleteVideoInput]) -> None:
+        """Deletes the videos with a single repository write."""
+        logger.info(f"Deleting {len(inputs)} videos")
+        self._repository.delete_many(
+            [input.id for input in inputs],
+            versions={input.id: input.version for input in inputs if input.version is not None},
+        )
+        self._invalidate([input.id for input in inputs])
+        logger.info(f"{len(inputs)} videos deleted")
+
+    def _invalidate(self, ids: list[UUID]) -> None:
+        for invalidate in self._invalidations:
+            for id in ids:
+                invalidate(id)
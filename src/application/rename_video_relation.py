@@ -0,0 +1,26 @@
+import logging
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from src.domain.video_repository import VideoRepository
+
+logger = logging.getLogger(__name__)
+
+
+class RenameVideoRelationInput(BaseModel):
+    # Relation field of the videos: categories, genres or cast_members
+    field: str
+    id: UUID
+    name: str
+    # Version of the rename, an older one than the name saved in a video is ignored
+    version: int | None = None
+
+
+class RenameVideoRelation:
+    def __init__(self, repository: VideoRepository) -> None:
+        self._repository = repository
+
+    def execute(self, input: RenameVideoRelationInput) -> None:
+        logger.info(f"Renaming {input.field} {input.id} to {input.name!r} in its videos")
+        self._repository.rename_relation(input.field, input.id, input.name, version=input.version)
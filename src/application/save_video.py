@@ -6,7 +6,6 @@ from pydantic import BaseModel
 
 from src.domain.video import Rating, Video
 from src.domain.video_repository import VideoRepository
-from src.infra.codeflix_client.codeflix_client import CodeflixClient
 
 logger = logging.getLogger(__name__)
 
@@ -19,29 +18,46 @@ class SaveVideoInput(BaseModel):
     created_at: datetime
     updated_at: datetime
     is_active: bool
+    # Version of the change being saved, stale ones are ignored by the repository
+    version: int | None = None
 
 
 class SaveVideo:
-    def __init__(self, repository: VideoRepository, codeflix_client: CodeflixClient) -> None:
+    """
+    Saves the fields of the video row. Its categories, genres, cast members and banner are kept:
+    they are streamed from their own tables, see `UpdateVideoRelations`.
+    """
+
+    def __init__(self, repository: VideoRepository) -> None:
         self._repository = repository
-        self._codeflix_client = codeflix_client
 
     def execute(self, input: SaveVideoInput) -> None:
         logger.info(f"Saving video with id: {input.id}")
-
-        http_data = self._codeflix_client.get_video(id=input.id)
-        categories = {UUID(category["id"]) for category in http_data.categories}
-        cast_members = {UUID(cast_member["id"]) for cast_member in http_data.cast_members}
-        genres = {UUID(genre["id"]) for genre in http_data.genres}
-        banner_url = http_data.banner["raw_location"]
-
-        video = Video(
-            **input.model_dump(mode="python"),
-            categories=categories,
-            cast_members=cast_members,
-            genres=genres,
-            banner_url=banner_url,
+        self._repository.save(self._build_video(input), version=input.version)
+        logger.info(f"Video with id {input.id} saved")
+
+    def execute_many(self, inputs: list[SaveVideoInput]) -> None:
+        """Saves the videos with a single repository write, e.g. while loading a snapshot."""
+        logger.info(f"Saving {len(inputs)} videos")
+        self._repository.save_many(
+            [self._build_video(input) for input in inputs],
+            versions={input.id: input.version for input in inputs if input.version is not None},
+        )
+        logger.info(f"{len(inputs)} videos saved")
+
+    def execute_partial_many(self, updates: list[tuple[SaveVideoInput, frozenset[str]]]) -> None:
+        """
+        Writes only the given fields of the videos, with a single repository write. A video that is not saved
+        yet, or only holds the relations streamed before its row, is saved whole instead.
+        """
+        logger.info(f"Updating {len(updates)} videos")
+        self._repository.update_many(
+            {input.id: input.model_dump(mode="json", include=set(fields) | {"updated_at"}) for input, fields in updates},
+            versions={input.id: input.version for input, _ in updates if input.version is not None},
+            videos={input.id: self._build_video(input) for input, _ in updates},
         )
+        logger.info(f"{len(updates)} videos updated")
 
-        self._repository.save(video)
-        logger.info(f"Video with id {input.id} saved")
\ No newline at end of file
+    @staticmethod
+    def _build_video(input: SaveVideoInput) -> Video:
+        return Video(**input.model_dump(mode="python", exclude={"version"}))
@@ -0,0 +1,17 @@
+import logging
+
+from src.domain.video_relation import VideoRelationChange
+from src.domain.video_repository import VideoRepository
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateVideoRelations:
+    def __init__(self, repository: VideoRepository) -> None:
+        self._repository = repository
+
+    def execute_many(self, changes: list[VideoRelationChange]) -> None:
+        """Applies the changes in order, with a single repository write."""
+        logger.info(f"Applying {len(changes)} video relation changes")
+        self._repository.update_relations(changes)
+        logger.info(f"{len(changes)} video relation changes applied")
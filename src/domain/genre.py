@@ -1,8 +1,16 @@
 from uuid import UUID
 
+from pydantic import BaseModel
+
 from src.domain.entity import Entity
 
 
 class Genre(Entity):
     name: str
-    categories: set[UUID]
\ No newline at end of file
+    categories: set[UUID]
+
+
+class GenreCategory(BaseModel):
+    """Row of the table linking a genre to one of its categories."""
+    genre_id: UUID
+    category_id: UUID
@@ -1,7 +1,7 @@
 from enum import StrEnum
 from uuid import UUID
 
-from pydantic import HttpUrl
+from pydantic import Field, HttpUrl
 
 from src.domain.entity import Entity
 
@@ -20,9 +20,10 @@ class Video(Entity):
     title: str
     launch_year: int
     rating: Rating
-    categories: set[UUID]
-    genres: set[UUID]
-    cast_members: set[UUID]
-    banner_url: HttpUrl
+    # Filled from the relation tables, whose changes may arrive before or after the video row
+    categories: set[UUID] = Field(default_factory=set)
+    genres: set[UUID] = Field(default_factory=set)
+    cast_members: set[UUID] = Field(default_factory=set)
+    banner_url: HttpUrl | None = None
     # TODO: other relevant attributes if we want to
     # Also, categories, genres, cast_members could be nested objects instead of UUIDs
\ No newline at end of file
@@ -0,0 +1,67 @@
+from typing import ClassVar
+from uuid import UUID
+
+from pydantic import BaseModel, HttpUrl
+
+
+class VideoRelation(BaseModel):
+    """Row of a table a video is enriched from, e.g. the link between a video and one of its categories."""
+    video_id: UUID
+
+    # Field of the video made of the rows of the table, and the column holding the value of each row
+    video_field: ClassVar[str]
+    value_column: ClassVar[str]
+    # Whether the video has a set of values, one per row, or a single one
+    multiple: ClassVar[bool] = True
+    # Table of the entity the value is the id of, whose name is copied into the video
+    related_table: ClassVar[str | None] = None
+
+    @property
+    def value(self) -> str:
+        return str(getattr(self, self.value_column))
+
+
+class VideoCategory(VideoRelation):
+    category_id: UUID
+
+    video_field = "categories"
+    value_column = "category_id"
+    related_table = "categories"
+
+
+class VideoGenre(VideoRelation):
+    genre_id: UUID
+
+    video_field = "genres"
+    value_column = "genre_id"
+    related_table = "genres"
+
+
+class VideoCastMember(VideoRelation):
+    cast_member_id: UUID
+
+    video_field = "cast_members"
+    value_column = "cast_member_id"
+    related_table = "cast_members"
+
+
+class VideoBanner(VideoRelation):
+    name: str
+    raw_location: HttpUrl
+
+    video_field = "banner_url"
+    value_column = "raw_location"
+    multiple = False
+
+
+class VideoRelationChange(BaseModel):
+    """A value linked to or unlinked from a field of a video."""
+    video_id: UUID
+    field: str
+    value: str
+    linked: bool
+    multiple: bool = True
+    # Name of the entity the value is the id of, when known
+    name: str | None = None
+    # Version of the row change, a stale one is ignored by the repository
+    version: int | None = None
@@ -1,10 +1,65 @@
 from abc import ABC, abstractmethod
+from uuid import UUID
 
 from src.domain.repository import Repository
 from src.domain.video import Video
+from src.domain.video_relation import VideoRelationChange
 
 
 class VideoRepository(Repository[Video], ABC):
+    """
+    Writes accept the version of the change they come from: a write older than
+    what is already saved for the video is ignored, so events can be replayed safely.
+
+    The fields of the video row and its relations (categories, genres, cast members, banner) come from
+    different tables: saving a video keeps its relations, which are written by `update_relations`.
+    """
+
+    @abstractmethod
+    def save(self, video: Video, version: int | None = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_many(self, videos: list[Video], versions: dict[UUID, int] | None = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_relations(self, changes: list[VideoRelationChange]) -> None:
+        """Links or unlinks values of the relation fields of videos, in order, whether the videos are saved or not."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rename_relation(self, field: str, id: UUID, name: str, version: int | None = None) -> None:
+        """
+        Rewrites the name of a category, genre or cast member in every video it is linked to. Runs in the
+        background: thousands of videos can be linked to it.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, id: UUID, fields: dict, version: int | None = None) -> bool:
+        """Updates some fields of a saved video. Returns False if there is no such video."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_many(
+        self,
+        updates: dict[UUID, dict],
+        versions: dict[UUID, int] | None = None,
+        videos: dict[UUID, Video] | None = None,
+    ) -> set[UUID]:
+        """
+        Updates some fields of each video. Returns the ids of the videos that are not saved.
+
+        A video given in `videos` is saved whole instead when it is not saved yet, or only holds the relations
+        streamed before its row: it is never missing from the result.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, id: UUID, version: int | None = None) -> None:
+        raise NotImplementedError
+
     @abstractmethod
-    def save(self, video: Video) -> None:
-        raise NotImplementedError
\ No newline at end of file
+    def delete_many(self, ids: list[UUID], versions: dict[UUID, int] | None = None) -> None:
+        raise NotImplementedError
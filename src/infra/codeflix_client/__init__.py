@@ -0,0 +1,5 @@
+import os
+
+# Admin API the names of the video relations fall back to, unset when empty
+CODEFLIX_API_URL = os.getenv("CODEFLIX_API_URL", "")
+CODEFLIX_API_TOKEN = os.getenv("CODEFLIX_API_TOKEN", "")
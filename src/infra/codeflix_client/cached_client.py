@@ -0,0 +1,179 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+from uuid import UUID
+
+from src.infra.codeflix_client import CODEFLIX_API_URL
+from src.infra.codeflix_client.codeflix_client import CodeflixClient
+from src.infra.codeflix_client.dtos import VideoResponse
+from src.infra.codeflix_client.errors import VideoNotFound
+from src.infra.codeflix_client.http_client import HttpClient
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+type CacheKey = tuple[UUID, datetime | None]
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    response: VideoResponse | None  # None: the video was not found
+
+
+@dataclass
+class _Fetch:
+    """A request in flight, shared by every caller asking for the same video meanwhile."""
+    done: threading.Event = field(default_factory=threading.Event)
+    response: VideoResponse | None = None
+    error: Exception | None = None
+
+
+class CachedCodeflixClient(CodeflixClient):
+    """
+    Caches the responses of another client, so replays and bursts of edits of the same video do not
+    fetch it again. Responses are keyed by video id and `updated_at`: a newer update of the video is a
+    cache miss. Missing videos are cached for a shorter time, and concurrent requests for the same
+    video share a single fetch.
+    """
+
+    def __init__(
+        self,
+        client: CodeflixClient,
+        max_size: int = 10_000,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param client: Client the responses are fetched from
+        :param max_size: Max number of cached responses, the least recently used ones are evicted first
+        :param ttl: Seconds a response is served from the cache, bounds how stale relations can get
+        :param negative_ttl: Seconds a "not found" answer is served from the cache
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where cache hits and misses are recorded
+        """
+        self._client = client
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self.metrics = metrics or registry
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, _Entry] = OrderedDict()
+        self._keys_by_id: dict[UUID, set[CacheKey]] = {}
+        self._fetches: dict[CacheKey, _Fetch] = {}
+
+    def get_video(self, id: UUID, updated_at: datetime | None = None) -> VideoResponse:
+        key = (id, updated_at)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.metrics.inc("codeflix_cache_requests_total", result="hit" if entry.response else "negative_hit")
+                return self._unwrap(id, entry.response)
+            fetch = self._fetches.get(key)
+            leader = fetch is None
+            if leader:
+                fetch = self._fetches[key] = _Fetch()
+
+        if not leader:
+            self.metrics.inc("codeflix_cache_requests_total", result="coalesced")
+            fetch.done.wait()
+            if fetch.error is not None:
+                raise fetch.error
+            return fetch.response
+
+        self.metrics.inc("codeflix_cache_requests_total", result="miss")
+        try:
+            fetch.response = self._client.get_video(id, updated_at=updated_at)
+            self._store(key, fetch.response, self.ttl)
+            return fetch.response
+        except VideoNotFound as e:
+            fetch.error = e
+            self._store(key, None, self.negative_ttl)
+            raise
+        except Exception as e:
+            # Failures are not cached: the next request tries again
+            fetch.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._fetches[key]
+            fetch.done.set()
+
+    def get_videos(self, ids: list[UUID], updated_at: dict[UUID, datetime] | None = None) -> dict[UUID, VideoResponse]:
+        """Serves the cached videos and fetches the others with a single batch call."""
+        updated_at = updated_at or {}
+        videos, misses = {}, []
+        with self._lock:
+            for id in dict.fromkeys(ids):
+                entry = self._lookup((id, updated_at.get(id)))
+                if entry is None:
+                    misses.append(id)
+                    continue
+                self.metrics.inc("codeflix_cache_requests_total", result="hit" if entry.response else "negative_hit")
+                if entry.response is not None:
+                    videos[id] = entry.response
+        if not misses:
+            return videos
+
+        # Batches are not coalesced with the single fetches in flight: at worst a video is fetched twice
+        self.metrics.inc("codeflix_cache_requests_total", value=len(misses), result="miss")
+        fetched = self._client.get_videos(misses, updated_at={id: updated_at[id] for id in misses if id in updated_at})
+        for id in misses:
+            response = fetched.get(id)
+            self._store((id, updated_at.get(id)), response, self.ttl if response else self.negative_ttl)
+        return videos | fetched
+
+    def invalidate(self, id: UUID) -> None:
+        with self._lock:
+            for key in self._keys_by_id.pop(id, set()):
+                self._entries.pop(key, None)
+            self.metrics.set("codeflix_cache_size", len(self._entries))
+
+    def _lookup(self, key: CacheKey) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: CacheKey, response: VideoResponse | None, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(expires_at=self._clock() + ttl, response=response)
+            self._entries.move_to_end(key)
+            self._keys_by_id.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+            self.metrics.set("codeflix_cache_size", len(self._entries))
+
+    def _remove(self, key: CacheKey) -> None:
+        del self._entries[key]
+        keys = self._keys_by_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[key[0]]
+
+    @staticmethod
+    def _unwrap(id: UUID, response: VideoResponse | None) -> VideoResponse:
+        if response is None:
+            raise VideoNotFound(id)
+        return response
+
+
+@functools.cache
+def shared_client() -> CachedCodeflixClient | None:
+    """Client of the admin API shared by the handlers of the process, None when no admin API is configured."""
+    if not CODEFLIX_API_URL:
+        return None
+    return CachedCodeflixClient(HttpClient())
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from enum import StrEnum
+from typing import Callable
+
+from src.infra.codeflix_client.errors import CircuitOpenError
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing. After `failure_threshold` consecutive failures the
+    circuit opens and calls fail right away with `CircuitOpenError`. Once `reset_timeout` seconds have
+    passed, a single call is let through: its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param name: Name of the protected dependency, used in logs and metrics
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param reset_timeout: Seconds the circuit stays open before a call is let through
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where the circuit state is recorded
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.metrics = metrics or registry
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == CircuitState.CLOSED:
+                return
+            if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._set_state(CircuitState.HALF_OPEN)
+                return
+            # Open, or half open with the probe call still running
+            self.metrics.inc("circuit_breaker_rejected_total", dependency=self.name)
+            raise CircuitOpenError(f"Circuit of {self.name} is {self._state}, failing fast")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != CircuitState.CLOSED:
+                self._set_state(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(CircuitState.OPEN)
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit of {self.name} is now {state}")
+        self._state = state
+        self.metrics.set("circuit_breaker_open", 0 if state == CircuitState.CLOSED else 1, dependency=self.name)
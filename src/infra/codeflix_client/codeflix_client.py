@@ -1,10 +1,31 @@
 from abc import abstractmethod, ABC
+from datetime import datetime
 from uuid import UUID
 
 from src.infra.codeflix_client.dtos import VideoResponse
+from src.infra.codeflix_client.errors import VideoNotFound
 
 
 class CodeflixClient(ABC):
     @abstractmethod
-    def get_video(self, id: UUID) -> VideoResponse:
-        raise NotImplementedError
\ No newline at end of file
+    def get_video(self, id: UUID, updated_at: datetime | None = None) -> VideoResponse:
+        """
+        :param id: Id of the video
+        :param updated_at: Last update of the video known by the caller, lets implementations
+            tell a cached response is still up to date
+        """
+        raise NotImplementedError
+
+    def get_videos(self, ids: list[UUID], updated_at: dict[UUID, datetime] | None = None) -> dict[UUID, VideoResponse]:
+        """
+        Fetches several videos at once. Videos that do not exist are missing from the result.
+        Implementations should override it when the API can fetch them in fewer round trips.
+        """
+        updated_at = updated_at or {}
+        videos = {}
+        for id in ids:
+            try:
+                videos[id] = self.get_video(id, updated_at=updated_at.get(id))
+            except VideoNotFound:
+                pass
+        return videos
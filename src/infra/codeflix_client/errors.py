@@ -0,0 +1,15 @@
+from uuid import UUID
+
+
+class CodeflixClientError(Exception):
+    pass
+
+
+class VideoNotFound(CodeflixClientError):
+    def __init__(self, id: UUID) -> None:
+        super().__init__(f"Video {id} not found in the admin API")
+        self.id = id
+
+
+class CircuitOpenError(CodeflixClientError):
+    """The admin API failed too many times in a row: calls fail fast until it is probed again."""
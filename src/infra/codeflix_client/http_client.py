@@ -1,44 +1,119 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from uuid import UUID
 
+import httpx
+
+from src.infra.codeflix_client import CODEFLIX_API_TOKEN, CODEFLIX_API_URL
+from src.infra.codeflix_client.circuit_breaker import CircuitBreaker
 from src.infra.codeflix_client.codeflix_client import CodeflixClient
 from src.infra.codeflix_client.dtos import VideoResponse
+from src.infra.codeflix_client.errors import VideoNotFound
+from src.infra.kafka.retry import TRANSIENT_STATUS_CODES, RetryPolicy
+from src.infra.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Enrichment runs inline with consumption: a slow admin API must not stall the consumer
+DEFAULT_TIMEOUT = httpx.Timeout(connect=1.0, read=2.0, write=2.0, pool=1.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=30.0)
+# Ids per batch request, keeps the query string well below common URL length limits (~2000 chars)
+DEFAULT_CHUNK_SIZE = 50
+
+
+def is_retryable(error: Exception) -> bool:
+    """GETs are idempotent: network failures and overloaded responses are worth another attempt."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+    return False
 
 
 class HttpClient(CodeflixClient):
-    def get_video(self, id: UUID) -> VideoResponse:
-        return VideoResponse(**{
-            "id": id,
-            "title": "The Godfather",
-            "launch_year": 1972,
-            "rating": "AGE_18",
-            "is_active": True,
-            "categories": [
-                {
-                    "id": "142f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b",
-                    "name": "Action",
-                    "description": "Action movies",
-                }
-            ],
-            "cast_members": [
-                {
-                    "id": "242f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b",
-                    "name": "Marlon Brando",
-                    "type": "ACTOR",
-                },
-                {
-                    "id": "342f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b",
-                    "name": "Al Pacino",
-                    "type": "DIRECTOR",
-                },
-            ],
-            "genres": [
-                {
-                    "id": "442f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b",
-                    "name": "Drama",
-                }
-            ],
-            "banner": {
-                "name": "The Godfather",
-                "raw_location": "https://banner.com/the-godfather",
-            },
-        })
\ No newline at end of file
+    def __init__(
+        self,
+        client: httpx.Client | None = None,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_concurrency: int = 4,
+    ) -> None:
+        """
+        :param client: HTTP client, keeps a pool of keep-alive connections to the admin API
+        :param retry_policy: Retries requests failing with transient errors
+        :param circuit_breaker: Fails fast while the admin API is down instead of waiting for timeouts
+        :param chunk_size: Max number of videos fetched per batch request
+        :param max_concurrency: Max number of batch requests in flight, bounded by the connection pool
+        """
+        self._client = client or httpx.Client(
+            base_url=CODEFLIX_API_URL,
+            timeout=DEFAULT_TIMEOUT,
+            limits=DEFAULT_LIMITS,
+            headers={"Authorization": f"Bearer {CODEFLIX_API_TOKEN}"} if CODEFLIX_API_TOKEN else None,
+        )
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=3,
+            initial_backoff=0.1,
+            max_backoff=1.0,
+            classifier=is_retryable,
+        )
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(name="codeflix-api")
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="codeflix-client")
+
+    def get_video(self, id: UUID, updated_at: datetime | None = None) -> VideoResponse:
+        with registry.time("ingestion_stage_seconds", stage="enrich"):
+            return self.retry_policy.run(lambda: self._get_video(id))
+
+    def get_videos(self, ids: list[UUID], updated_at: dict[UUID, datetime] | None = None) -> dict[UUID, VideoResponse]:
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        chunks = [ids[i:i + self.chunk_size] for i in range(0, len(ids), self.chunk_size)]
+        with registry.time("ingestion_stage_seconds", stage="enrich"):
+            # Each chunk is retried on its own: one overloaded response does not fetch the whole batch again
+            results = self._executor.map(lambda chunk: self.retry_policy.run(lambda: self._get_videos(chunk)), chunks)
+            return {video.id: video for result in results for video in result}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._client.close()
+
+    def _get_video(self, id: UUID) -> VideoResponse:
+        self.circuit_breaker.before_call()
+        try:
+            response = self._client.get(f"/videos/{id}/")
+        except httpx.TransportError as e:
+            self._record("transport_error", failure=True)
+            logger.warning(f"Failed to fetch video {id}: {e!r}")
+            raise
+
+        # Server errors count as failures of the API, client errors (a missing video...) do not
+        self._record(str(response.status_code), failure=response.status_code >= 500)
+        if response.status_code == httpx.codes.NOT_FOUND:
+            raise VideoNotFound(id)
+        response.raise_for_status()
+        return VideoResponse.model_validate(response.json())
+
+    def _get_videos(self, ids: list[UUID]) -> list[VideoResponse]:
+        self.circuit_breaker.before_call()
+        try:
+            response = self._client.get("/videos/", params={"ids": ",".join(map(str, ids))})
+        except httpx.TransportError as e:
+            self._record("transport_error", failure=True)
+            logger.warning(f"Failed to fetch {len(ids)} videos: {e!r}")
+            raise
+
+        self._record(str(response.status_code), failure=response.status_code >= 500)
+        response.raise_for_status()
+        # Videos that do not exist are left out of the response
+        return [VideoResponse.model_validate(video) for video in response.json()["data"]]
+
+    def _record(self, status: str, failure: bool) -> None:
+        registry.inc("codeflix_requests_total", status=status)
+        if failure:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
@@ -0,0 +1,209 @@
+import threading
+from datetime import datetime
+from unittest.mock import create_autospec
+from uuid import uuid4
+
+import pytest
+from pytest_mock import MockFixture
+
+from src.infra.codeflix_client.cached_client import CachedCodeflixClient, shared_client
+from src.infra.codeflix_client.codeflix_client import CodeflixClient
+from src.infra.codeflix_client.dtos import VideoResponse
+from src.infra.codeflix_client.errors import VideoNotFound
+from src.infra.metrics.registry import MetricsRegistry
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def video_response(id) -> VideoResponse:
+    return VideoResponse(
+        id=id,
+        title="The Godfather",
+        launch_year=1972,
+        rating="AGE_18",
+        is_active=True,
+        categories=[],
+        cast_members=[],
+        genres=[],
+        banner={"name": "The Godfather", "raw_location": "https://banner.com/the-godfather"},
+    )
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def client() -> CodeflixClient:
+    client = create_autospec(CodeflixClient)
+    client.get_video.side_effect = lambda id, updated_at=None: video_response(id)
+    client.get_videos.side_effect = lambda ids, updated_at=None: {id: video_response(id) for id in ids}
+    return client
+
+
+@pytest.fixture
+def cached(client: CodeflixClient, clock: FakeClock) -> CachedCodeflixClient:
+    return CachedCodeflixClient(client, max_size=2, ttl=60, negative_ttl=10, clock=clock, metrics=MetricsRegistry())
+
+
+class TestCachedCodeflixClient:
+    def test_serve_the_same_version_from_cache(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        id, updated_at = uuid4(), datetime(2024, 1, 1)
+
+        assert cached.get_video(id, updated_at=updated_at) == cached.get_video(id, updated_at=updated_at)
+
+        client.get_video.assert_called_once_with(id, updated_at=updated_at)
+        assert cached.metrics.counter("codeflix_cache_requests_total", result="hit") == 1
+        assert cached.metrics.counter("codeflix_cache_requests_total", result="miss") == 1
+
+    def test_newer_update_is_a_miss(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        id = uuid4()
+        cached.get_video(id, updated_at=datetime(2024, 1, 1))
+        cached.get_video(id, updated_at=datetime(2024, 1, 2))
+
+        assert client.get_video.call_count == 2
+
+    def test_expired_response_is_fetched_again(
+        self,
+        cached: CachedCodeflixClient,
+        client: CodeflixClient,
+        clock: FakeClock,
+    ) -> None:
+        id = uuid4()
+        cached.get_video(id)
+        clock.now = 60
+        cached.get_video(id)
+
+        assert client.get_video.call_count == 2
+
+    def test_least_recently_used_response_is_evicted(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        first, second, third = uuid4(), uuid4(), uuid4()
+        cached.get_video(first)
+        cached.get_video(second)
+        cached.get_video(first)
+        cached.get_video(third)
+
+        cached.get_video(first)
+        cached.get_video(second)
+
+        assert [call.args[0] for call in client.get_video.call_args_list] == [first, second, third, second]
+
+    def test_missing_video_is_cached_for_negative_ttl(
+        self,
+        cached: CachedCodeflixClient,
+        client: CodeflixClient,
+        clock: FakeClock,
+    ) -> None:
+        id = uuid4()
+        client.get_video.side_effect = VideoNotFound(id)
+
+        for _ in range(2):
+            with pytest.raises(VideoNotFound):
+                cached.get_video(id)
+        assert client.get_video.call_count == 1
+
+        clock.now = 10
+        with pytest.raises(VideoNotFound):
+            cached.get_video(id)
+        assert client.get_video.call_count == 2
+
+    def test_failures_are_not_cached(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        id = uuid4()
+        client.get_video.side_effect = [ConnectionError, video_response(id)]
+
+        with pytest.raises(ConnectionError):
+            cached.get_video(id)
+        assert cached.get_video(id).id == id
+
+    def test_invalidate_evicts_every_version_of_the_video(
+        self,
+        cached: CachedCodeflixClient,
+        client: CodeflixClient,
+    ) -> None:
+        id = uuid4()
+        cached.get_video(id)
+        cached.invalidate(id)
+        cached.get_video(id)
+
+        assert client.get_video.call_count == 2
+
+    def test_concurrent_requests_share_a_single_fetch(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        id = uuid4()
+        fetching, release = threading.Event(), threading.Event()
+
+        def slow_fetch(id, updated_at=None):
+            fetching.set()
+            release.wait(timeout=5)
+            return video_response(id)
+
+        client.get_video.side_effect = slow_fetch
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cached.get_video(id)))
+        leader.start()
+        fetching.wait(timeout=5)
+        follower = threading.Thread(target=lambda: results.append(cached.get_video(id)))
+        follower.start()
+        while not cached.metrics.counter("codeflix_cache_requests_total", result="coalesced"):
+            pass
+        release.set()
+        leader.join()
+        follower.join()
+
+        assert len(results) == 2
+        client.get_video.assert_called_once()
+
+    def test_batch_fetches_only_the_misses(self, cached: CachedCodeflixClient, client: CodeflixClient) -> None:
+        cached_id, missing_id = uuid4(), uuid4()
+        updated_at = {cached_id: datetime(2024, 1, 1), missing_id: datetime(2024, 1, 1)}
+        cached.get_video(cached_id, updated_at=updated_at[cached_id])
+
+        videos = cached.get_videos([cached_id, missing_id], updated_at=updated_at)
+
+        assert set(videos) == {cached_id, missing_id}
+        client.get_videos.assert_called_once_with([missing_id], updated_at={missing_id: datetime(2024, 1, 1)})
+        assert cached.metrics.counter("codeflix_cache_requests_total", result="hit") == 1
+
+    def test_batch_caches_missing_videos_for_negative_ttl(
+        self,
+        cached: CachedCodeflixClient,
+        client: CodeflixClient,
+        clock: FakeClock,
+    ) -> None:
+        id = uuid4()
+        client.get_videos.side_effect = None
+        client.get_videos.return_value = {}
+
+        assert cached.get_videos([id]) == {}
+        with pytest.raises(VideoNotFound):
+            cached.get_video(id)
+        client.get_video.assert_not_called()
+
+        clock.now = 11
+        cached.get_video(id)
+        client.get_video.assert_called_once()
+
+
+class TestSharedClient:
+    @pytest.fixture(autouse=True)
+    def clear(self):
+        shared_client.cache_clear()
+        yield
+        shared_client.cache_clear()
+
+    def test_handlers_of_the_process_share_one_cache(self, mocker: MockFixture) -> None:
+        mocker.patch("src.infra.codeflix_client.cached_client.CODEFLIX_API_URL", "http://codeflix-admin:8000/api")
+
+        assert isinstance(shared_client(), CachedCodeflixClient)
+        assert shared_client() is shared_client()
+
+    def test_no_client_without_an_admin_api(self, mocker: MockFixture) -> None:
+        mocker.patch("src.infra.codeflix_client.cached_client.CODEFLIX_API_URL", "")
+
+        assert shared_client() is None
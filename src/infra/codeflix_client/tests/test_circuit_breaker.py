@@ -0,0 +1,74 @@
+import pytest
+
+from src.infra.codeflix_client.circuit_breaker import CircuitBreaker, CircuitState
+from src.infra.codeflix_client.errors import CircuitOpenError
+from src.infra.metrics.registry import MetricsRegistry
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(name="api", failure_threshold=2, reset_timeout=30, clock=clock, metrics=MetricsRegistry())
+
+
+class TestCircuitBreaker:
+    def test_open_after_consecutive_failures(self, breaker: CircuitBreaker) -> None:
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        assert breaker.metrics.gauge("circuit_breaker_open", dependency="api") == 1
+
+    def test_success_resets_the_failure_count(self, breaker: CircuitBreaker) -> None:
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        breaker.before_call()
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_let_a_single_call_through_after_reset_timeout(self, breaker: CircuitBreaker, clock: FakeClock) -> None:
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now = 30
+
+        breaker.before_call()
+        assert breaker.state == CircuitState.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_close_when_probe_call_succeeds(self, breaker: CircuitBreaker, clock: FakeClock) -> None:
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now = 30
+        breaker.before_call()
+
+        breaker.record_success()
+
+        assert breaker.state == CircuitState.CLOSED
+        breaker.before_call()
+
+    def test_open_again_when_probe_call_fails(self, breaker: CircuitBreaker, clock: FakeClock) -> None:
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now = 30
+        breaker.before_call()
+
+        breaker.record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Generator
+from urllib.parse import parse_qs, urlparse
+from uuid import UUID, uuid4
+
+import httpx
+import pytest
+
+from src.infra.codeflix_client.circuit_breaker import CircuitBreaker
+from src.infra.codeflix_client.errors import CircuitOpenError, VideoNotFound
+from src.infra.codeflix_client.http_client import HttpClient, is_retryable
+from src.infra.kafka.retry import RetryPolicy
+
+VIDEO = {
+    "title": "The Godfather",
+    "launch_year": 1972,
+    "rating": "AGE_18",
+    "is_active": True,
+    "categories": [{"id": "142f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b", "name": "Action", "description": "Action movies"}],
+    "cast_members": [],
+    "genres": [],
+    "banner": {"name": "The Godfather", "raw_location": "https://banner.com/the-godfather"},
+}
+
+
+class StubAdminApi:
+    """Answers each request with the next scripted (status, delay) response, then with the last one."""
+
+    def __init__(self) -> None:
+        self.responses: list[tuple[int, float]] = [(200, 0.0)]
+        self.requests: list[str] = []
+        self.missing: set[str] = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                stub.requests.append(self.path)
+                status, delay = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                time.sleep(delay)
+                url = urlparse(self.path)
+                if url.query:
+                    ids = parse_qs(url.query)["ids"][0].split(",")
+                    data = {"data": [{"id": id, **VIDEO} for id in ids if id not in stub.missing]}
+                else:
+                    data = {"id": url.path.split("/")[-2], **VIDEO}
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+
+@pytest.fixture
+def api() -> Generator[StubAdminApi, None, None]:
+    api = StubAdminApi()
+    yield api
+    api.server.shutdown()
+    api.server.server_close()
+
+
+@pytest.fixture
+def client(api: StubAdminApi) -> Generator[HttpClient, None, None]:
+    client = HttpClient(
+        client=httpx.Client(base_url=api.url, timeout=httpx.Timeout(0.2)),
+        retry_policy=RetryPolicy(max_attempts=2, classifier=is_retryable, sleep=lambda delay: None),
+        circuit_breaker=CircuitBreaker(name="test", failure_threshold=2, reset_timeout=60),
+        chunk_size=2,
+    )
+    yield client
+    client.close()
+
+
+class TestGetVideo:
+    def test_fetch_video(self, api: StubAdminApi, client: HttpClient) -> None:
+        id = uuid4()
+
+        video = client.get_video(id)
+
+        assert video.id == id
+        assert video.title == "The Godfather"
+        assert api.requests == [f"/videos/{id}/"]
+
+    def test_when_video_does_not_exist_then_raise_video_not_found_without_retrying(
+        self,
+        api: StubAdminApi,
+        client: HttpClient,
+    ) -> None:
+        api.responses = [(404, 0.0)]
+
+        with pytest.raises(VideoNotFound):
+            client.get_video(uuid4())
+        assert len(api.requests) == 1
+
+    def test_when_api_is_overloaded_then_retry(self, api: StubAdminApi, client: HttpClient) -> None:
+        api.responses = [(503, 0.0), (200, 0.0)]
+
+        assert client.get_video(uuid4()).title == "The Godfather"
+        assert len(api.requests) == 2
+
+    def test_when_api_is_too_slow_then_time_out(self, api: StubAdminApi, client: HttpClient) -> None:
+        api.responses = [(200, 0.5)]
+
+        with pytest.raises(httpx.ReadTimeout):
+            client.get_video(uuid4())
+
+    def test_when_api_keeps_failing_then_fail_fast(self, api: StubAdminApi, client: HttpClient) -> None:
+        api.responses = [(503, 0.0)]
+
+        with pytest.raises(httpx.HTTPStatusError):
+            client.get_video(uuid4())
+        with pytest.raises(CircuitOpenError):
+            client.get_video(uuid4())
+        assert len(api.requests) == 2
+
+
+class TestGetVideos:
+    def test_fetch_videos_in_chunks(self, api: StubAdminApi, client: HttpClient) -> None:
+        ids = [uuid4() for _ in range(5)]
+
+        videos = client.get_videos(ids)
+
+        assert set(videos) == set(ids)
+        assert all(videos[id].id == id for id in ids)
+        assert len(api.requests) == 3
+        requested = [UUID(id) for path in api.requests for id in parse_qs(urlparse(path).query)["ids"][0].split(",")]
+        assert sorted(requested) == sorted(ids)
+
+    def test_missing_videos_are_left_out(self, api: StubAdminApi, client: HttpClient) -> None:
+        existing, missing = uuid4(), uuid4()
+        api.missing = {str(missing)}
+
+        assert set(client.get_videos([existing, missing])) == {existing}
+
+    def test_when_a_chunk_is_overloaded_then_retry_only_that_chunk(
+        self,
+        api: StubAdminApi,
+        client: HttpClient,
+    ) -> None:
+        api.responses = [(503, 0.0), (200, 0.0)]
+
+        assert len(client.get_videos([uuid4(), uuid4()])) == 2
+        assert len(api.requests) == 2
+
+    def test_no_request_without_ids(self, api: StubAdminApi, client: HttpClient) -> None:
+        assert client.get_videos([]) == {}
+        assert api.requests == []
@@ -0,0 +1,85 @@
+import logging
+
+from elasticsearch import Elasticsearch
+
+from src.infra.elasticsearch.indices import ensure_index
+from src.infra.elasticsearch.mappings import INDEX_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Index settings that make a large initial load cheaper: no periodic refresh and no replica to copy each write to
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# Key of the `_meta` of the index mapping the original settings are kept under while they are changed
+ORIGINAL_SETTINGS_META = "bulk_load_original_settings"
+
+
+class BulkLoadSettings:
+    """
+    Switches an index to bulk load settings and back. The original values are read before they are
+    changed, so whatever was configured on the index (or its template) is what gets restored.
+
+    Workers loading snapshots into the same index apply them concurrently: the original values are kept
+    with the index, in the `_meta` of its mapping, before the settings are changed. A worker coming after
+    another one restores the values the index had before the first of them, not the bulk load ones.
+    """
+
+    def __init__(self, client: Elasticsearch, index: str, alias: str | None = None) -> None:
+        """
+        :param client: Elasticsearch client
+        :param index: Index being loaded
+        :param alias: Alias the index is read through. When set, a missing index is created with its mapping
+            before the settings are changed, e.g. a snapshot loaded on a fresh install
+        """
+        self._client = client
+        self.index = index
+        self.alias = alias
+        self._original: dict | None = None
+
+    @property
+    def applied(self) -> bool:
+        return self._original is not None
+
+    def apply(self) -> None:
+        if self.applied:
+            return
+        if self.alias is not None:
+            ensure_index(self._client, self.alias, self.index)
+        response = self._client.indices.get_settings(index=self.index, flat_settings=True)
+        # Keyed by the concrete index, which differs from `index` when it is an alias
+        current = response[next(iter(response))]["settings"]
+        # Read after the settings: when they were changed already, the original values were kept before
+        meta = self._meta()
+        original = meta.get(ORIGINAL_SETTINGS_META)
+        if original is None:
+            if all(current.get(f"index.{name}") == str(value) for name, value in BULK_LOAD_SETTINGS.items()):
+                # Changed by another load, which restored them and cleared its record in between:
+                # the values the index is created with are the best guess
+                logger.warning(f"{self.index} already has bulk load settings, restoring the default ones after")
+                original = {name: INDEX_SETTINGS.get(name) for name in BULK_LOAD_SETTINGS}
+            else:
+                original = {
+                    # `None` resets a setting that was not explicitly set to the cluster default
+                    name: current.get(f"index.{name}")
+                    for name in BULK_LOAD_SETTINGS
+                }
+            self._client.indices.put_mapping(index=self.index, meta={**meta, ORIGINAL_SETTINGS_META: original})
+        self._original = original
+        self._client.indices.put_settings(index=self.index, settings={"index": BULK_LOAD_SETTINGS})
+        logger.info(f"Bulk load settings applied to {self.index}, original settings: {self._original}")
+
+    def restore(self) -> None:
+        if not self.applied:
+            return
+        self._client.indices.put_settings(index=self.index, settings={"index": self._original})
+        meta = self._meta()
+        if ORIGINAL_SETTINGS_META in meta:
+            del meta[ORIGINAL_SETTINGS_META]
+            self._client.indices.put_mapping(index=self.index, meta=meta)
+        # Make everything loaded so far searchable right away instead of waiting for the next refresh
+        self._client.indices.refresh(index=self.index)
+        logger.info(f"Settings of {self.index} restored: {self._original}")
+        self._original = None
+
+    def _meta(self) -> dict:
+        response = self._client.indices.get_mapping(index=self.index)
+        return dict(response[next(iter(response))]["mappings"].get("_meta", {}))
@@ -0,0 +1,147 @@
+import logging
+import time
+from http import HTTPStatus
+from typing import Callable
+
+from elasticsearch import Elasticsearch, helpers
+
+from src.infra.elasticsearch import ELASTICSEARCH_HOST
+from src.infra.elasticsearch.indices import ensure_index
+from src.infra.metrics.registry import SIZE_BUCKETS, MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Max number of documents buffered, then sent in a single bulk request
+DEFAULT_BATCH_SIZE = 1000
+# Max seconds a document waits in the buffer, about the refresh interval of the indices: waiting longer than
+# that delays its visibility for no gain in bulk size
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Max size of a bulk request, large documents split a batch in several requests
+DEFAULT_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+
+class BulkProjector:
+    """
+    Writes the documents projected from the rows of a table into their index, buffered and sent in bulk.
+
+    Changes are coalesced per document: only the latest one is sent. Versioned writes use the row version as
+    external version, so Elasticsearch itself rejects stale ones and a batch can be sent again as a whole.
+    The index is created with its mapping before the first write, unless it already exists.
+    """
+
+    def __init__(
+        self,
+        index: str,
+        client: Elasticsearch | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param index: Index the documents are written to
+        :param client: Elasticsearch client
+        :param batch_size: Max number of buffered documents, written as soon as it is reached
+        :param flush_interval: Max seconds the oldest buffered document waits before the buffer is written
+        :param max_chunk_bytes: Max size in bytes of a bulk request
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where bulk sizes, buffering delays and stale writes are recorded
+        """
+        self._client = client or Elasticsearch(hosts=[ELASTICSEARCH_HOST])
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_chunk_bytes = max_chunk_bytes
+        self._clock = clock
+        self.metrics = metrics or registry
+        self._pending: dict[str, dict] = {}
+        self._oldest_at: float | None = None
+        self._index_ready = False
+
+    @property
+    def client(self) -> Elasticsearch:
+        return self._client
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def index_document(self, id: str, document: dict, version: int | None = None) -> None:
+        self._buffer(id, {"_op_type": "index", "_source": document}, version)
+
+    def delete_document(self, id: str, version: int | None = None) -> None:
+        self._buffer(id, {"_op_type": "delete"}, version)
+
+    def _buffer(self, id: str, action: dict, version: int | None) -> None:
+        if version is not None:
+            action = {**action, "version": version, "version_type": "external"}
+        if not self._pending:
+            self._oldest_at = self._clock()
+        self._pending[id] = {"_index": self.index, "_id": id, **action}
+        if self.due:
+            self.flush()
+
+    @property
+    def due(self) -> bool:
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.batch_size or self._clock() - self._oldest_at >= self.flush_interval
+
+    def flush(self, chunk_size: int | None = None) -> None:
+        """
+        Writes the buffered documents. Stale writes (409) and deletions of missing documents (404) are skipped.
+        Any other failure raises `BulkIndexError` once all of them were sent, and keeps them buffered.
+
+        :param chunk_size: Max number of documents per bulk request, `batch_size` by default
+        """
+        if not self._pending:
+            return
+        pending, oldest_at = self._pending, self._oldest_at
+        self._pending, self._oldest_at = {}, None
+        try:
+            self._write(list(pending.values()), chunk_size=chunk_size or self.batch_size)
+        except Exception:
+            # Changes buffered meanwhile are newer than those of the failed batch
+            self._pending = {**pending, **self._pending}
+            self._oldest_at = oldest_at
+            raise
+        self.metrics.observe("projection_buffer_seconds", self._clock() - oldest_at, index=self.index)
+
+    def _write(self, actions: list[dict], chunk_size: int) -> None:
+        self.ensure_index()
+        written, failed = 0, []
+        with self.metrics.time("ingestion_stage_seconds", stage="write"):
+            for ok, item in helpers.streaming_bulk(
+                self._client,
+                actions,
+                chunk_size=chunk_size,
+                max_chunk_bytes=self.max_chunk_bytes,
+                raise_on_error=False,
+                refresh=False,
+            ):
+                operation, result = next(iter(item.items()))
+                if ok:
+                    written += 1
+                    self.metrics.inc("projection_documents_total", index=self.index, operation=operation)
+                elif result["status"] == HTTPStatus.CONFLICT:
+                    logger.info(f"Skipped stale write of {self.index} document {result['_id']}")
+                    self.metrics.inc("ingestion_stale_writes_total", index=self.index)
+                elif result["status"] == HTTPStatus.NOT_FOUND and operation == "delete":
+                    continue
+                else:
+                    failed.append(item)
+        if failed:
+            raise helpers.BulkIndexError(f"{len(failed)} document(s) failed to be written", failed)
+        self.metrics.observe("ingestion_bulk_size", written, buckets=SIZE_BUCKETS)
+        logger.info(f"Wrote {written} documents to {self.index} in bulk")
+
+    def ensure_index(self) -> None:
+        """
+        Creates the first version of the index with its mapping, behind the alias it is written through.
+        An existing one is left as is: changing its mapping needs a reindex.
+        """
+        if self._index_ready:
+            return
+        ensure_index(self._client, self.index)
+        self._index_ready = True
@@ -0,0 +1,396 @@
+import logging
+from http import HTTPStatus
+from typing import Iterable
+from uuid import UUID
+
+from elasticsearch import ConflictError, Elasticsearch, NotFoundError, helpers
+from pydantic import ValidationError
+
+from src.application.list_video import VideoSortableFields
+from src.application.listing import DEFAULT_PAGINATION_SIZE, SortDirection
+from src.domain.video import Video
+from src.domain.video_relation import VideoRelationChange
+from src.domain.video_repository import VideoRepository
+from src.infra.elasticsearch import ELASTICSEARCH_HOST
+from src.infra.elasticsearch.update_by_query_tasks import UpdateByQueryTasks
+from src.infra.metrics.registry import SIZE_BUCKETS, registry
+
+DEFAULT_BULK_CHUNK_SIZE = 1000
+# Row and relation changes of a video are written concurrently: an update losing the race is tried again
+RETRY_ON_CONFLICT = 3
+
+# Fields filled from the relation tables, never overwritten by the fields of the video row
+RELATION_FIELDS = frozenset({"categories", "genres", "cast_members", "banner_url"})
+# Names of the linked entities, copied into the videos for search, as lists of {id, name, version} objects.
+# The version is the one of the last rename written, null for names copied when the entity was linked
+NAME_FIELDS = {"categories": "category_names", "genres": "genre_names", "cast_members": "cast_member_names"}
+SEARCH_FIELDS = ["title", *(f"{field}.name" for field in NAME_FIELDS.values())]
+
+# Version of the last change written to a document, kept in `_source` for writes to compare against
+VERSION_FIELD = "cdc_version"
+_VERSIONED_UPDATE_SCRIPT = f"""
+if (ctx._source.{VERSION_FIELD} != null && ctx._source.{VERSION_FIELD} >= params.version) {{
+    ctx.op = 'noop';
+}} else {{
+    ctx._source.putAll(params.doc);
+    ctx._source.{VERSION_FIELD} = params.version;
+}}
+"""
+# Partial update of a video row, falling back to its whole row for documents without one: not saved yet, or
+# only holding the relations streamed before the row
+_PARTIAL_UPDATE_SCRIPT = f"""
+if (params.version != null && ctx._source.{VERSION_FIELD} != null && ctx._source.{VERSION_FIELD} >= params.version) {{
+    ctx.op = 'noop';
+}} else {{
+    ctx._source.putAll(ctx._source.title == null ? params.row : params.doc);
+    if (params.version != null) {{
+        ctx._source.{VERSION_FIELD} = params.version;
+    }}
+}}
+"""
+
+# Version of the last change of each relation value, as a list of {{key, version}} objects: keyed by value,
+# an object would add a field to the index mapping per category, genre... ever linked
+LINKS_FIELD = "cdc_links"
+_RELATIONS_UPDATE_SCRIPT = f"""
+boolean created = ctx._source.isEmpty();
+if (ctx._source.{LINKS_FIELD} == null) {{
+    ctx._source.{LINKS_FIELD} = new ArrayList();
+}}
+def links = ctx._source.{LINKS_FIELD};
+for (change in params.changes) {{
+    String key = change.multiple ? change.field + ':' + change.value : change.field;
+    if (change.version != null) {{
+        def seen = null;
+        for (link in links) {{
+            if (link.key == key) {{
+                seen = link;
+                break;
+            }}
+        }}
+        if (seen != null && seen.version >= change.version) {{
+            continue;
+        }}
+        if (seen == null) {{
+            links.add(['key': key, 'version': change.version]);
+        }} else {{
+            seen.version = change.version;
+        }}
+    }}
+    if (!change.multiple) {{
+        ctx._source[change.field] = change.linked ? change.value : null;
+        continue;
+    }}
+    if (ctx._source[change.field] == null) {{
+        ctx._source[change.field] = new ArrayList();
+    }}
+    def values = ctx._source[change.field];
+    String value = change.value;
+    if (change.linked && !values.contains(value)) {{
+        values.add(value);
+    }} else if (!change.linked) {{
+        values.removeIf(item -> item == value);
+    }}
+    if (change.names_field == null) {{
+        continue;
+    }}
+    if (ctx._source[change.names_field] == null) {{
+        ctx._source[change.names_field] = new ArrayList();
+    }}
+    def names = ctx._source[change.names_field];
+    if (!change.linked) {{
+        names.removeIf(item -> item.id == value);
+        continue;
+    }}
+    boolean named = false;
+    for (item in names) {{
+        named = named || item.id == value;
+    }}
+    // A name already there was written by a rename, at least as recent as the one known when linking
+    if (change.name != null && !named) {{
+        names.add(['id': value, 'name': change.name, 'version': null]);
+    }}
+}}
+if (created && !params.links) {{
+    // Unlinking from a video that is not saved, e.g. its rows being deleted after the video itself
+    ctx.op = 'noop';
+}}
+"""
+_RENAME_SCRIPT = """
+if (ctx._source[params.names_field] == null) {
+    ctx._source[params.names_field] = new ArrayList();
+}
+def entry = null;
+for (item in ctx._source[params.names_field]) {
+    if (item.id == params.id) {
+        entry = item;
+    }
+}
+if (entry == null) {
+    ctx._source[params.names_field].add(['id': params.id, 'name': params.name, 'version': params.version]);
+} else if (entry.version == null || params.version == null || entry.version < params.version) {
+    entry.name = params.name;
+    entry.version = params.version;
+} else {
+    // Written by a newer rename, e.g. this task was superseded but not cancelled yet
+    ctx.op = 'noop';
+}
+"""
+
+
+class ElasticsearchVideoRepository(VideoRepository):
+    INDEX = "catalog-db.codeflix.videos"
+
+    def __init__(
+        self,
+        client: Elasticsearch | None = None,
+        logger: logging.Logger | None = None,
+        bulk_chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+        tasks: UpdateByQueryTasks | None = None,
+        index: str | None = None,
+    ) -> None:
+        """
+        :param client: Elasticsearch client
+        :param logger: Logger
+        :param bulk_chunk_size: Max number of documents sent in a single bulk request
+        :param tasks: Runs and tracks the background rewrites of many videos, e.g. renames
+        :param index: Index the videos are written to and searched in, `INDEX` by default
+        """
+        self._client = client or Elasticsearch(hosts=[ELASTICSEARCH_HOST])
+        self._logger = logger or logging.getLogger(__name__)
+        self.bulk_chunk_size = bulk_chunk_size
+        self.index = index or self.INDEX
+        self.tasks = tasks or UpdateByQueryTasks(client=self._client, index=self.index)
+        self._index_ready = False
+
+    @property
+    def client(self) -> Elasticsearch:
+        return self._client
+
+    def ensure_index(self) -> None:
+        """
+        Creates the index with the video mapping before the first write: one auto-created by the write would
+        get a dynamic mapping, under the name of the alias it is meant to be read through.
+        """
+        if self._index_ready:
+            return
+        # Imported here: the mappings are built from the constants of the repositories
+        from src.infra.elasticsearch.indices import ensure_index
+
+        ensure_index(self._client, self.INDEX, self.index)
+        self._index_ready = True
+
+    def save(self, video: Video, version: int | None = None) -> None:
+        self.ensure_index()
+        try:
+            with registry.time("ingestion_stage_seconds", stage="write"):
+                self._client.create(index=self.index, id=str(video.id), document=self._document(video, version))
+        except ConflictError:
+            self.update(video.id, self._row(video), version=version, upsert=True)
+
+    def save_many(self, videos: list[Video], versions: dict[UUID, int] | None = None) -> None:
+        # Most rows are saved once, by the snapshot or their create event: they are created as is, without the
+        # cost of a script. Those already there, saved before or holding relations, get the versioned update
+        versions = versions or {}
+        rows = {str(video.id): video for video in videos}
+        existing = self._bulk(
+            {"_op_type": "create", "_id": id, "_source": self._document(video, versions.get(video.id))}
+            for id, video in rows.items()
+        )
+        if existing:
+            self.update_many(
+                {rows[id].id: self._row(rows[id]) for id in existing},
+                versions=versions,
+                upsert=True,
+            )
+
+    def update(self, id: UUID, fields: dict, version: int | None = None, upsert: bool = False) -> bool:
+        self.ensure_index()
+        with registry.time("ingestion_stage_seconds", stage="write"):
+            try:
+                response = self._client.update(
+                    index=self.index,
+                    id=str(id),
+                    retry_on_conflict=RETRY_ON_CONFLICT,
+                    **self._update_request(fields, version, upsert),
+                )
+            except NotFoundError:
+                return False
+        if response["result"] == "noop":
+            self._skip_stale(id)
+        return True
+
+    def update_many(
+        self,
+        updates: dict[UUID, dict],
+        versions: dict[UUID, int] | None = None,
+        videos: dict[UUID, Video] | None = None,
+        upsert: bool = False,
+    ) -> set[UUID]:
+        versions, videos = versions or {}, videos or {}
+        missing = self._bulk(
+            {
+                "_op_type": "update",
+                "_id": str(id),
+                "retry_on_conflict": RETRY_ON_CONFLICT,
+                **(
+                    self._partial_update_request(fields, self._row(videos[id]), versions.get(id))
+                    if id in videos
+                    else self._update_request(fields, versions.get(id), upsert)
+                ),
+            }
+            for id, fields in updates.items()
+        )
+        return {UUID(id) for id in missing}
+
+    def update_relations(self, changes: list[VideoRelationChange]) -> None:
+        # A single update per video, applying its changes in order. Upserted: the rows of the relation tables
+        # may be streamed before the video row
+        changes_by_video: dict[UUID, list[dict]] = {}
+        for change in changes:
+            changes_by_video.setdefault(change.video_id, []).append({
+                **change.model_dump(mode="json", include={"field", "value", "linked", "multiple", "name", "version"}),
+                "names_field": NAME_FIELDS.get(change.field),
+            })
+        self._bulk(
+            {
+                "_op_type": "update",
+                "_id": str(id),
+                "retry_on_conflict": RETRY_ON_CONFLICT,
+                "scripted_upsert": True,
+                "upsert": {},
+                "script": {
+                    "source": _RELATIONS_UPDATE_SCRIPT,
+                    "params": {"changes": video_changes, "links": any(change["linked"] for change in video_changes)},
+                },
+            }
+            for id, video_changes in changes_by_video.items()
+        )
+
+    def rename_relation(self, field: str, id: UUID, name: str, version: int | None = None) -> None:
+        self.tasks.submit(
+            key=(field, id),
+            query={"term": {f"{field}.keyword": str(id)}},
+            script={
+                "source": _RENAME_SCRIPT,
+                "params": {"names_field": NAME_FIELDS[field], "id": str(id), "name": name, "version": version},
+            },
+        )
+
+    # Video ids are never reused: no write of a video can be newer than its delete, whose version is not checked
+    def delete(self, id: UUID, version: int | None = None) -> None:
+        with registry.time("ingestion_stage_seconds", stage="write"):
+            try:
+                self._client.delete(index=self.index, id=str(id))
+            except NotFoundError:
+                self._logger.info(f"Video {id} was already deleted")
+
+    def delete_many(self, ids: list[UUID], versions: dict[UUID, int] | None = None) -> None:
+        self._bulk({"_op_type": "delete", "_id": str(id)} for id in ids)
+
+    def _bulk(self, actions: Iterable[dict]) -> list[str]:
+        """
+        Sends the actions in bulk requests of `bulk_chunk_size`. Stale writes (409) are skipped and the
+        ids of missing documents (404), or of existing ones for creates (409), returned. Any other failure
+        raises `BulkIndexError` once all actions were sent: the batch is then retried as a whole, its
+        successful writes being idempotent.
+        """
+        self.ensure_index()
+        written, rejected, failed = 0, [], []
+        with registry.time("ingestion_stage_seconds", stage="write"):
+            for ok, item in helpers.streaming_bulk(
+                self._client,
+                ({"_index": self.index, **action} for action in actions),
+                chunk_size=self.bulk_chunk_size,
+                raise_on_error=False,
+                refresh=False,
+            ):
+                op_type, result = next(iter(item.items()))
+                if ok and result.get("result") != "noop":
+                    written += 1
+                elif not ok and result["status"] == HTTPStatus.CONFLICT and op_type == "create":
+                    rejected.append(result["_id"])
+                elif ok or result["status"] == HTTPStatus.CONFLICT:
+                    self._skip_stale(result["_id"])
+                elif result["status"] == HTTPStatus.NOT_FOUND:
+                    rejected.append(result["_id"])
+                else:
+                    failed.append(item)
+        if failed:
+            raise helpers.BulkIndexError(f"{len(failed)} document(s) failed to be written", failed)
+        registry.observe("ingestion_bulk_size", written, buckets=SIZE_BUCKETS)
+        self._logger.info(f"Wrote {written} videos in bulk")
+        return rejected
+
+    @staticmethod
+    def _row(video: Video) -> dict:
+        return video.model_dump(mode="json", exclude=set(RELATION_FIELDS))
+
+    @classmethod
+    def _document(cls, video: Video, version: int | None) -> dict:
+        return {**cls._row(video), VERSION_FIELD: version} if version is not None else cls._row(video)
+
+    @staticmethod
+    def _update_request(fields: dict, version: int | None, upsert: bool = False) -> dict:
+        # Existing documents are only written through the update API, so that the fields of the video row and of
+        # its relations do not overwrite each other. It only supports internal versioning: a script checks the version
+        if version is None:
+            return {"doc": fields, "doc_as_upsert": upsert}
+        return {
+            "script": {"source": _VERSIONED_UPDATE_SCRIPT, "params": {"doc": fields, "version": version}},
+            **({"scripted_upsert": True, "upsert": {}} if upsert else {}),
+        }
+
+    @staticmethod
+    def _partial_update_request(fields: dict, row: dict, version: int | None) -> dict:
+        return {
+            "script": {"source": _PARTIAL_UPDATE_SCRIPT, "params": {"doc": fields, "row": row, "version": version}},
+            "scripted_upsert": True,
+            "upsert": {},
+        }
+
+    def _skip_stale(self, id: UUID | str) -> None:
+        self._logger.info(f"Skipped stale write of video {id}")
+        registry.inc("ingestion_stale_writes_total", index=self.index)
+
+    def search(
+        self,
+        page: int = 1,
+        per_page: int = DEFAULT_PAGINATION_SIZE,
+        search: str | None = None,
+        sort: VideoSortableFields | None = None,
+        direction: SortDirection = SortDirection.ASC,
+    ) -> list[Video]:
+        query = {
+            "from": (page - 1) * per_page,
+            "size": per_page,
+            "sort": [{f"{sort}.keyword": {"order": direction}}] if sort else [],
+            "query": {
+                "bool": {
+                    "must": (
+                        [{"multi_match": {"query": search, "fields": SEARCH_FIELDS}}]
+                        if search
+                        else [{"match_all": {}}]
+                    ),
+                    # Documents only holding relations, whose video row was not streamed yet
+                    "filter": [{"exists": {"field": "title"}}],
+                }
+            },
+        }
+
+        hits = self._client.search(
+            index=self.index,
+            body=query,
+            source_excludes=[VERSION_FIELD, LINKS_FIELD, *NAME_FIELDS.values()],
+        )["hits"]["hits"]
+
+        parsed_videos = []
+        for hit in hits:
+            try:
+                parsed_video = Video(**hit["_source"])
+            except ValidationError:
+                self._logger.error(f"Malformed video: {hit}")
+            else:
+                parsed_videos.append(parsed_video)
+
+        return parsed_videos
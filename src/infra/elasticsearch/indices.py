@@ -0,0 +1,48 @@
+import logging
+
+from elasticsearch import BadRequestError, Elasticsearch
+
+from src.infra.elasticsearch.mappings import INDEX_SETTINGS, MAPPINGS
+
+logger = logging.getLogger(__name__)
+
+
+def versioned_index(alias: str, version: int) -> str:
+    """
+    Name of version `version` of an index. Repositories read and write through `alias`, their `INDEX`, which
+    points to the current version and is swapped by `reindex` once a new version is filled.
+    """
+    return f"{alias}_v{version}"
+
+
+def create_index(client: Elasticsearch, alias: str, version: int = 1, with_alias: bool = True) -> str:
+    """Creates version `version` of the index read through `alias`, with its current mapping."""
+    index = versioned_index(alias, version)
+    client.indices.create(
+        index=index,
+        mappings=MAPPINGS[alias],
+        settings=INDEX_SETTINGS,
+        aliases={alias: {}} if with_alias else None,
+    )
+    logger.info(f"Created index {index}")
+    return index
+
+
+def ensure_index(client: Elasticsearch, alias: str, index: str | None = None) -> None:
+    """
+    Creates the index written through `alias` when it does not exist: its first version behind the alias or,
+    when given, `index` with the mapping of the alias, e.g. a version filled by a replay and swapped in later.
+    An existing one is left as is: changing its mapping needs a reindex.
+    """
+    if client.indices.exists(index=index or alias):
+        return
+    try:
+        if index is None or index == alias:
+            create_index(client, alias)
+        else:
+            client.indices.create(index=index, mappings=MAPPINGS[alias], settings=INDEX_SETTINGS)
+            logger.info(f"Created index {index} with the mapping of {alias}")
+    except BadRequestError as e:
+        # Created meanwhile by another worker
+        if e.error != "resource_already_exists_exception":
+            raise
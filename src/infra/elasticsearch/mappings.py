@@ -0,0 +1,84 @@
+"""
+Mappings and settings of the catalog indices, created with them before their first document is written or when
+they are reindexed. A projected document only holds the columns mapped for its index.
+"""
+from src.infra.elasticsearch.elasticsearch_cast_member_repository import ElasticsearchCastMemberRepository
+from src.infra.elasticsearch.elasticsearch_category_repository import ElasticsearchCategoryRepository
+from src.infra.elasticsearch.elasticsearch_genre_repository import ElasticsearchGenreRepository
+from src.infra.elasticsearch.elasticsearch_video_repository import (
+    LINKS_FIELD,
+    NAME_FIELDS,
+    VERSION_FIELD,
+    ElasticsearchVideoRepository,
+)
+
+CATEGORIES_INDEX = ElasticsearchCategoryRepository.INDEX
+GENRES_INDEX = ElasticsearchGenreRepository.INDEX
+GENRE_CATEGORIES_INDEX = ElasticsearchGenreRepository._GENRE_CATEGORIES_INDEX
+CAST_MEMBERS_INDEX = ElasticsearchCastMemberRepository.INDEX
+VIDEOS_INDEX = ElasticsearchVideoRepository.INDEX
+
+# Searched as text, sorted and filtered on the `keyword` sub-field, as repositories query them
+TEXT = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+# Debezium encodes DATETIME columns as epoch milliseconds and TIMESTAMP columns as ISO strings
+TIMESTAMP = {"type": "date", "format": "epoch_millis||strict_date_optional_time"}
+BOOLEAN = {"type": "boolean"}
+VERSION = {"type": "long"}
+
+_ENTITY_PROPERTIES = {"id": TEXT, "created_at": TIMESTAMP, "updated_at": TIMESTAMP, "is_active": BOOLEAN}
+
+MAPPINGS: dict[str, dict] = {
+    CATEGORIES_INDEX: {
+        "dynamic": "strict",
+        "properties": {**_ENTITY_PROPERTIES, "name": TEXT, "description": TEXT},
+    },
+    GENRES_INDEX: {
+        "dynamic": "strict",
+        "properties": {**_ENTITY_PROPERTIES, "name": TEXT},
+    },
+    GENRE_CATEGORIES_INDEX: {
+        "dynamic": "strict",
+        "properties": {"id": TEXT, "genre_id": TEXT, "category_id": TEXT},
+    },
+    CAST_MEMBERS_INDEX: {
+        "dynamic": "strict",
+        "properties": {**_ENTITY_PROPERTIES, "name": TEXT, "type": TEXT},
+    },
+    # Written through scripts rather than projected, fields they add are still mapped dynamically
+    VIDEOS_INDEX: {
+        "properties": {
+            **_ENTITY_PROPERTIES,
+            "title": TEXT,
+            "launch_year": {"type": "integer"},
+            "rating": TEXT,
+            "categories": TEXT,
+            "genres": TEXT,
+            "cast_members": TEXT,
+            "banner_url": {"type": "keyword", "index": False},
+            **{field: {"properties": {"id": TEXT, "name": TEXT, "version": VERSION}} for field in NAME_FIELDS.values()},
+            VERSION_FIELD: VERSION,
+            # Only read by the update scripts, never searched
+            LINKS_FIELD: {"type": "object", "enabled": False},
+        },
+    },
+}
+
+# Catalog tables are small: a single shard is enough to hold them and keeps each search to a single request
+INDEX_SETTINGS = {"number_of_shards": 1, "refresh_interval": "1s"}
+
+
+def document_fields(index: str) -> frozenset[str]:
+    return frozenset(MAPPINGS[index]["properties"])
+
+
+def to_document(index: str, row: dict) -> dict:
+    """Document of a row: its mapped columns, with MySQL's TINYINT(1) booleans cast to booleans."""
+    properties = MAPPINGS[index]["properties"]
+    document = {}
+    for field, value in row.items():
+        if field not in properties:
+            continue
+        if properties[field]["type"] == "boolean" and value is not None:
+            value = bool(value)
+        document[field] = value
+    return document
@@ -0,0 +1,213 @@
+import argparse
+import logging
+import re
+import time
+from typing import Callable
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+from src.infra.elasticsearch import ELASTICSEARCH_HOST
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.indices import create_index
+from src.infra.elasticsearch.mappings import MAPPINGS
+
+logger = logging.getLogger(__name__)
+
+# Documents read per scroll batch by each slice of a reindex
+DEFAULT_SCROLL_SIZE = 1000
+# Seconds between two status requests of a running reindex task
+DEFAULT_POLL_INTERVAL = 5.0
+# Slices a copy is split into. The indices have a single shard (see INDEX_SETTINGS), which "auto" would copy with
+# a single slice: each of these scrolls its own part of the shard and writes it in parallel with the others
+DEFAULT_SLICES = 4
+
+
+class ReindexError(Exception):
+    pass
+
+
+class Reindexer:
+    """
+    Rebuilds an index with its current mapping without downtime. Repositories read and the consumer writes
+    through an alias: a new version of the index is created and filled from the one the alias points to, with
+    a sliced `_reindex` task, then the alias is swapped to it in a single atomic request.
+
+    Writes landing in the source during the copy are caught up by a second pass, which keeps the external
+    versions of the documents so the newer copy of each one wins, and by a last one once the alias is swapped,
+    for those landing between that pass and the swap. Deletions made during the copy are not: replay the topics
+    from the start of the reindex to apply them.
+    """
+
+    def __init__(
+        self,
+        client: Elasticsearch,
+        alias: str,
+        slices: int | str = DEFAULT_SLICES,
+        requests_per_second: float | None = None,
+        scroll_size: int = DEFAULT_SCROLL_SIZE,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        :param client: Elasticsearch client
+        :param alias: Alias the repositories read the index through, i.e. their `INDEX`
+        :param slices: Number of slices the copy is split into and run in parallel, "auto" is one per shard
+        :param requests_per_second: Throttle of the copy, in documents per second. None means unthrottled
+        :param scroll_size: Documents read per scroll batch by each slice
+        :param poll_interval: Seconds between two status requests of the copy
+        :param sleep: Waits between two status requests, injectable for tests
+        """
+        self._client = client
+        self.alias = alias
+        self.slices = slices
+        self.requests_per_second = requests_per_second
+        self.scroll_size = scroll_size
+        self.poll_interval = poll_interval
+        self._sleep = sleep
+
+    def current_indices(self) -> list[str]:
+        """Indices the alias points to, or the index named like it when it is not an alias yet."""
+        try:
+            return list(self._client.indices.get_alias(name=self.alias))
+        except NotFoundError:
+            pass
+        if self._client.indices.exists(index=self.alias):
+            return [self.alias]
+        return []
+
+    def next_version(self) -> int:
+        versions = [
+            int(match.group(1))
+            for index in self._client.indices.get(index=f"{self.alias}_v*", allow_no_indices=True, expand_wildcards="all")
+            if (match := re.fullmatch(rf"{re.escape(self.alias)}_v(\d+)", index))
+        ]
+        return max(versions, default=0) + 1
+
+    def run(self, delete_source: bool = False) -> str:
+        """Reindexes into a new version of the index and points the alias to it. Returns the new index."""
+        sources = self.current_indices()
+        if len(sources) > 1:
+            raise ReindexError(f"{self.alias} points to several indices: {sources}")
+        source = sources[0] if sources else None
+
+        target = create_index(self._client, self.alias, self.next_version(), with_alias=False)
+        if source is None:
+            self._swap(source, target)
+            return target
+
+        bulk_load = BulkLoadSettings(client=self._client, index=target)
+        bulk_load.apply()
+        try:
+            copied = self._copy(source, target)
+            self._copy(source, target, catch_up=True)
+        finally:
+            bulk_load.restore()
+
+        self._verify(source, target, copied)
+        self._swap(source, target)
+        # Writes go to the target from now on, those that landed in the source since the catch up are copied
+        self._copy(source, target, catch_up=True)
+        if delete_source:
+            self._delete(source)
+        return target
+
+    def swap(self, target: str, delete_source: bool = False) -> None:
+        """Points the alias to `target` instead of the index it points to, e.g. a version rebuilt by a replay."""
+        sources = self.current_indices()
+        if len(sources) > 1:
+            raise ReindexError(f"{self.alias} points to several indices: {sources}")
+        source = sources[0] if sources else None
+        if source == target:
+            logger.info(f"{self.alias} already points to {target}")
+            return
+        self._swap(source, target)
+        if delete_source and source is not None:
+            self._delete(source)
+
+    def _delete(self, source: str) -> None:
+        # An index named like the alias was removed by the swap itself
+        if source == self.alias:
+            return
+        self._client.indices.delete(index=source)
+        logger.info(f"Deleted index {source}")
+
+    def _copy(self, source: str, target: str, catch_up: bool = False) -> dict:
+        response = self._client.reindex(
+            source={"index": source, "size": self.scroll_size},
+            # Documents keep their version: during the catch up, only those changed since the first pass are copied
+            dest={"index": target, "version_type": "external"},
+            conflicts="proceed",
+            slices=self.slices,
+            requests_per_second=self.requests_per_second or -1,
+            wait_for_completion=False,
+        )
+        status = self._wait(response["task"])
+        logger.info(
+            f"{'Caught up' if catch_up else 'Copied'} {source} into {target}: {status['created']} created, "
+            f"{status['updated']} updated, {status['version_conflicts']} unchanged out of {status['total']}"
+        )
+        return status
+
+    def _wait(self, task_id: str) -> dict:
+        while True:
+            response = self._client.tasks.get(task_id=task_id)
+            status = response["task"]["status"]
+            if response["completed"]:
+                break
+            done = status["created"] + status["updated"] + status["version_conflicts"]
+            logger.info(f"Reindex task {task_id}: {done} of {status['total']} documents")
+            self._sleep(self.poll_interval)
+
+        if "error" in response:
+            raise ReindexError(f"Reindex task {task_id} failed: {response['error']}")
+        failures = response["response"]["failures"] if "response" in response else []
+        if failures:
+            raise ReindexError(f"Reindex task {task_id} failed on {len(failures)} document(s): {failures[:5]}")
+        return status
+
+    def _verify(self, source: str, target: str, copied: dict) -> None:
+        self._client.indices.refresh(index=target)
+        target_count = self._client.count(index=target)["count"]
+        source_count = self._client.count(index=source)["count"]
+        # Every document of the first pass must be there. The source may have changed since
+        if target_count < copied["total"]:
+            raise ReindexError(f"{target} has {target_count} documents, {copied['total']} were copied from {source}")
+        if target_count != source_count:
+            logger.warning(f"{target} has {target_count} documents, {source} has {source_count}: changed during the copy")
+        else:
+            logger.info(f"{target} has {target_count} documents, as {source}")
+
+    def _swap(self, source: str | None, target: str) -> None:
+        actions = [{"add": {"index": target, "alias": self.alias}}]
+        if source == self.alias:
+            # An index named like the alias, e.g. created by the sink connector: it is replaced by the alias
+            actions.append({"remove_index": {"index": source}})
+        elif source is not None:
+            actions.append({"remove": {"index": source, "alias": self.alias}})
+        self._client.indices.update_aliases(actions=actions)
+        logger.info(f"{self.alias} now points to {target}, instead of {source}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Rebuilds catalog indices with their current mapping")
+    arg_parser.add_argument("indices", nargs="*", help=f"Aliases to reindex, all by default: {', '.join(MAPPINGS)}")
+    arg_parser.add_argument(
+        "--slices",
+        default=str(DEFAULT_SLICES),
+        help=f"Parallel slices of each copy, {DEFAULT_SLICES} by default, auto is one per shard",
+    )
+    arg_parser.add_argument("--requests-per-second", type=float, default=None, help="Throttle of each copy")
+    arg_parser.add_argument("--delete-source", action="store_true", help="Delete the previous index once swapped")
+    args = arg_parser.parse_args()
+    if unknown := set(args.indices) - set(MAPPINGS):
+        arg_parser.error(f"Unknown indices: {', '.join(sorted(unknown))}")
+
+    client = Elasticsearch(hosts=[ELASTICSEARCH_HOST])
+    for alias in args.indices or MAPPINGS:
+        Reindexer(
+            client=client,
+            alias=alias,
+            slices=args.slices if args.slices == "auto" else int(args.slices),
+            requests_per_second=args.requests_per_second,
+        ).run(delete_source=args.delete_source)
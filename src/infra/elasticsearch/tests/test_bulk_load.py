@@ -0,0 +1,75 @@
+from unittest.mock import MagicMock
+
+import pytest
+from elasticsearch import Elasticsearch
+
+from src.infra.elasticsearch.bulk_load import BULK_LOAD_SETTINGS, ORIGINAL_SETTINGS_META, BulkLoadSettings
+
+INDEX = "catalog-db.codeflix.videos_v1"
+
+
+@pytest.fixture
+def client() -> Elasticsearch:
+    """Client of an index whose settings and mapping `_meta` are kept in memory."""
+    client = MagicMock(spec=Elasticsearch)
+    client.indices = MagicMock()
+    settings = {"index.refresh_interval": "30s", "index.number_of_replicas": "2"}
+    mappings = {"_meta": {"owner": "catalog"}}
+
+    def put_settings(index: str, settings: dict) -> None:
+        for name, value in settings["index"].items():
+            client.settings[f"index.{name}"] = None if value is None else str(value)
+
+    def put_mapping(index: str, meta: dict) -> None:
+        mappings["_meta"] = meta
+
+    client.indices.get_settings.side_effect = lambda index, **kwargs: {INDEX: {"settings": dict(settings)}}
+    client.indices.put_settings.side_effect = put_settings
+    client.indices.get_mapping.side_effect = lambda index: {INDEX: {"mappings": mappings}}
+    client.indices.put_mapping.side_effect = put_mapping
+    client.settings = settings
+    client.mappings = mappings
+    return client
+
+
+class TestBulkLoadSettings:
+    def test_original_settings_are_restored(self, client: Elasticsearch) -> None:
+        bulk_load = BulkLoadSettings(client=client, index=INDEX)
+
+        bulk_load.apply()
+        assert client.settings == {"index.refresh_interval": "-1", "index.number_of_replicas": "0"}
+        bulk_load.restore()
+
+        assert client.settings == {"index.refresh_interval": "30s", "index.number_of_replicas": "2"}
+        assert client.mappings["_meta"] == {"owner": "catalog"}
+
+    def test_original_settings_are_kept_with_the_index_while_applied(self, client: Elasticsearch) -> None:
+        BulkLoadSettings(client=client, index=INDEX).apply()
+
+        assert client.mappings["_meta"] == {
+            "owner": "catalog",
+            ORIGINAL_SETTINGS_META: {"refresh_interval": "30s", "number_of_replicas": "2"},
+        }
+
+    def test_concurrent_loads_restore_the_settings_from_before_the_first_one(self, client: Elasticsearch) -> None:
+        first, second = BulkLoadSettings(client=client, index=INDEX), BulkLoadSettings(client=client, index=INDEX)
+
+        first.apply()
+        second.apply()
+        first.restore()
+        second.restore()
+
+        assert client.settings == {"index.refresh_interval": "30s", "index.number_of_replicas": "2"}
+
+    def test_when_bulk_load_settings_are_found_without_their_record_then_restore_the_defaults(
+        self,
+        client: Elasticsearch,
+    ) -> None:
+        client.settings.update({f"index.{name}": str(value) for name, value in BULK_LOAD_SETTINGS.items()})
+        bulk_load = BulkLoadSettings(client=client, index=INDEX)
+
+        bulk_load.apply()
+        bulk_load.restore()
+
+        assert client.settings["index.refresh_interval"] == "1s"
+        assert client.settings["index.number_of_replicas"] is None
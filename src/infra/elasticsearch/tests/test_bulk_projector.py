@@ -0,0 +1,162 @@
+from unittest.mock import MagicMock
+
+import pytest
+from elasticsearch import Elasticsearch, helpers
+from pytest_mock import MockFixture
+
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX, INDEX_SETTINGS, MAPPINGS
+from src.infra.metrics.registry import MetricsRegistry
+
+
+class FakeBulk:
+    """Stands for `helpers.streaming_bulk`, answering each action with the status given for its document."""
+
+    def __init__(self) -> None:
+        self.requests: list[list[dict]] = []
+        self.statuses: dict[str, int] = {}
+
+    def __call__(self, client: Elasticsearch, actions: list[dict], **kwargs) -> list[tuple[bool, dict]]:
+        self.requests.append(list(actions))
+        results = []
+        for action in actions:
+            status = self.statuses.get(action["_id"], 200)
+            results.append((status < 300, {action["_op_type"]: {"_id": action["_id"], "status": status}}))
+        return results
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def bulk(mocker: MockFixture) -> FakeBulk:
+    bulk = FakeBulk()
+    mocker.patch("src.infra.elasticsearch.bulk_projector.helpers.streaming_bulk", side_effect=bulk)
+    return bulk
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def projector(clock: Clock) -> BulkProjector:
+    client = MagicMock(spec=Elasticsearch)
+    client.indices = MagicMock()
+    client.indices.exists.return_value = True
+    return BulkProjector(
+        index=CATEGORIES_INDEX,
+        client=client,
+        batch_size=3,
+        flush_interval=1.0,
+        clock=clock,
+        metrics=MetricsRegistry(),
+    )
+
+
+class TestBulkProjector:
+    def test_documents_are_buffered_until_flushed(self, projector: BulkProjector, bulk: FakeBulk) -> None:
+        projector.index_document("1", {"name": "Drama"})
+        projector.index_document("2", {"name": "Comedy"})
+        assert bulk.requests == []
+
+        projector.flush()
+
+        assert [[action["_id"] for action in request] for request in bulk.requests] == [["1", "2"]]
+        assert projector.pending == 0
+
+    def test_only_the_latest_change_of_a_document_is_written(self, projector: BulkProjector, bulk: FakeBulk) -> None:
+        projector.index_document("1", {"name": "Drama"}, version=1)
+        projector.index_document("1", {"name": "Dramas"}, version=2)
+        projector.delete_document("2", version=3)
+        projector.flush()
+
+        assert bulk.requests == [[
+            {
+                "_index": CATEGORIES_INDEX,
+                "_id": "1",
+                "_op_type": "index",
+                "_source": {"name": "Dramas"},
+                "version": 2,
+                "version_type": "external",
+            },
+            {"_index": CATEGORIES_INDEX, "_id": "2", "_op_type": "delete", "version": 3, "version_type": "external"},
+        ]]
+
+    def test_full_batch_is_written_right_away(self, projector: BulkProjector, bulk: FakeBulk) -> None:
+        for id in ("1", "2", "3"):
+            projector.index_document(id, {})
+
+        assert len(bulk.requests) == 1
+
+    def test_buffer_is_written_once_its_oldest_document_waited_the_flush_interval(
+        self,
+        projector: BulkProjector,
+        bulk: FakeBulk,
+        clock: Clock,
+    ) -> None:
+        projector.index_document("1", {})
+        clock.now = 0.5
+        projector.index_document("2", {})
+        assert bulk.requests == []
+
+        clock.now = 1.0
+        projector.index_document("3", {})
+
+        assert [action["_id"] for action in bulk.requests[0]] == ["1", "2", "3"]
+
+    def test_stale_writes_and_deletions_of_missing_documents_are_skipped(
+        self,
+        projector: BulkProjector,
+        bulk: FakeBulk,
+    ) -> None:
+        bulk.statuses = {"1": 409, "2": 404}
+        projector.index_document("1", {}, version=1)
+        projector.delete_document("2", version=2)
+
+        projector.flush()
+
+        assert projector.metrics.counter("ingestion_stale_writes_total", index=CATEGORIES_INDEX) == 1
+        assert projector.pending == 0
+
+    def test_when_a_write_fails_then_keep_the_batch_without_overwriting_newer_changes(
+        self,
+        projector: BulkProjector,
+        bulk: FakeBulk,
+    ) -> None:
+        bulk.statuses = {"1": 500}
+        projector.index_document("1", {"name": "Drama"})
+        projector.index_document("2", {"name": "Comedy"})
+
+        with pytest.raises(helpers.BulkIndexError):
+            projector.flush()
+        projector.index_document("2", {"name": "Comedies"})
+        bulk.statuses = {}
+        projector.flush()
+
+        assert [action["_source"]["name"] for action in bulk.requests[1]] == ["Drama", "Comedies"]
+
+    def test_missing_index_is_created_with_its_mapping_and_alias_before_the_first_write(
+        self,
+        projector: BulkProjector,
+        bulk: FakeBulk,
+    ) -> None:
+        projector.client.indices.exists.return_value = False
+
+        projector.index_document("1", {})
+        projector.flush()
+        projector.index_document("2", {})
+        projector.flush()
+
+        projector.client.indices.create.assert_called_once_with(
+            index=f"{CATEGORIES_INDEX}_v1",
+            mappings=MAPPINGS[CATEGORIES_INDEX],
+            settings=INDEX_SETTINGS,
+            aliases={CATEGORIES_INDEX: {}},
+        )
@@ -0,0 +1,165 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import pytest
+from elasticsearch import ConflictError, Elasticsearch
+from pytest_mock import MockFixture
+
+from src.domain.video import Rating, Video
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+from src.infra.elasticsearch.mappings import VIDEOS_INDEX
+
+
+@pytest.fixture
+def client() -> Elasticsearch:
+    client = MagicMock(spec=Elasticsearch)
+    client.indices = MagicMock()
+    client.indices.exists.return_value = False
+    client.update.return_value = {"result": "updated"}
+    return client
+
+
+class TestEnsureIndex:
+    def test_index_and_alias_are_created_before_the_first_write(self, client: Elasticsearch) -> None:
+        repository = ElasticsearchVideoRepository(client=client)
+
+        repository.update(uuid4(), {"title": "Title"}, version=1, upsert=True)
+        repository.update(uuid4(), {"title": "Title"}, version=1, upsert=True)
+
+        client.indices.create.assert_called_once()
+        assert client.indices.create.call_args.kwargs["aliases"] == {VIDEOS_INDEX: {}}
+
+    def test_bulk_writes_create_the_index_first(self, client: Elasticsearch, mocker: MockFixture) -> None:
+        mocker.patch(
+            "src.infra.elasticsearch.elasticsearch_video_repository.helpers.streaming_bulk",
+            side_effect=lambda *args, **kwargs: client.indices.create.assert_called_once() or [],
+        )
+        repository = ElasticsearchVideoRepository(client=client, index=f"{VIDEOS_INDEX}_v2")
+
+        repository.delete_many([uuid4()], versions={})
+
+        assert client.indices.create.call_args.kwargs["index"] == f"{VIDEOS_INDEX}_v2"
+
+
+class TestPartialUpdates:
+    def test_changed_fields_are_sent_with_the_whole_row_as_fallback(
+        self,
+        client: Elasticsearch,
+        mocker: MockFixture,
+    ) -> None:
+        bulk = mocker.patch(
+            "src.infra.elasticsearch.elasticsearch_video_repository.helpers.streaming_bulk",
+            return_value=[],
+        )
+        video = Video(
+            id=uuid4(),
+            title="The Godfather Part II",
+            launch_year=1974,
+            rating=Rating.AGE_18,
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 2, 1),
+            is_active=True,
+        )
+
+        ElasticsearchVideoRepository(client=client).update_many(
+            {video.id: {"title": "The Godfather Part II"}},
+            versions={video.id: 7},
+            videos={video.id: video},
+        )
+
+        [action] = list(bulk.call_args.args[1])
+        params = action["script"]["params"]
+        assert params["doc"] == {"title": "The Godfather Part II"}
+        assert params["row"]["launch_year"] == 1974
+        assert "categories" not in params["row"]
+        assert (params["version"], action["scripted_upsert"], action["upsert"]) == (7, True, {})
+
+
+class TestWholeRowSaves:
+    @pytest.fixture
+    def video(self) -> Video:
+        return Video(
+            id=uuid4(),
+            title="The Godfather",
+            launch_year=1972,
+            rating=Rating.AGE_18,
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 1, 1),
+            is_active=True,
+        )
+
+    def test_new_videos_are_created_without_a_script(
+        self,
+        client: Elasticsearch,
+        mocker: MockFixture,
+        video: Video,
+    ) -> None:
+        sent = []
+
+        def streaming_bulk(client, actions, **kwargs) -> list:
+            sent.append(actions := list(actions))
+            return [(True, {"create": {"_id": action["_id"], "result": "created"}}) for action in actions]
+
+        mocker.patch(
+            "src.infra.elasticsearch.elasticsearch_video_repository.helpers.streaming_bulk",
+            side_effect=streaming_bulk,
+        )
+
+        ElasticsearchVideoRepository(client=client).save_many([video], versions={video.id: 7})
+
+        [[action]] = sent
+        assert action["_op_type"] == "create"
+        assert "script" not in action
+        assert (action["_source"]["title"], action["_source"]["cdc_version"]) == ("The Godfather", 7)
+        assert "categories" not in action["_source"]
+
+    def test_existing_videos_get_the_versioned_update(
+        self,
+        client: Elasticsearch,
+        mocker: MockFixture,
+        video: Video,
+    ) -> None:
+        sent = []
+
+        def streaming_bulk(client, actions, **kwargs) -> list:
+            sent.append(actions := list(actions))
+            if actions[0]["_op_type"] == "create":
+                return [(False, {"create": {"_id": action["_id"], "status": 409}}) for action in actions]
+            return [(True, {"update": {"_id": action["_id"], "result": "updated"}}) for action in actions]
+
+        mocker.patch(
+            "src.infra.elasticsearch.elasticsearch_video_repository.helpers.streaming_bulk",
+            side_effect=streaming_bulk,
+        )
+
+        ElasticsearchVideoRepository(client=client).save_many([video], versions={video.id: 7})
+
+        [update] = sent[1]
+        assert (update["_op_type"], update["_id"]) == ("update", str(video.id))
+        assert update["script"]["params"]["version"] == 7
+        assert update["script"]["params"]["doc"]["title"] == "The Godfather"
+
+    def test_single_save_of_an_existing_video_gets_the_versioned_update(
+        self,
+        client: Elasticsearch,
+        video: Video,
+    ) -> None:
+        client.create.side_effect = ConflictError(message="version conflict", meta=MagicMock(status=409), body={})
+
+        ElasticsearchVideoRepository(client=client).save(video, version=7)
+
+        assert client.update.call_args.kwargs["script"]["params"]["version"] == 7
+
+    def test_deletes_are_not_scripted(self, client: Elasticsearch, mocker: MockFixture) -> None:
+        bulk = mocker.patch(
+            "src.infra.elasticsearch.elasticsearch_video_repository.helpers.streaming_bulk",
+            return_value=[],
+        )
+        id = uuid4()
+
+        ElasticsearchVideoRepository(client=client).delete_many([id], versions={id: 7})
+
+        [action] = list(bulk.call_args.args[1])
+        assert (action["_op_type"], action["_id"]) == ("delete", str(id))
+        assert "script" not in action
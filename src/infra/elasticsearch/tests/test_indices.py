@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import pytest
+from elasticsearch import BadRequestError, Elasticsearch
+
+from src.infra.elasticsearch.indices import ensure_index
+from src.infra.elasticsearch.mappings import INDEX_SETTINGS, MAPPINGS, VIDEOS_INDEX
+
+
+@pytest.fixture
+def client() -> Elasticsearch:
+    client = MagicMock(spec=Elasticsearch)
+    client.indices = MagicMock()
+    client.indices.exists.return_value = False
+    return client
+
+
+class TestEnsureIndex:
+    def test_missing_index_is_created_as_the_first_version_behind_its_alias(self, client: Elasticsearch) -> None:
+        ensure_index(client, VIDEOS_INDEX)
+
+        client.indices.create.assert_called_once_with(
+            index=f"{VIDEOS_INDEX}_v1",
+            mappings=MAPPINGS[VIDEOS_INDEX],
+            settings=INDEX_SETTINGS,
+            aliases={VIDEOS_INDEX: {}},
+        )
+
+    def test_missing_version_is_created_with_the_mapping_of_the_alias_without_it(self, client: Elasticsearch) -> None:
+        ensure_index(client, VIDEOS_INDEX, f"{VIDEOS_INDEX}_v3")
+
+        client.indices.exists.assert_called_once_with(index=f"{VIDEOS_INDEX}_v3")
+        client.indices.create.assert_called_once_with(
+            index=f"{VIDEOS_INDEX}_v3",
+            mappings=MAPPINGS[VIDEOS_INDEX],
+            settings=INDEX_SETTINGS,
+        )
+
+    def test_existing_index_is_left_as_is(self, client: Elasticsearch) -> None:
+        client.indices.exists.return_value = True
+
+        ensure_index(client, VIDEOS_INDEX)
+
+        client.indices.create.assert_not_called()
+
+    def test_index_created_meanwhile_by_another_worker_is_fine(self, client: Elasticsearch) -> None:
+        client.indices.create.side_effect = BadRequestError(
+            message="resource_already_exists_exception",
+            meta=MagicMock(status=400),
+            body={"error": {"type": "resource_already_exists_exception"}},
+        )
+
+        ensure_index(client, VIDEOS_INDEX)
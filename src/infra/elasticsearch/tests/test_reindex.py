@@ -0,0 +1,174 @@
+from unittest.mock import MagicMock, call
+
+import pytest
+from elasticsearch import Elasticsearch, NotFoundError
+
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX, INDEX_SETTINGS, MAPPINGS
+from src.infra.elasticsearch.reindex import DEFAULT_SLICES, ReindexError, Reindexer
+
+ALIAS = CATEGORIES_INDEX
+
+
+def task_status(completed: bool, total: int = 10, created: int = 0, failures: list | None = None) -> dict:
+    return {
+        "completed": completed,
+        "task": {"status": {"total": total, "created": created, "updated": 0, "version_conflicts": 0}},
+        **({"response": {"failures": failures or []}} if completed else {}),
+    }
+
+
+def not_found() -> NotFoundError:
+    return NotFoundError(message="not found", meta=MagicMock(status=404), body={})
+
+
+@pytest.fixture
+def client() -> Elasticsearch:
+    client = MagicMock(spec=Elasticsearch)
+    client.indices = MagicMock()
+    client.tasks = MagicMock()
+    client.indices.get_alias.return_value = {f"{ALIAS}_v1": {"aliases": {ALIAS: {}}}}
+    client.indices.get.return_value = {f"{ALIAS}_v1": {}}
+    client.indices.get_settings.return_value = {f"{ALIAS}_v2": {"settings": {}}}
+    client.indices.get_mapping.return_value = {f"{ALIAS}_v2": {"mappings": {}}}
+    client.reindex.side_effect = [{"task": "node:1"}, {"task": "node:2"}, {"task": "node:3"}]
+    client.tasks.get.side_effect = [
+        task_status(completed=False, created=5),
+        task_status(completed=True, created=10),
+        task_status(completed=True, created=0),
+        task_status(completed=True, created=0),
+    ]
+    client.count.return_value = {"count": 10}
+    return client
+
+
+@pytest.fixture
+def reindexer(client: Elasticsearch) -> Reindexer:
+    return Reindexer(client=client, alias=ALIAS, slices=4, sleep=lambda seconds: None)
+
+
+class TestReindexer:
+    def test_new_version_is_created_with_the_current_mapping(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        assert reindexer.run() == f"{ALIAS}_v2"
+
+        client.indices.create.assert_called_once_with(
+            index=f"{ALIAS}_v2",
+            mappings=MAPPINGS[ALIAS],
+            settings=INDEX_SETTINGS,
+            aliases=None,
+        )
+
+    def test_copy_is_sliced_and_keeps_the_versions_then_caught_up(
+        self,
+        reindexer: Reindexer,
+        client: Elasticsearch,
+    ) -> None:
+        reindexer.run()
+
+        expected = call(
+            source={"index": f"{ALIAS}_v1", "size": 1000},
+            dest={"index": f"{ALIAS}_v2", "version_type": "external"},
+            conflicts="proceed",
+            slices=4,
+            requests_per_second=-1,
+            wait_for_completion=False,
+        )
+        assert client.reindex.call_args_list == [expected, expected, expected]
+
+    def test_copy_of_a_single_shard_index_is_sliced_by_default(self, client: Elasticsearch) -> None:
+        Reindexer(client=client, alias=ALIAS, sleep=lambda seconds: None).run()
+
+        assert INDEX_SETTINGS["number_of_shards"] == 1
+        assert client.reindex.call_args.kwargs["slices"] == DEFAULT_SLICES
+
+    def test_writes_landing_before_the_swap_are_caught_up_after_it(
+        self,
+        reindexer: Reindexer,
+        client: Elasticsearch,
+    ) -> None:
+        reindexer.run()
+
+        calls = [name for name, _, _ in client.mock_calls if name in ("reindex", "indices.update_aliases")]
+        assert calls == ["reindex", "reindex", "indices.update_aliases", "reindex"]
+
+    def test_bulk_load_settings_are_applied_during_the_copy(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        reindexer.run()
+
+        settings = [call.kwargs["settings"] for call in client.indices.put_settings.call_args_list]
+        assert settings[0] == {"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+        assert settings[1] == {"index": {"refresh_interval": None, "number_of_replicas": None}}
+
+    def test_alias_is_swapped_atomically(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        reindexer.run()
+
+        client.indices.update_aliases.assert_called_once_with(actions=[
+            {"add": {"index": f"{ALIAS}_v2", "alias": ALIAS}},
+            {"remove": {"index": f"{ALIAS}_v1", "alias": ALIAS}},
+        ])
+        client.indices.delete.assert_not_called()
+
+    def test_previous_version_is_deleted_when_asked(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        reindexer.run(delete_source=True)
+
+        client.indices.delete.assert_called_once_with(index=f"{ALIAS}_v1")
+
+    def test_alias_is_swapped_to_a_replayed_version(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        reindexer.swap(f"{ALIAS}_v3", delete_source=True)
+
+        client.reindex.assert_not_called()
+        client.indices.update_aliases.assert_called_once_with(actions=[
+            {"add": {"index": f"{ALIAS}_v3", "alias": ALIAS}},
+            {"remove": {"index": f"{ALIAS}_v1", "alias": ALIAS}},
+        ])
+        client.indices.delete.assert_called_once_with(index=f"{ALIAS}_v1")
+
+    def test_swap_to_the_current_version_does_nothing(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        reindexer.swap(f"{ALIAS}_v1", delete_source=True)
+
+        client.indices.update_aliases.assert_not_called()
+        client.indices.delete.assert_not_called()
+
+    def test_index_named_like_the_alias_is_replaced_by_it(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        client.indices.get_alias.side_effect = not_found()
+        client.indices.exists.return_value = True
+        client.indices.get.return_value = {}
+
+        assert reindexer.run() == f"{ALIAS}_v1"
+
+        client.indices.update_aliases.assert_called_once_with(actions=[
+            {"add": {"index": f"{ALIAS}_v1", "alias": ALIAS}},
+            {"remove_index": {"index": ALIAS}},
+        ])
+
+    def test_missing_index_is_created_behind_its_alias(self, reindexer: Reindexer, client: Elasticsearch) -> None:
+        client.indices.get_alias.side_effect = not_found()
+        client.indices.exists.return_value = False
+        client.indices.get.return_value = {}
+
+        reindexer.run()
+
+        client.reindex.assert_not_called()
+        client.indices.update_aliases.assert_called_once_with(actions=[{"add": {"index": f"{ALIAS}_v1", "alias": ALIAS}}])
+
+    def test_when_documents_failed_to_be_copied_then_keep_the_alias(
+        self,
+        reindexer: Reindexer,
+        client: Elasticsearch,
+    ) -> None:
+        client.tasks.get.side_effect = [task_status(completed=True, failures=[{"id": "1", "cause": "mapper_parsing"}])]
+
+        with pytest.raises(ReindexError):
+            reindexer.run()
+
+        client.indices.update_aliases.assert_not_called()
+
+    def test_when_documents_are_missing_after_the_copy_then_keep_the_alias(
+        self,
+        reindexer: Reindexer,
+        client: Elasticsearch,
+    ) -> None:
+        client.count.return_value = {"count": 9}
+
+        with pytest.raises(ReindexError):
+            reindexer.run()
+
+        client.indices.update_aliases.assert_not_called()
@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock
+
+import pytest
+from elasticsearch import Elasticsearch, NotFoundError
+
+from src.infra.elasticsearch.update_by_query_tasks import UpdateByQueryTasks
+from src.infra.metrics.registry import MetricsRegistry
+
+QUERY = {"term": {"categories.keyword": "1"}}
+SCRIPT = {"source": "ctx._source.name = params.name", "params": {"name": "Drama"}}
+
+
+def task_status(completed: bool, total: int = 10, updated: int = 0, version_conflicts: int = 0) -> dict:
+    return {
+        "completed": completed,
+        "task": {"status": {"total": total, "updated": updated, "noops": 0, "version_conflicts": version_conflicts}},
+    }
+
+
+@pytest.fixture
+def client() -> Elasticsearch:
+    client = MagicMock(spec=Elasticsearch)
+    client.tasks = MagicMock()
+    client.update_by_query.side_effect = [{"task": "node:1"}, {"task": "node:2"}, {"task": "node:3"}]
+    return client
+
+
+@pytest.fixture
+def tasks(client: Elasticsearch) -> UpdateByQueryTasks:
+    return UpdateByQueryTasks(client=client, index="videos", requests_per_second=100, max_attempts=2, metrics=MetricsRegistry())
+
+
+class TestUpdateByQueryTasks:
+    def test_submit_a_throttled_sliced_background_task(self, tasks: UpdateByQueryTasks, client: Elasticsearch) -> None:
+        assert tasks.submit(("categories", 1), QUERY, SCRIPT) == "node:1"
+
+        client.update_by_query.assert_called_once_with(
+            index="videos",
+            query=QUERY,
+            script=SCRIPT,
+            conflicts="proceed",
+            slices="auto",
+            requests_per_second=100,
+            wait_for_completion=False,
+        )
+        assert tasks.progress[("categories", 1)].task_id == "node:1"
+
+    def test_newer_task_for_the_same_key_cancels_the_running_one(
+        self,
+        tasks: UpdateByQueryTasks,
+        client: Elasticsearch,
+    ) -> None:
+        tasks.submit(("categories", 1), QUERY, SCRIPT)
+        tasks.submit(("categories", 2), QUERY, SCRIPT)
+        tasks.submit(("categories", 1), QUERY, SCRIPT)
+
+        client.tasks.cancel.assert_called_once_with(task_id="node:1")
+        assert {key: progress.task_id for key, progress in tasks.progress.items()} == {
+            ("categories", 1): "node:3",
+            ("categories", 2): "node:2",
+        }
+
+    def test_poll_reports_progress_then_forgets_completed_tasks(
+        self,
+        tasks: UpdateByQueryTasks,
+        client: Elasticsearch,
+    ) -> None:
+        tasks.submit(("categories", 1), QUERY, SCRIPT)
+        client.tasks.get.side_effect = [task_status(False, updated=4), task_status(True, updated=10)]
+
+        assert tasks.poll() == {}
+        assert tasks.progress[("categories", 1)].ratio == 0.4
+
+        completed = tasks.poll()
+        assert completed[("categories", 1)].updated == 10
+        assert tasks.progress == {}
+        assert tasks.metrics.counter("update_by_query_documents_total", index="videos") == 10
+
+    def test_task_skipping_documents_written_concurrently_runs_again(
+        self,
+        tasks: UpdateByQueryTasks,
+        client: Elasticsearch,
+    ) -> None:
+        tasks.submit(("categories", 1), QUERY, SCRIPT)
+        client.tasks.get.side_effect = [
+            task_status(True, updated=8, version_conflicts=2),
+            task_status(True, updated=1, version_conflicts=1),
+        ]
+
+        assert tasks.poll() == {}
+        assert tasks.progress[("categories", 1)].attempt == 2
+        # Last attempt: given up on, reported as completed
+        assert tasks.poll()[("categories", 1)].version_conflicts == 1
+        assert client.update_by_query.call_count == 2
+
+    def test_task_unknown_to_the_cluster_is_forgotten(self, tasks: UpdateByQueryTasks, client: Elasticsearch) -> None:
+        tasks.submit(("categories", 1), QUERY, SCRIPT)
+        client.tasks.get.side_effect = NotFoundError("not found", MagicMock(), {})
+
+        tasks.poll()
+
+        assert tasks.progress == {}
@@ -0,0 +1,142 @@
+import logging
+from dataclasses import dataclass
+from typing import Hashable
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Documents rewritten per second by each task, so cascades do not starve the ingestion writes of the cluster
+DEFAULT_REQUESTS_PER_SECOND = 500.0
+# Tasks skip the documents written concurrently, then run again over the same query up to this many times
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+@dataclass
+class TaskProgress:
+    task_id: str
+    attempt: int = 1
+    total: int = 0
+    updated: int = 0
+    noops: int = 0
+    version_conflicts: int = 0
+    completed: bool = False
+
+    @property
+    def ratio(self) -> float:
+        return (self.updated + self.noops + self.version_conflicts) / self.total if self.total else 0.0
+
+
+class UpdateByQueryTasks:
+    """
+    Runs `update_by_query` requests as background tasks of the cluster, throttled and sliced, and tracks them.
+
+    Tasks are keyed by what they rewrite, e.g. the videos of a renamed category: submitting a task for a key
+    that already has one running cancels the running one, superseded by the new one. Scripts must then
+    ignore the writes of older tasks, which may still land for a little while after being cancelled.
+    """
+
+    def __init__(
+        self,
+        client: Elasticsearch,
+        index: str,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        slices: int | str = "auto",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param client: Elasticsearch client
+        :param index: Index the documents are rewritten in
+        :param requests_per_second: Throttle of each task, in documents per second
+        :param slices: Number of slices each task is split into and run in parallel, "auto" is one per shard
+        :param max_attempts: Max number of runs of a task whose documents keep being written concurrently
+        :param metrics: Registry where running tasks and rewritten documents are recorded
+        """
+        self._client = client
+        self.index = index
+        self.requests_per_second = requests_per_second
+        self.slices = slices
+        self.max_attempts = max_attempts
+        self.metrics = metrics or registry
+        self._running: dict[Hashable, TaskProgress] = {}
+        self._requests: dict[Hashable, tuple[dict, dict]] = {}
+
+    @property
+    def progress(self) -> dict[Hashable, TaskProgress]:
+        """Progress of the running tasks, as of the last `poll`."""
+        return dict(self._running)
+
+    def submit(self, key: Hashable, query: dict, script: dict) -> str:
+        running = self._running.pop(key, None)
+        if running is not None:
+            self._cancel(key, running)
+        return self._start(key, query, script)
+
+    def _start(self, key: Hashable, query: dict, script: dict, attempt: int = 1) -> str:
+        response = self._client.update_by_query(
+            index=self.index,
+            query=query,
+            script=script,
+            conflicts="proceed",
+            slices=self.slices,
+            requests_per_second=self.requests_per_second,
+            wait_for_completion=False,
+        )
+        self._running[key] = TaskProgress(task_id=response["task"], attempt=attempt)
+        self._requests[key] = (query, script)
+        self.metrics.inc("update_by_query_tasks_total", index=self.index)
+        self.metrics.set("update_by_query_tasks_running", len(self._running), index=self.index)
+        logger.info(f"Started task {response['task']} for {key}")
+        return response["task"]
+
+    def poll(self) -> dict[Hashable, TaskProgress]:
+        """
+        Fetches the status of the running tasks, runs again those that skipped documents and forgets the others
+        once completed. Returns the completed ones.
+        """
+        completed = {}
+        for key, progress in list(self._running.items()):
+            try:
+                response = self._client.tasks.get(task_id=progress.task_id)
+            except NotFoundError:
+                # Forgotten by the cluster, e.g. it restarted: nothing to track anymore
+                logger.warning(f"Task {progress.task_id} for {key} no longer exists")
+                del self._running[key]
+                del self._requests[key]
+                continue
+
+            status = response["task"]["status"]
+            progress.total = status["total"]
+            progress.updated = status["updated"]
+            progress.noops = status["noops"]
+            progress.version_conflicts = status["version_conflicts"]
+            progress.completed = response["completed"]
+            if not progress.completed:
+                logger.info(f"Task {progress.task_id} for {key}: {progress.ratio:.0%} of {progress.total} documents")
+                continue
+
+            del self._running[key]
+            query, script = self._requests.pop(key)
+            self.metrics.inc("update_by_query_documents_total", progress.updated, index=self.index)
+            logger.info(f"Task {progress.task_id} for {key} completed, {progress.updated} documents updated")
+            if progress.version_conflicts:
+                # Documents written meanwhile by the consumer were skipped: run again, those already rewritten are noops
+                self.metrics.inc("update_by_query_conflicts_total", progress.version_conflicts, index=self.index)
+                if progress.attempt < self.max_attempts:
+                    self._start(key, query, script, attempt=progress.attempt + 1)
+                    continue
+                logger.error(f"Task for {key} gave up on {progress.version_conflicts} documents after {progress.attempt} runs")
+            completed[key] = progress
+        self.metrics.set("update_by_query_tasks_running", len(self._running), index=self.index)
+        return completed
+
+    def _cancel(self, key: Hashable, running: TaskProgress) -> None:
+        try:
+            self._client.tasks.cancel(task_id=running.task_id)
+        except NotFoundError:
+            return
+        self.metrics.inc("update_by_query_tasks_superseded_total", index=self.index)
+        logger.info(f"Cancelled task {running.task_id} for {key}, superseded by a newer one")
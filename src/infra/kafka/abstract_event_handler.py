@@ -1,13 +1,31 @@
 import logging
 from abc import ABC, abstractmethod
 
+from src.infra.kafka.id_index import IdIndex
 from src.infra.kafka.parser import ParsedEvent
 from src.infra.kafka.operation import Operation
+from src.infra.kafka.state_store import StateStore
+from src.infra.metrics.registry import registry
 
 logger = logging.getLogger(__name__)
 
 
 class AbstractEventHandler(ABC):
+    # READ events of a Debezium snapshot are buffered and handled in batches of this size
+    snapshot_batch_size = 1000
+    # Source columns the handler writes somewhere. Updates changing none of them are skipped; None means every column
+    projected_fields: frozenset[str] | None = None
+    # Local copy of the tables handlers join with, set by the router when the consumer has one
+    state_store: StateStore | None = None
+    # Ids of the rows the videos reference, set by the router when the consumer keeps them
+    references: IdIndex | None = None
+    # Max events a flush writes per request, set by the consumer: lowered while the write side recovers
+    write_batch_size: int | None = None
+
+    def __init__(self) -> None:
+        self.in_snapshot = False
+        self._snapshot_events: list[ParsedEvent] = []
+
     @abstractmethod
     def handle_created(self, event: ParsedEvent) -> None:
         pass
@@ -20,12 +38,88 @@ class AbstractEventHandler(ABC):
     def handle_deleted(self, event: ParsedEvent) -> None:
         pass
 
+    def handle_snapshot(self, events: list[ParsedEvent]) -> None:
+        """Loads a batch of snapshot rows. Override it to write them in bulk."""
+        for event in events:
+            self.handle_created(event)
+
+    def begin_snapshot(self) -> None:
+        """Called before the first snapshot row is handled, e.g. to tune the target index for bulk loading."""
+        pass
+
+    def end_snapshot(self) -> None:
+        """Called once the snapshot rows were all handled, e.g. to restore the target index settings."""
+        pass
+
+    def changed_projected_fields(self, event: ParsedEvent) -> frozenset[str] | None:
+        """Projected columns changed by the event, or None when it cannot be told (e.g. no before image)."""
+        if event.changed_fields is None or self.projected_fields is None:
+            return None
+        return event.changed_fields & self.projected_fields
+
+    def handle_read(self, event: ParsedEvent) -> None:
+        if not self.in_snapshot:
+            logger.info(f"Snapshot started, loading rows in batches of {self.snapshot_batch_size}")
+            self.begin_snapshot()
+            self.in_snapshot = True
+
+        self._snapshot_events.append(event)
+        if len(self._snapshot_events) >= self.snapshot_batch_size:
+            self._flush_snapshot()
+        if event.is_last_snapshot_event:
+            self.finish_snapshot()
+
+    def finish_snapshot(self) -> None:
+        self._flush_snapshot()
+        self.end_snapshot()
+        self.in_snapshot = False
+        logger.info("Snapshot finished, back to per-event handling")
+
+    def flush(self) -> None:
+        """
+        Writes what is buffered. The consumer calls it before committing offsets,
+        so a buffered event is never marked as processed before it is written.
+        """
+        self._flush_snapshot()
+
+    def chunks(self, items: list) -> list[list]:
+        """Splits what a flush writes into requests of at most `write_batch_size` events."""
+        size = self.write_batch_size or len(items) or 1
+        return [items[start:start + size] for start in range(0, len(items), size)]
+
+    def close(self) -> None:
+        self.flush()
+        if self.in_snapshot:
+            self.finish_snapshot()
+
+    def _flush_snapshot(self) -> None:
+        if not self._snapshot_events:
+            return
+        chunks, self._snapshot_events = self.chunks(self._snapshot_events), []
+        for index, chunk in enumerate(chunks):
+            try:
+                self.handle_snapshot(chunk)
+            except Exception:
+                # Keep them for the next attempt: their offsets must not be committed
+                self._snapshot_events = [event for chunk in chunks[index:] for event in chunk] + self._snapshot_events
+                raise
+
     def __call__(self, event: ParsedEvent) -> None:
+        if self.in_snapshot and event.operation != Operation.READ:
+            # Streaming changes only come after the snapshot is complete
+            self.finish_snapshot()
+
         if event.operation == Operation.CREATE:
             self.handle_created(event)
         elif event.operation == Operation.UPDATE:
+            if self.changed_projected_fields(event) == frozenset():
+                logger.debug(f"Skipping {event.entity.__name__} update, no projected field changed: {event.changed_fields}")
+                registry.inc("consumer_noop_events_total", entity=event.entity.__name__)
+                return
             self.handle_updated(event)
         elif event.operation == Operation.DELETE:
             self.handle_deleted(event)
+        elif event.operation == Operation.READ:
+            self.handle_read(event)
         else:
-            logger.info(f"Unknown operation: {event.operation}")
\ No newline at end of file
+            logger.info(f"Unknown operation: {event.operation}")
@@ -0,0 +1,128 @@
+import logging
+import time
+from enum import StrEnum
+from http import HTTPStatus
+from typing import Callable
+
+from elasticsearch import ApiError, ConnectionTimeout
+from elasticsearch.helpers import BulkIndexError
+
+from src.infra.kafka.offset_manager import DEFAULT_COMMIT_EVERY
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Elasticsearch answers with these when its write queues are full or it cannot take more requests
+OVERLOAD_STATUS_CODES = {HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE}
+# Smallest batch the consumer falls back to while the write side recovers
+DEFAULT_MIN_BATCH_SIZE = 50
+# Events added to the batch size after each healthy flush while recovering
+DEFAULT_INCREASE_STEP = 50
+# A flush slower than this is a sign of an overloaded cluster, even without rejections
+DEFAULT_SLOW_FLUSH_SECONDS = 5.0
+DEFAULT_PAUSE_SECONDS = 1.0
+DEFAULT_MAX_PAUSE_SECONDS = 60.0
+
+
+def is_overloaded(error: Exception) -> bool:
+    """Whether the write side rejected or timed out a request because it cannot keep up."""
+    if isinstance(error, ConnectionTimeout):
+        return True
+    if isinstance(error, ApiError):
+        return error.status_code in OVERLOAD_STATUS_CODES
+    if isinstance(error, BulkIndexError):
+        return any(next(iter(item.values())).get("status") in OVERLOAD_STATUS_CODES for item in error.errors)
+    return False
+
+
+class BackpressureState(StrEnum):
+    FLOWING = "flowing"
+    PAUSED = "paused"
+    RECOVERING = "recovering"
+
+
+class Backpressure:
+    """
+    Adapts the pace of the consumer to what Elasticsearch can take. Rejected or slow writes pause the
+    consumption and halve the number of events written per flush. Once the pause is over, the batch size
+    grows back step by step with each healthy flush. Pauses double while the write side keeps failing.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = DEFAULT_COMMIT_EVERY,
+        min_batch_size: int = DEFAULT_MIN_BATCH_SIZE,
+        increase_step: int = DEFAULT_INCREASE_STEP,
+        slow_flush_seconds: float = DEFAULT_SLOW_FLUSH_SECONDS,
+        pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+        max_pause_seconds: float = DEFAULT_MAX_PAUSE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param max_batch_size: Events per flush when the write side is healthy
+        :param min_batch_size: Lower bound of the events per flush while it recovers
+        :param increase_step: Events added to the batch size after each healthy flush while recovering
+        :param slow_flush_seconds: Flushes slower than this pause the consumption as rejections do
+        :param pause_seconds: First pause, doubled on every throttle until the batch size is back to its max
+        :param max_pause_seconds: Upper bound of a pause
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where the state and the batch size are recorded
+        """
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min(min_batch_size, max_batch_size)
+        self.increase_step = increase_step
+        self.slow_flush_seconds = slow_flush_seconds
+        self.initial_pause_seconds = pause_seconds
+        self.max_pause_seconds = max_pause_seconds
+        self._clock = clock
+        self.metrics = metrics or registry
+        self.state = BackpressureState.FLOWING
+        self.batch_size = max_batch_size
+        self._pause_seconds = pause_seconds
+        self._resume_at = 0.0
+        self._report()
+
+    @property
+    def paused(self) -> bool:
+        return self.state is BackpressureState.PAUSED
+
+    def record_flush(self, seconds: float, events: int) -> None:
+        """A flush of `events` buffered events succeeded in `seconds`."""
+        self.metrics.observe("consumer_flush_seconds", seconds)
+        if seconds > self.slow_flush_seconds:
+            self.throttle(reason="slow_flush")
+            return
+        if self.state is not BackpressureState.RECOVERING:
+            return
+        self.batch_size = min(self.max_batch_size, self.batch_size + self.increase_step)
+        if self.batch_size >= self.max_batch_size:
+            logger.info(f"Write side recovered, back to batches of {self.batch_size} events")
+            self.state = BackpressureState.FLOWING
+            self._pause_seconds = self.initial_pause_seconds
+        self._report()
+
+    def throttle(self, reason: str) -> None:
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        self._resume_at = self._clock() + self._pause_seconds
+        logger.warning(
+            f"Write side overloaded ({reason}), pausing for {self._pause_seconds:.1f}s "
+            f"then resuming with batches of {self.batch_size} events"
+        )
+        self._pause_seconds = min(self.max_pause_seconds, self._pause_seconds * 2)
+        self.state = BackpressureState.PAUSED
+        self.metrics.inc("consumer_backpressure_pauses_total", reason=reason)
+        self._report()
+
+    def should_resume(self) -> bool:
+        return self.paused and self._clock() >= self._resume_at
+
+    def resume(self) -> None:
+        self.state = BackpressureState.RECOVERING
+        logger.info(f"Resuming consumption with batches of {self.batch_size} events")
+        self._report()
+
+    def _report(self) -> None:
+        self.metrics.set("consumer_batch_size", self.batch_size)
+        for state in BackpressureState:
+            self.metrics.set("consumer_backpressure_state", float(state is self.state), state=str(state))
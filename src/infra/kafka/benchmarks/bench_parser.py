@@ -0,0 +1,78 @@
+"""
+Microbenchmark of the CDC message parsers over recorded Debezium messages.
+
+Runs in a single process, so the numbers are messages per second per core:
+
+>>> python -m src.infra.kafka.benchmarks.bench_parser
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from src.infra.kafka.parser import Headers, Parser, parse_cdc_message, parse_debezium_envelope, parse_debezium_message
+
+ENVELOPES_DIR = Path(__file__).parent / "envelopes"
+
+PARSERS: dict[str, Parser] = {
+    "parse_debezium_message": parse_debezium_message,
+    "parse_debezium_envelope": parse_debezium_envelope,
+    "parse_cdc_message": parse_cdc_message,
+}
+
+# The same update event, as produced by each connector configuration
+FORMATS = {
+    "envelope with schema": "videos_update.json",
+    "schemaless envelope": "videos_update_schemaless.json",
+    "unwrapped schemaless": "videos_update_unwrapped.json",
+}
+FORMAT_TOPIC = "catalog-db.codeflix.videos"
+FORMAT_HEADERS: Headers = [("__op", b"u")]
+
+
+def load_envelopes() -> dict[str, bytes]:
+    # Full envelopes only: the other formats are named <event>_<format>.json
+    return {
+        path.stem: path.read_bytes().strip()
+        for path in sorted(ENVELOPES_DIR.glob("*.json"))
+        if path.name not in FORMATS.values() or path.name == FORMATS["envelope with schema"]
+    }
+
+
+def messages_per_second(
+    parser: Parser,
+    data: bytes,
+    iterations: int,
+    topic: str | None = None,
+    headers: Headers | None = None,
+) -> float:
+    assert parser(data, topic=topic, headers=headers) is not None, f"{parser.__name__} cannot parse {data[:50]!r}"
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        parser(data, topic=topic, headers=headers)
+    return iterations / (time.perf_counter() - started_at)
+
+
+def run_parsers(iterations: int) -> None:
+    print(f"{'envelope':<20}{'bytes':>8}" + "".join(f"{name:>28}" for name in PARSERS))
+    for envelope_name, data in load_envelopes().items():
+        rates = [messages_per_second(parser, data, iterations) for parser in PARSERS.values()]
+        print(f"{envelope_name:<20}{len(data):>8}" + "".join(f"{rate:>22,.0f} msg/s" for rate in rates))
+
+
+def run_formats(iterations: int) -> None:
+    print(f"{'format':<24}{'bytes/event':>12}{'parse_cdc_message':>28}")
+    for format_name, file_name in FORMATS.items():
+        data = (ENVELOPES_DIR / file_name).read_bytes().strip()
+        rate = messages_per_second(parse_cdc_message, data, iterations, topic=FORMAT_TOPIC, headers=FORMAT_HEADERS)
+        print(f"{format_name:<24}{len(data):>12}{rate:>22,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--iterations", type=int, default=20_000)
+    args = arg_parser.parse_args()
+    run_parsers(iterations=args.iterations)
+    print()
+    run_formats(iterations=args.iterations)
@@ -1,14 +1,46 @@
 import logging
 import os
-from typing import Callable, Type
+import time
+from typing import Type
 
-from confluent_kafka import KafkaException, Consumer as KafkaConsumer
+from confluent_kafka import (
+    TIMESTAMP_NOT_AVAILABLE,
+    KafkaException,
+    Consumer as KafkaConsumer,
+    Message,
+    Producer,
+    TopicPartition,
+)
 
+from elasticsearch import Elasticsearch
+
+from src.domain.cast_member import CastMember
+from src.domain.category import Category
 from src.domain.entity import Entity
+from src.domain.genre import Genre, GenreCategory
 from src.domain.video import Video
+from src.domain.video_relation import VideoBanner, VideoCastMember, VideoCategory, VideoGenre, VideoRelation
 from src.infra.kafka.abstract_event_handler import AbstractEventHandler
-from src.infra.kafka.parser import ParsedEvent, parse_debezium_message
+from src.infra.kafka.backpressure import Backpressure, is_overloaded
+from src.infra.elasticsearch import ELASTICSEARCH_HOST
+from src.infra.kafka.dead_letter import DeadLetterPublisher
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.offset_manager import OffsetManager
+from src.infra.kafka.parser import Parser, parse_cdc_message, parse_tombstone
+from src.infra.kafka.projection_event_handler import GenreCategoryEventHandler
+from src.infra.kafka.related_entity_event_handler import (
+    CastMemberEventHandler,
+    CategoryEventHandler,
+    GenreEventHandler,
+)
+from src.infra.kafka.retry import RetryPolicy, is_transient
+from src.infra.kafka.router import TOPIC_PREFIX, TopicRouter
+from src.infra.kafka.scheduler import PriorityScheduler
+from src.infra.kafka.state_store import STATE_STORE_DIR, StateStore, StateStoreUpdater
 from src.infra.kafka.video_event_handler import VideoEventHandler
+from src.infra.kafka.video_relation_event_handler import VideoRelationEventHandler
+from src.infra.metrics.registry import MetricsRegistry, registry
+from src.infra.metrics.server import MetricsServer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("consumer")
@@ -19,17 +51,38 @@ config = {
     "group.id": "consumer-cluster",
     "auto.offset.reset": "earliest",
     "enable.auto.commit": False,
+    # Incremental rebalances: members keep consuming the partitions that stay theirs while others move.
+    # A group cannot mix it with the eager assignors (range, roundrobin): switching requires stopping every member
+    "partition.assignment.strategy": os.getenv("PARTITION_ASSIGNMENT_STRATEGY", "cooperative-sticky"),
 }
-topics = [
-    "catalog-db.codeflix.videos",
-]
+# Static membership: a worker restarted within the session timeout, e.g. by a rolling deploy, gets its
+# partitions back without any rebalance. Each worker of the supervisor gets its own instance id
+group_instance_id = os.getenv("GROUP_INSTANCE_ID")
+session_timeout_ms = int(os.getenv("SESSION_TIMEOUT_MS", "45000"))
+metrics_port = int(os.getenv("METRICS_PORT", "9100"))
 
 # Similar to a "router" -> calls proper handler
-entity_to_handler: dict[Type[Entity], Type[AbstractEventHandler]] = {
-    # Category: CategoryEventHandler,
-    # CastMember: CastMemberEventHandler,
-    # Genre: GenreEventHandler,
+entity_to_handler: dict[Type[Entity | VideoRelation | GenreCategory], Type[AbstractEventHandler]] = {
+    # Categories, cast members and genres are indexed in bulk, and renamed in the videos linked to them
+    Category: CategoryEventHandler,
+    CastMember: CastMemberEventHandler,
+    Genre: GenreEventHandler,
+    GenreCategory: GenreCategoryEventHandler,
     Video: VideoEventHandler,
+    # The relations of the videos are streamed from their own tables instead of fetched from the admin API
+    VideoCategory: VideoRelationEventHandler,
+    VideoGenre: VideoRelationEventHandler,
+    VideoCastMember: VideoRelationEventHandler,
+    VideoBanner: VideoRelationEventHandler,
+}
+
+# Tables kept in the state store of each worker, with the columns their rows are looked up by. Their rows are
+# read from every partition by every worker: only tables a handler reads belong here
+state_store_indexes: dict[str, tuple[str, ...]] = {
+    # Their names are copied into the videos they are linked to
+    "categories": (),
+    "genres": (),
+    "cast_members": (),
 }
 
 
@@ -37,22 +90,60 @@ class Consumer:
     def __init__(
         self,
         client: KafkaConsumer,
-        parser: Callable[[bytes], ParsedEvent | None],
-        router: dict[Type[Entity], Type[AbstractEventHandler]] | None = None,
+        parser: Parser,
+        router: TopicRouter | None = None,
+        offset_manager: OffsetManager | None = None,
+        retry_policy: RetryPolicy | None = None,
+        dead_letter: DeadLetterPublisher | None = None,
+        metrics: MetricsRegistry | None = None,
+        lag_refresh_interval: float = 15.0,
+        state: StateStoreUpdater | None = None,
+        backpressure: Backpressure | None = None,
+        scheduler: PriorityScheduler | None = None,
+        references: IdIndex | None = None,
     ) -> None:
         """
         :param client: Kafka consumer client
         :param parser: Function to parse the message data to a ParsedEvent
-        :param router:  Dictionary to route the event to the proper handler
+        :param router: Resolves the handler of each message from its topic
+        :param offset_manager: Stores processed offsets and commits them in batches
+        :param retry_policy: Retries handlers failing with transient errors
+        :param dead_letter: Where messages that cannot be processed are forwarded. If not set, they are dropped
+        :param metrics: Registry where throughput, latency and lag are recorded
+        :param lag_refresh_interval: Seconds between two consumer lag measurements, each one costs broker round trips
+        :param state: Keeps the state store of the handlers current, checkpointed whenever offsets are committed
+        :param backpressure: Pauses the consumption and shrinks the batches while Elasticsearch is overloaded
+        :param scheduler: Orders the messages of the subscribed topics by priority. If not set, in the fetch order
+        :param references: Ids of the rows the videos reference, kept current from the events before they are handled
         """
         self.client = client
         self.parser = parser
-        self.router = router or entity_to_handler
+        self.router = router or TopicRouter(entity_to_handler)
+        self.offset_manager = offset_manager or OffsetManager(client=client)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.dead_letter = dead_letter
+        self.metrics = metrics or registry
+        self.lag_refresh_interval = lag_refresh_interval
+        self.state = state
+        self.backpressure = backpressure or Backpressure(
+            max_batch_size=self.offset_manager.commit_every,
+            metrics=self.metrics,
+        )
+        self.scheduler = scheduler
+        self.references = references
+        self.running = False
+        self.processed_count = 0
+        self.rejected_count = 0
+        self.last_poll_at: float | None = None
+        self._unflushed_count = 0
+        self._assignment_changed = False
+        self._lag_refreshed_at = time.monotonic()
 
     def start(self):
         logger.info("Starting consumer...")
+        self.running = True
         try:
-            while True:
+            while self.running:
                 self.consume()
         except KeyboardInterrupt:
             logger.info("Stopping consumer...")
@@ -61,10 +152,57 @@ class Consumer:
         finally:
             self.stop()
 
+    def request_stop(self) -> None:
+        """Ask the consume loop to exit after the current message, e.g. from a signal handler."""
+        self.running = False
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed_count,
+            "rejected": self.rejected_count,
+            "last_poll_at": self.last_poll_at,
+            "metrics": self.metrics.snapshot(),
+        }
+
+    def refresh_lag(self) -> None:
+        """Lag per assigned partition: messages between the committed offset and the end of the partition."""
+        self._lag_refreshed_at = time.monotonic()
+        self.metrics.clear("consumer_lag")
+        assignment = self.client.assignment()
+        if not assignment:
+            return
+        try:
+            for partition in self.client.committed(assignment, timeout=5.0):
+                low, high = self.client.get_watermark_offsets(partition, timeout=5.0)
+                committed = partition.offset if partition.offset >= 0 else low
+                self.metrics.set(
+                    "consumer_lag",
+                    max(0, high - committed),
+                    topic=partition.topic,
+                    partition=str(partition.partition),
+                )
+        except KafkaException as e:
+            logger.warning(f"Failed to measure consumer lag: {e}")
+
     def consume(self) -> None:
-        message = self.client.poll(timeout=1.0)
+        if self._assignment_changed:
+            self._on_assignment_changed()
+        elif time.monotonic() - self._lag_refreshed_at >= self.lag_refresh_interval:
+            self.refresh_lag()
+        if self.state is not None:
+            self.state.poll()
+        if self.backpressure.should_resume():
+            self.backpressure.resume()
+            self._apply_backpressure()
+
+        message = self._poll()
+        self.last_poll_at = time.time()
         if message is None:
             logger.info("No message received")
+            # Nothing else is coming for now: write what handlers buffered instead of waiting for more. Not while
+            # paused: the write side gets the whole pause to recover
+            if not self.backpressure.paused and self.flush():
+                self.offset_manager.maybe_commit()
             return None
 
         if message.error():
@@ -72,29 +210,273 @@ class Consumer:
             return None
 
         message_data = message.value()
-        if not message_data:
+        if not message_data and not message.key():
             logger.info("Empty message received")
             return None
 
-        logger.info(f"Received message with data: {message_data}")
-        parsed_event = self.parser(message_data)
+        # Route on the topic first: messages nobody handles are skipped without being decoded
+        handler = self.router.resolve(message.topic())
+        if handler is None:
+            self.metrics.inc("consumer_skipped_total", topic=message.topic())
+            self._commit_later(message)
+            return None
+
+        self.metrics.inc("consumer_messages_total", topic=message.topic())
+        if not message_data:
+            logger.info(f"Received tombstone with key: {message.key()}")
+            parsed_event = parse_tombstone(message.key(), topic=message.topic())
+        else:
+            logger.info(f"Received message with data: {message_data}")
+            with self.metrics.time("ingestion_stage_seconds", stage="parse"):
+                parsed_event = self.parser(message_data, topic=message.topic(), headers=message.headers())
         if parsed_event is None:
-            logger.error(f"Failed to parse message data: {message_data}")
+            logger.error(f"Failed to parse message data: {message_data or message.key()}")
+            self._reject(message, reason="parse_error")
+            return
+
+        if self.references is not None:
+            self.references.apply(parsed_event)
+
+        labels = {"entity": parsed_event.entity.__name__, "operation": str(parsed_event.operation)}
+        try:
+            with self.metrics.time("consumer_handler_seconds", **labels):
+                self.retry_policy.run(lambda: handler(parsed_event))
+        except Exception as e:
+            logger.exception(f"Failed to handle {parsed_event.entity.__name__} event")
+            self.metrics.inc("consumer_handler_errors_total", error=type(e).__name__, **labels)
+            if is_overloaded(e) and self._consume_later(message):
+                return
+            self._reject(message, reason="retries_exhausted" if is_transient(e) else "handler_error", error=e)
             return
 
-        # Call the proper handler
-        handler = self.router[parsed_event.entity]()
-        handler(parsed_event)
+        self.metrics.inc("consumer_events_total", **labels)
+        self._mark_processed(message)
 
-        self.client.commit(message=message)
+    def _poll(self) -> Message | None:
+        if self.scheduler is None:
+            return self.client.poll(timeout=1.0)
+        # Fetched before every message, without waiting while some are buffered: a live edit arriving during
+        # a backfill gets its turn right away
+        full_topics = self.scheduler.full_topics
+        paused = self.backpressure.paused
+        self.scheduler.add(
+            self.client.consume(
+                num_messages=self.scheduler.fetch_size,
+                timeout=0 if self.scheduler.pending and not paused else 1.0,
+            )
+        )
+        if paused:
+            # Messages buffered before the pause wait for it to be over too, like the partitions they come from
+            return None
+        message = self.scheduler.next()
+        if self.scheduler.full_topics != full_topics:
+            self._apply_backpressure()
+        return message
+
+    def flush(self) -> bool:
+        """
+        Makes handlers write the events they buffered, e.g. snapshot rows. Must succeed before offsets
+        are committed, otherwise a buffered event could be committed without being written.
+        """
+        started_at = time.monotonic()
+        try:
+            for handler in self.router.handlers:
+                # Buffers that failed to be written before are split like the batches of the consumer
+                handler.write_batch_size = self.backpressure.batch_size
+                self.retry_policy.run(handler.flush)
+            if self.state is not None:
+                self.state.checkpoint()
+        except Exception as e:
+            logger.exception("Failed to flush buffered events, offsets are not committed")
+            self.metrics.inc("consumer_flush_errors_total")
+            if is_overloaded(e):
+                self.backpressure.throttle(reason="rejected")
+                self._apply_backpressure()
+            return False
+        if self._unflushed_count:
+            # Idle flushes write nothing, they say nothing about the health of the write side
+            self.backpressure.record_flush(time.monotonic() - started_at, events=self._unflushed_count)
+            self._unflushed_count = 0
+            self._apply_backpressure()
+        return True
+
+    def _apply_backpressure(self) -> None:
+        # Handlers are flushed every `batch_size` events, their bulk requests shrink and grow with it
+        self.offset_manager.commit_every = self.backpressure.batch_size
+        assignment = self.client.assignment()
+        if not assignment:
+            return
+        # Paused partitions are still polled: the consumer keeps its group membership while it waits.
+        # Topics with too many messages waiting in the scheduler stay paused until they are drained
+        full_topics = self.scheduler.full_topics if self.scheduler is not None else frozenset()
+        paused = [tp for tp in assignment if self.backpressure.paused or tp.topic in full_topics]
+        resumed = [tp for tp in assignment if tp not in paused]
+        if paused:
+            self.client.pause(paused)
+        if resumed:
+            self.client.resume(resumed)
+        self.metrics.set("consumer_paused_partitions", len(paused))
+
+    def _consume_later(self, message: Message) -> bool:
+        """
+        Rewinds the partition of a message the write side rejected, instead of dead lettering it:
+        it is consumed again once the consumption resumes. Returns whether it could be rewound.
+        """
+        self.backpressure.throttle(reason="rejected")
+        self._apply_backpressure()
+        try:
+            self.client.seek(TopicPartition(message.topic(), message.partition(), message.offset()))
+            # Messages after it were fetched already: they come again after it
+            self._drop_scheduled([TopicPartition(message.topic(), message.partition())])
+        except KafkaException as e:
+            logger.warning(f"Failed to rewind {message.topic()}[{message.partition()}]: {e}")
+            return False
+        self.metrics.inc("consumer_rewound_total", topic=message.topic())
+        return True
+
+    def on_assign(self, client: KafkaConsumer, partitions: list[TopicPartition]) -> None:
+        # With the cooperative assignor, only the partitions added to the assignment
+        logger.info(f"Assigned partitions: {_format_partitions(partitions)}")
+        self.metrics.inc("consumer_rebalances_total", event="assign")
+        self._assignment_changed = True
+
+    def on_revoke(self, client: KafkaConsumer, partitions: list[TopicPartition]) -> None:
+        """Writes what handlers buffered and commits the revoked partitions before they are given up."""
+        logger.info(f"Revoked partitions: {_format_partitions(partitions)}")
+        self.metrics.inc("consumer_rebalances_total", event="revoke")
+        self._assignment_changed = True
+        self._drop_scheduled(partitions)
+        if self.flush():
+            self.offset_manager.on_revoke(client, partitions)
+        else:
+            # Not written yet: their next owner consumes them again from the last committed offsets
+            self.offset_manager.discard(partitions)
+
+    def on_lost(self, client: KafkaConsumer, partitions: list[TopicPartition]) -> None:
+        # E.g. the session timed out: the partitions may be consumed by another member already, which
+        # committing their offsets would interfere with. Events buffered from them are still written
+        logger.warning(f"Lost partitions: {_format_partitions(partitions)}")
+        self.metrics.inc("consumer_rebalances_total", event="lost")
+        self._assignment_changed = True
+        self._drop_scheduled(partitions)
+        self.offset_manager.discard(partitions)
+
+    def _drop_scheduled(self, partitions: list[TopicPartition]) -> None:
+        if self.scheduler is not None:
+            self.scheduler.drop(partitions)
+
+    def _on_assignment_changed(self) -> None:
+        self._assignment_changed = False
+        self.metrics.set("consumer_assigned_partitions", len(self.client.assignment()))
+        # Partitions assigned during a pause must not be consumed before it is over
+        if self.backpressure.paused:
+            self._apply_backpressure()
+        self.refresh_lag()
+
+    def _reject(self, message: Message, reason: str, error: Exception | None = None) -> None:
+        # A poison message must not block the partition: park it and move on
+        if self.dead_letter is not None:
+            self.dead_letter.publish(message, reason=reason, error=error)
+        else:
+            logger.warning(f"Dropping message {message.topic()}[{message.partition()}]@{message.offset()}: {reason}")
+        self.rejected_count += 1
+        self.metrics.inc("consumer_rejected_total", reason=reason)
+        self._commit_later(message)
+
+    def _mark_processed(self, message: Message) -> None:
+        self.processed_count += 1
+        self._unflushed_count += 1
+        timestamp_type, timestamp = message.timestamp()
+        if timestamp_type != TIMESTAMP_NOT_AVAILABLE:
+            # Since the change was written to the topic, including the time it waited behind other topics
+            self.metrics.observe(
+                "consumer_end_to_end_seconds",
+                max(0.0, time.time() - timestamp / 1000),
+                topic=message.topic(),
+            )
+        self._commit_later(message)
+
+    def _commit_later(self, message: Message) -> None:
+        self.offset_manager.track(message)
+        if self.offset_manager.should_commit() and self.flush():
+            self.offset_manager.commit(asynchronous=True)
 
     def stop(self):
         logger.info("Closing consumer...")
+        if self._close_handlers():
+            self.offset_manager.commit(asynchronous=False)
         self.client.close()
+        if self.state is not None:
+            self.state.close()
+
+    def _close_handlers(self) -> bool:
+        # Also ends a snapshot in progress, so index settings are not left in bulk load mode
+        closed = True
+        for handler in self.router.handlers:
+            try:
+                handler.close()
+            except Exception:
+                logger.exception(f"Failed to close {type(handler).__name__}, offsets are not committed")
+                closed = False
+        return closed
+
+
+def _format_partitions(partitions: list[TopicPartition]) -> str:
+    return ", ".join(f"{tp.topic}[{tp.partition}]" for tp in partitions) or "none"
+
+
+def consumer_config(worker_id: int) -> dict:
+    if not group_instance_id:
+        return config
+    return {**config, "group.instance.id": f"{group_instance_id}-{worker_id}", "session.timeout.ms": session_timeout_ms}
+
+
+def build_state(worker_id: int, references: IdIndex | None = None) -> StateStoreUpdater | None:
+    if not STATE_STORE_DIR:
+        return None
+    os.makedirs(STATE_STORE_DIR, exist_ok=True)
+    state = StateStoreUpdater(
+        store=StateStore(path=os.path.join(STATE_STORE_DIR, f"worker-{worker_id}.db"), indexes=state_store_indexes),
+        # Outside of the consumer group: partitions are assigned and offsets never committed
+        client=KafkaConsumer({**config, "group.id": f"{config['group.id']}-state"}),
+        topics=[f"{TOPIC_PREFIX}.{table}" for table in state_store_indexes],
+        references=references,
+    )
+    state.restore()
+    return state
+
+
+def build_consumer(worker_id: int = 0) -> Consumer:
+    kafka_consumer = KafkaConsumer(consumer_config(worker_id))
+    references = IdIndex()
+    # Restored before consuming: handlers find the rows they join with from the first message.
+    # It reads every partition of the referenced tables, their ids are kept current with its rows
+    state = build_state(worker_id, references=references)
+    if state is None:
+        # Loaded from the indices before consuming: events after the committed offsets are applied again.
+        # Only the events of the partitions of this worker are, see IdIndex
+        references.rebuild(Elasticsearch(hosts=[ELASTICSEARCH_HOST]))
+    router = TopicRouter(entity_to_handler, state_store=state.store if state else None, references=references)
+    consumer = Consumer(
+        client=kafka_consumer,
+        parser=parse_cdc_message,
+        router=router,
+        offset_manager=OffsetManager(client=kafka_consumer),
+        dead_letter=DeadLetterPublisher(producer=Producer({"bootstrap.servers": config["bootstrap.servers"]})),
+        state=state,
+        scheduler=PriorityScheduler(),
+        references=references if state is None else None,
+    )
+    # Buffered events are written before the offsets of revoked partitions are committed
+    kafka_consumer.subscribe(
+        topics=router.topics,
+        on_assign=consumer.on_assign,
+        on_revoke=consumer.on_revoke,
+        on_lost=consumer.on_lost,
+    )
+    return consumer
 
 
 if __name__ == "__main__":
-    kafka_consumer = KafkaConsumer(config)
-    kafka_consumer.subscribe(topics=topics)
-    consumer = Consumer(client=kafka_consumer, parser=parse_debezium_message)
-    consumer.start()
\ No newline at end of file
+    MetricsServer(render_metrics=registry.render, port=metrics_port).start()
+    build_consumer().start()
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import os
+from datetime import datetime, timezone
+
+from confluent_kafka import Consumer as KafkaConsumer, KafkaException, Message, Producer
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_TOPIC = os.getenv("DEAD_LETTER_TOPIC", "catalog-db.codeflix.dlq")
+
+HEADER_ORIGINAL_TOPIC = "dlq.original.topic"
+HEADER_ORIGINAL_PARTITION = "dlq.original.partition"
+HEADER_ORIGINAL_OFFSET = "dlq.original.offset"
+HEADER_REASON = "dlq.error.reason"
+HEADER_ERROR_CLASS = "dlq.error.class"
+HEADER_ERROR_MESSAGE = "dlq.error.message"
+HEADER_FAILED_AT = "dlq.failed_at"
+HEADER_REPLAYED = "dlq.replayed"
+DEAD_LETTER_HEADER_PREFIX = "dlq."
+
+
+class DeadLetterPublisher:
+    def __init__(self, producer: Producer, topic: str = DEAD_LETTER_TOPIC, flush_timeout: float = 10.0) -> None:
+        """
+        :param producer: Kafka producer used to forward the failed messages
+        :param topic: Dead-letter topic
+        :param flush_timeout: Max seconds to wait for the broker to acknowledge a dead-lettered message
+        """
+        self.producer = producer
+        self.topic = topic
+        self.flush_timeout = flush_timeout
+
+    def publish(self, message: Message, reason: str, error: Exception | None = None) -> None:
+        headers = [
+            *(message.headers() or []),
+            (HEADER_ORIGINAL_TOPIC, message.topic()),
+            (HEADER_ORIGINAL_PARTITION, str(message.partition())),
+            (HEADER_ORIGINAL_OFFSET, str(message.offset())),
+            (HEADER_REASON, reason),
+            (HEADER_FAILED_AT, datetime.now(timezone.utc).isoformat()),
+        ]
+        if error is not None:
+            headers.append((HEADER_ERROR_CLASS, type(error).__name__))
+            headers.append((HEADER_ERROR_MESSAGE, str(error)[:1000]))
+
+        self.producer.produce(topic=self.topic, key=message.key(), value=message.value(), headers=headers)
+        # Dead-lettering is rare, so wait for the ack: the source offset is committed right after this
+        if self.producer.flush(self.flush_timeout) > 0:
+            raise KafkaException(f"Timed out forwarding message to dead-letter topic {self.topic}")
+
+        logger.warning(
+            f"Message {message.topic()}[{message.partition()}]@{message.offset()} sent to {self.topic}: {reason}"
+        )
+
+
+class DeadLetterReplayer:
+    """Moves dead-lettered messages back to the topic they came from, once the cause was fixed."""
+
+    def __init__(self, client: KafkaConsumer, producer: Producer, idle_timeout: float = 5.0) -> None:
+        """
+        :param client: Kafka consumer subscribed to the dead-letter topic
+        :param producer: Kafka producer used to republish the messages
+        :param idle_timeout: Stop after this many seconds without new dead-lettered messages
+        """
+        self.client = client
+        self.producer = producer
+        self.idle_timeout = idle_timeout
+
+    def replay(self, limit: int | None = None) -> int:
+        replayed = 0
+        while limit is None or replayed < limit:
+            message = self.client.poll(timeout=self.idle_timeout)
+            if message is None:
+                break
+            if message.error():
+                logger.error(f"received message with error: {message.error()}")
+                continue
+
+            headers = message.headers() or []
+            original_topic = dict(headers).get(HEADER_ORIGINAL_TOPIC)
+            if original_topic is None:
+                logger.error(f"Skipping dead-lettered message without {HEADER_ORIGINAL_TOPIC} header")
+                continue
+
+            self.producer.produce(
+                topic=original_topic.decode("utf-8"),
+                key=message.key(),
+                value=message.value(),
+                # The headers of the original message are kept, e.g. the operation of a flattened row
+                headers=[
+                    *((key, value) for key, value in headers if not key.startswith(DEAD_LETTER_HEADER_PREFIX)),
+                    (HEADER_REPLAYED, b"true"),
+                ],
+            )
+            replayed += 1
+
+        self.producer.flush()
+        if replayed:
+            # Only after every replayed message was acknowledged
+            self.client.commit(asynchronous=False)
+        logger.info(f"Replayed {replayed} dead-lettered messages")
+        return replayed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Dead-letter topic tools")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    replay_command = subcommands.add_parser("replay", help="Move dead-lettered messages back to their topics")
+    replay_command.add_argument("--limit", type=int, default=None, help="Max number of messages to replay")
+    args = arg_parser.parse_args()
+
+    bootstrap_servers = os.getenv("BOOTSTRAP_SERVERS", "kafka:19092")
+    kafka_consumer = KafkaConsumer({
+        "bootstrap.servers": bootstrap_servers,
+        "group.id": "consumer-cluster-dlq-replay",
+        "auto.offset.reset": "earliest",
+        "enable.auto.commit": False,
+    })
+    kafka_consumer.subscribe(topics=[DEAD_LETTER_TOPIC])
+    try:
+        DeadLetterReplayer(client=kafka_consumer, producer=Producer({"bootstrap.servers": bootstrap_servers})).replay(
+            limit=args.limit,
+        )
+    finally:
+        kafka_consumer.close()
@@ -0,0 +1,46 @@
+from typing import Any
+
+import msgspec
+
+
+# Only the parts of the Debezium envelope the consumer reads are declared: everything else
+# (the `schema` block, most of `source`, `transaction`, `ts_ms`...) is skipped by the decoder
+# without building Python objects for it.
+class Source(msgspec.Struct):
+    table: str
+    snapshot: str | None = None
+    # Binlog coordinates of the change, e.g. "mysql-bin.000003" and 1543
+    file: str | None = None
+    pos: int | None = None
+
+
+class Payload(msgspec.Struct):
+    op: str
+    source: Source
+    before: dict[str, Any] | None = None
+    after: dict[str, Any] | None = None
+
+
+class Envelope(msgspec.Struct):
+    payload: Payload
+
+
+envelope_decoder = msgspec.json.Decoder(Envelope)
+
+
+class CdcDocument(msgspec.Struct):
+    """
+    Any message of the connector but a flattened row, see `parse_cdc_message`. Only the fields telling its format
+    and the metadata of the change are declared, a flattened row wrapped with its schema is decoded separately.
+    """
+    # Envelope or flattened row wrapped with its schema block, decoded again once the block is skipped
+    payload: msgspec.Raw = msgspec.Raw()
+    # Full envelope
+    op: str | None = None
+    source: Source | None = None
+    before: dict[str, Any] | None = None
+    after: dict[str, Any] | None = None
+
+
+cdc_document_decoder = msgspec.json.Decoder(CdcDocument)
+row_decoder = msgspec.json.Decoder(dict[str, Any])
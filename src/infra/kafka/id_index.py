@@ -0,0 +1,92 @@
+import logging
+from typing import Iterable
+from uuid import UUID
+
+from elasticsearch import Elasticsearch, NotFoundError, helpers
+
+from src.infra.elasticsearch.mappings import CAST_MEMBERS_INDEX, CATEGORIES_INDEX, GENRES_INDEX
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent, table_to_entity
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Tables the relations of the videos reference, with the index their rows are projected into
+REFERENCED_TABLES = {
+    "categories": CATEGORIES_INDEX,
+    "genres": GENRES_INDEX,
+    "cast_members": CAST_MEMBERS_INDEX,
+}
+
+
+class IdIndex:
+    """
+    Ids of the rows the relations of the videos reference, kept in memory to tell dangling references in
+    microseconds, without any Elasticsearch lookup. Every worker needs the ids of all partitions: with a state
+    store, they are loaded from it and kept current by its updater, which reads every partition of the tables.
+    Otherwise they are rebuilt at startup from the projected indices, then kept current from the events the
+    worker consumes, which only covers all partitions when it is the single worker of its group.
+
+    Ids are kept exactly, as 128-bit integers: rows can be deleted, which a Bloom filter could not forget.
+    """
+
+    def __init__(self, tables: dict[str, str] | None = None, metrics: MetricsRegistry | None = None) -> None:
+        """
+        :param tables: Tables whose ids are kept, with the index their rows are projected into
+        :param metrics: Registry where the number of ids per table is recorded
+        """
+        self.tables = REFERENCED_TABLES if tables is None else tables
+        self.metrics = metrics or registry
+        self._ids: dict[str, set[int]] = {table: set() for table in self.tables}
+        self._entity_to_table = {entity: table for table, entity in table_to_entity.items() if table in self.tables}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    def contains(self, table: str, id: UUID | str) -> bool:
+        return _key(id) in self._ids[table]
+
+    def add(self, table: str, id: UUID | str) -> None:
+        self._ids[table].add(_key(id))
+
+    def discard(self, table: str, id: UUID | str) -> None:
+        self._ids[table].discard(_key(id))
+
+    def reset(self, table: str, ids: Iterable[UUID | str]) -> None:
+        """Replaces the ids of a table."""
+        self._ids[table] = {_key(id) for id in ids}
+        self.metrics.set("consumer_reference_ids", len(self._ids[table]), table=table)
+
+    def apply(self, event: ParsedEvent) -> None:
+        """Keeps the ids current from an event of any table, those of other tables are ignored."""
+        table = self._entity_to_table.get(event.entity)
+        if table is None:
+            return
+        try:
+            key = _key(event.payload["id"])
+        except (KeyError, ValueError):
+            logger.warning(f"Event of {table} without a valid id: {event.payload}")
+            return
+        if event.operation == Operation.DELETE:
+            self._ids[table].discard(key)
+        else:
+            self._ids[table].add(key)
+        self.metrics.set("consumer_reference_ids", len(self._ids[table]), table=table)
+
+    def rebuild(self, client: Elasticsearch) -> int:
+        """Loads the ids of the documents of the projected indices. Returns how many were loaded."""
+        for table, index in self.tables.items():
+            ids = []
+            try:
+                for hit in helpers.scan(client, index=index, query={"query": {"match_all": {}}}, _source=False):
+                    ids.append(hit["_id"])
+            except NotFoundError:
+                # Not projected yet: its rows come with the snapshot of the table
+                logger.info(f"{index} does not exist yet, no {table} ids to load")
+            self.reset(table, ids)
+        logger.info(f"Loaded {len(self)} referenced ids")
+        return len(self)
+
+
+def _key(id: UUID | str) -> int:
+    return (id if isinstance(id, UUID) else UUID(str(id))).int
@@ -0,0 +1,103 @@
+import logging
+import time
+from typing import Callable
+
+from confluent_kafka import Consumer as KafkaConsumer, KafkaException, Message, TopicPartition
+
+from src.infra.metrics.registry import SIZE_BUCKETS, MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMMIT_INTERVAL_SECONDS = 5.0
+DEFAULT_COMMIT_EVERY = 500
+
+
+class OffsetManager:
+    """
+    Keeps track of processed offsets locally and commits them in batches.
+
+    Offsets are committed asynchronously once `commit_every` messages were processed or
+    `commit_interval` seconds have passed since the last commit. Pending offsets are committed
+    synchronously when the consumer stops or partitions are revoked, so at-least-once delivery
+    is preserved: an offset is only committed after its message was handled.
+    """
+
+    def __init__(
+        self,
+        client: KafkaConsumer,
+        commit_interval: float = DEFAULT_COMMIT_INTERVAL_SECONDS,
+        commit_every: int = DEFAULT_COMMIT_EVERY,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param client: Kafka consumer client used to commit the offsets
+        :param commit_interval: Max seconds between two commits while there are pending offsets
+        :param commit_every: Max number of processed messages between two commits
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where commit batch sizes and failures are recorded
+        """
+        self.client = client
+        self.commit_interval = commit_interval
+        self.commit_every = commit_every
+        self._clock = clock
+        self.metrics = metrics or registry
+        self._pending: dict[tuple[str, int], int] = {}
+        self._processed_since_commit = 0
+        self._last_commit_at = clock()
+
+    @property
+    def pending(self) -> dict[tuple[str, int], int]:
+        return dict(self._pending)
+
+    def track(self, message: Message) -> None:
+        # The committed offset is the offset of the *next* message to be consumed
+        self._pending[(message.topic(), message.partition())] = message.offset() + 1
+        self._processed_since_commit += 1
+
+    def should_commit(self) -> bool:
+        if not self._pending:
+            return False
+        if self._processed_since_commit >= self.commit_every:
+            return True
+        return self._clock() - self._last_commit_at >= self.commit_interval
+
+    def maybe_commit(self) -> None:
+        if self.should_commit():
+            self.commit(asynchronous=True)
+
+    def commit(self, asynchronous: bool = True) -> None:
+        self._commit(partitions=None, asynchronous=asynchronous)
+
+    def on_revoke(self, client: KafkaConsumer, partitions: list[TopicPartition]) -> None:
+        """Rebalance callback: synchronously commit what was processed for the revoked partitions."""
+        self._commit(partitions={(tp.topic, tp.partition) for tp in partitions}, asynchronous=False)
+        # Even when the commit failed: the next owner consumes them again from their last committed offset
+        self.discard(partitions)
+
+    def discard(self, partitions: list[TopicPartition]) -> None:
+        """Forgets the offsets of partitions no longer owned: committing them could rewind their new owner."""
+        for tp in partitions:
+            self._pending.pop((tp.topic, tp.partition), None)
+
+    def _commit(self, partitions: set[tuple[str, int]] | None, asynchronous: bool) -> None:
+        keys = [key for key in self._pending if partitions is None or key in partitions]
+        if not keys:
+            return
+
+        offsets = [TopicPartition(topic, partition, self._pending[(topic, partition)]) for topic, partition in keys]
+        try:
+            self.client.commit(offsets=offsets, asynchronous=asynchronous)
+        except KafkaException as e:
+            # Offsets stay pending and are retried on the next commit
+            logger.error(f"Failed to commit offsets {offsets}: {e}")
+            self.metrics.inc("consumer_commit_errors_total")
+            return
+
+        for key in keys:
+            del self._pending[key]
+        if partitions is None:
+            self.metrics.observe("consumer_commit_batch_size", self._processed_since_commit, buckets=SIZE_BUCKETS)
+            self._processed_since_commit = 0
+            self._last_commit_at = self._clock()
+        logger.info(f"Committed offsets: {offsets}")
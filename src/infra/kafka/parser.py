@@ -1,13 +1,17 @@
 import json
 import logging
 from dataclasses import dataclass
-from typing import Type
+from typing import Protocol, Type
+
+import msgspec
 
 from src.domain.cast_member import CastMember
 from src.domain.category import Category
 from src.domain.entity import Entity
-from src.domain.genre import Genre
+from src.domain.genre import Genre, GenreCategory
 from src.domain.video import Video
+from src.domain.video_relation import VideoBanner, VideoCastMember, VideoCategory, VideoGenre, VideoRelation
+from src.infra.kafka.envelope import cdc_document_decoder, envelope_decoder, row_decoder
 from src.infra.kafka.operation import Operation
 
 logger = logging.getLogger(__name__)
@@ -15,20 +19,66 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class ParsedEvent:
-    entity: Type[Entity]
+    entity: Type[Entity | VideoRelation | GenreCategory]
     operation: Operation
     payload: dict
+    # Debezium's `source.snapshot` marker: "true", "first", "last"... on snapshot READ events
+    snapshot: str | None = None
+    # Row images before and after the change, when the message carries them
+    before: dict | None = None
+    after: dict | None = None
+    # Increases with every change of a row, so writes of stale events can be rejected
+    version: int | None = None
+    # Delete of a row known only by its key, see `parse_tombstone`
+    tombstone: bool = False
+
+    @property
+    def is_last_snapshot_event(self) -> bool:
+        return self.snapshot in LAST_SNAPSHOT_MARKERS
+
+    @property
+    def changed_fields(self) -> frozenset[str] | None:
+        """Columns whose value differs between both images, or None when one of them is missing."""
+        if self.before is None or self.after is None:
+            return None
+        return frozenset(
+            column
+            for column in self.before.keys() | self.after.keys()
+            if self.before.get(column) != self.after.get(column)
+        )
+
+
+type Headers = list[tuple[str, bytes | None]]
+
+
+class Parser(Protocol):
+    def __call__(self, data: bytes, topic: str | None = None, headers: Headers | None = None) -> ParsedEvent | None:
+        ...
 
 
 table_to_entity = {
     "categories": Category,
     "cast_members": CastMember,
     "genres": Genre,
+    "genre_categories": GenreCategory,
     "videos": Video,
+    "videos_categories": VideoCategory,
+    "videos_genres": VideoGenre,
+    "videos_cast_members": VideoCastMember,
+    "videos_banners": VideoBanner,
 }
 
+# Fields added to the row by Debezium's ExtractNewRecordState transform (`add.fields`, `delete.handling.mode=rewrite`)
+UNWRAPPED_FIELD_PREFIX = "__"
+OPERATION_HEADER = "__op"
+SNAPSHOT_HEADER = "__source_snapshot"
+LAST_SNAPSHOT_MARKERS = {"last", "last_in_data_collection"}
+# How the JSON converter starts the messages that are not flattened rows: with the schema block, or the envelope
+# in the order Debezium writes its fields
+ENVELOPE_STARTS = (b'{"schema":', b'{"payload":', b'{"before":', b'{"after":', b'{"source":', b'{"op":')
 
-def parse_debezium_message(data: bytes) -> ParsedEvent | None:
+
+def parse_debezium_message(data: bytes, topic: str | None = None, headers: Headers | None = None) -> ParsedEvent | None:
     try:
         json_data = json.loads(data.decode("utf-8"))
     except json.JSONDecodeError as e:
@@ -39,8 +89,218 @@ def parse_debezium_message(data: bytes) -> ParsedEvent | None:
         entity = table_to_entity[json_data["payload"]["source"]["table"]]
         operation = Operation(json_data["payload"]["op"])
         payload = json_data["payload"]["after"] if operation != Operation.DELETE else json_data["payload"]["before"]
+        snapshot = json_data["payload"]["source"].get("snapshot")
+        before, after = json_data["payload"].get("before"), json_data["payload"].get("after")
+        version = event_version(json_data["payload"]["source"].get("file"), json_data["payload"]["source"].get("pos"))
+    except (KeyError, ValueError) as e:
+        logger.error(e)
+        return None
+
+    return ParsedEvent(
+        entity=entity,
+        operation=operation,
+        payload=payload,
+        snapshot=snapshot,
+        before=before,
+        after=after,
+        version=version,
+    )
+
+
+def parse_debezium_envelope(data: bytes, topic: str | None = None, headers: Headers | None = None) -> ParsedEvent | None:
+    """
+    Same as `parse_debezium_message`, but decodes the bytes straight into typed structs,
+    skipping the sections of the envelope that are not used. Several times faster on real envelopes.
+    """
+    try:
+        envelope = envelope_decoder.decode(data)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        logger.error(e)
+        return None
+
+    try:
+        entity = table_to_entity[envelope.payload.source.table]
+        operation = Operation(envelope.payload.op)
     except (KeyError, ValueError) as e:
         logger.error(e)
         return None
 
-    return ParsedEvent(entity=entity, operation=operation, payload=payload)
\ No newline at end of file
+    payload = envelope.payload.after if operation != Operation.DELETE else envelope.payload.before
+    source = envelope.payload.source
+    return ParsedEvent(
+        entity=entity,
+        operation=operation,
+        payload=payload,
+        snapshot=source.snapshot,
+        before=envelope.payload.before,
+        after=envelope.payload.after,
+        version=event_version(source.file, source.pos),
+    )
+
+
+@dataclass
+class RowChange:
+    """A change of a row of any table, decoded without resolving the entity it belongs to."""
+    table: str
+    operation: Operation
+    payload: dict
+    snapshot: str | None = None
+    before: dict | None = None
+    after: dict | None = None
+    version: int | None = None
+
+
+def parse_cdc_message(data: bytes, topic: str | None = None, headers: Headers | None = None) -> ParsedEvent | None:
+    """
+    Accepts every format the Debezium connector can be configured to produce:
+    - the full envelope, with or without the `schema` block (`value.converter.schemas.enable`).
+      It is the only one carrying both row images, hence the changed columns;
+    - the flattened row of the ExtractNewRecordState transform. The operation comes from the `__op`
+      header or field and the table from the `__table` field or, by default, from the topic name.
+    """
+    change = parse_row_change(data, topic=topic, headers=headers)
+    if change is None:
+        return None
+
+    try:
+        entity = table_to_entity[change.table]
+    except KeyError as e:
+        logger.error(e)
+        return None
+
+    return ParsedEvent(
+        entity=entity,
+        operation=change.operation,
+        payload=change.payload,
+        snapshot=change.snapshot,
+        before=change.before,
+        after=change.after,
+        version=change.version,
+    )
+
+
+def parse_row_change(data: bytes, topic: str | None = None, headers: Headers | None = None) -> RowChange | None:
+    """Same formats as `parse_cdc_message`, for rows of tables that are not mapped to an entity."""
+    try:
+        # The columns of a flattened row are not known in advance: it is decoded in a single untyped pass
+        row = None if data.startswith(ENVELOPE_STARTS) else row_decoder.decode(data)
+        # An envelope written in another way, e.g. with its keys in another order
+        if row is not None and ("source" in row or "payload" in row):
+            row = None
+        if row is None:
+            # Decoded into typed structs: the schema block and the unused parts of the envelope are skipped
+            document = cdc_document_decoder.decode(data)
+            if document.payload:
+                data = document.payload
+                document = cdc_document_decoder.decode(data)
+            if document.source is None:
+                row = row_decoder.decode(data)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        logger.error(e)
+        return None
+
+    try:
+        if row is None:
+            source = document.source
+            table = source.table
+            operation = Operation(document.op)
+            payload = document.after if operation != Operation.DELETE else document.before
+            snapshot = source.snapshot
+            before, after = document.before, document.after
+            version = event_version(source.file, source.pos)
+        else:
+            table = row.get("__table") or table_from_topic(topic)
+            operation = _unwrapped_operation(row, headers)
+            payload = {key: value for key, value in row.items() if not key.startswith(UNWRAPPED_FIELD_PREFIX)}
+            snapshot = _header(headers, SNAPSHOT_HEADER) or row.get("__source_snapshot")
+            # A flattened row is a single image: what changed cannot be told
+            before, after = (payload, None) if operation == Operation.DELETE else (None, payload)
+            version = event_version(row.get("__source_file"), row.get("__source_pos"))
+    except (TypeError, ValueError) as e:
+        logger.error(e)
+        return None
+
+    return RowChange(
+        table=table,
+        operation=operation,
+        payload=payload,
+        snapshot=snapshot,
+        before=before,
+        after=after,
+        version=version,
+    )
+
+
+def parse_tombstone(key: bytes, topic: str | None = None) -> ParsedEvent | None:
+    """
+    Debezium follows each delete with a tombstone, a message with the row key and no value, so log compaction
+    can drop every message of the row. Once compaction ran, the tombstone is all that is left of the delete.
+    """
+    document = parse_row_key(key)
+    if document is None:
+        return None
+
+    try:
+        entity = table_to_entity[table_from_topic(topic)]
+    except (KeyError, ValueError) as e:
+        logger.error(e)
+        return None
+
+    return ParsedEvent(entity=entity, operation=Operation.DELETE, payload=document, tombstone=True)
+
+
+def parse_row_key(key: bytes) -> dict | None:
+    """Primary key columns of a row, from the key of its messages."""
+    try:
+        document = msgspec.json.decode(key)
+    except msgspec.DecodeError as e:
+        logger.error(e)
+        return None
+
+    if isinstance(document, dict) and "schema" in document and "payload" in document:
+        document = document["payload"]
+    if not isinstance(document, dict):
+        logger.error(f"Unexpected key format: {key[:100]!r}")
+        return None
+    return document
+
+
+def event_version(binlog_file: str | None, binlog_pos: int | None) -> int | None:
+    """
+    Version of a row change, usable as an Elasticsearch external version (a positive 63 bits integer).
+
+    The binlog position orders every change of the database: the file sequence number goes in the high bits
+    and the offset in the file, at most 4 GiB, in the low 32 bits. It is the only source of versions: any
+    other, e.g. the `updated_at` of the rows, would not compare with it. Flattened rows carry it when the
+    connector adds the `source.file` and `source.pos` fields, see `kafka-connect/bin`.
+    """
+    if binlog_file and binlog_pos is not None:
+        sequence = int(binlog_file.rsplit(".", 1)[-1])
+        return (sequence << 32) | binlog_pos
+    logger.warning("Change without its binlog position, written without a version: stale writes are not detected")
+    return None
+
+
+def table_from_topic(topic: str | None) -> str:
+    # Debezium topics are named <topic.prefix>.<database>.<table>
+    if not topic:
+        raise ValueError("Cannot resolve the table of an unwrapped message without its topic")
+    return topic.rsplit(".", 1)[-1]
+
+
+def _unwrapped_operation(row: dict, headers: Headers | None) -> Operation:
+    if row.get("__deleted") in ("true", True):
+        return Operation.DELETE
+    if operation := _header(headers, OPERATION_HEADER):
+        return Operation(operation)
+    if row.get("__op") is not None:
+        return Operation(row["__op"])
+    # Without the operation metadata a row can only be treated as an upsert
+    return Operation.UPDATE
+
+
+def _header(headers: Headers | None, name: str) -> str | None:
+    for key, value in headers or []:
+        if key == name and value is not None:
+            return value.decode("utf-8")
+    return None
@@ -0,0 +1,74 @@
+import logging
+from typing import ClassVar
+
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.mappings import GENRE_CATEGORIES_INDEX, document_fields, to_document
+from src.infra.kafka.abstract_event_handler import AbstractEventHandler
+from src.infra.kafka.parser import ParsedEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectionEventHandler(AbstractEventHandler):
+    """
+    Projects the rows of a table into the documents of an index, one per row, written in bulk by a BulkProjector.
+    Subclasses set the index; its mapping in `mappings` decides which columns end up in the documents.
+    """
+    index: ClassVar[str]
+
+    def __init__(self, projector: BulkProjector | None = None, bulk_load: BulkLoadSettings | None = None) -> None:
+        """
+        :param projector: Buffers the documents and writes them in bulk
+        :param bulk_load: Index settings switched to bulk load mode while a snapshot is loaded
+        """
+        super().__init__()
+        if projector is None:
+            projector = BulkProjector(index=self.index)
+            bulk_load = bulk_load or BulkLoadSettings(client=projector.client, index=self.index)
+        self.projector = projector
+        self.bulk_load = bulk_load
+
+    def document(self, event: ParsedEvent) -> dict:
+        return to_document(self.index, event.payload)
+
+    def _project(self, event: ParsedEvent) -> None:
+        self.projector.index_document(str(event.payload["id"]), self.document(event), version=event.version)
+
+    def handle_created(self, event: ParsedEvent) -> None:
+        logger.info(f"Projecting {event.entity.__name__}: {event.payload}")
+        self._project(event)
+
+    def handle_updated(self, event: ParsedEvent) -> None:
+        logger.info(f"Projecting {event.entity.__name__} update: {event.payload}")
+        self._project(event)
+
+    def handle_deleted(self, event: ParsedEvent) -> None:
+        logger.info(f"Deleting {event.entity.__name__}: {event.payload}")
+        # Tombstones come without a version. Ids are never reused: deleting without a version cannot remove
+        # a newer row, only a document the versioned delete event already removed
+        self.projector.delete_document(str(event.payload["id"]), version=event.version)
+
+    def handle_snapshot(self, events: list[ParsedEvent]) -> None:
+        logger.info(f"Loading {len(events)} {self.index} documents from the snapshot")
+        for event in events:
+            self._project(event)
+        self.projector.flush(chunk_size=self.write_batch_size)
+
+    def flush(self) -> None:
+        super().flush()
+        self.projector.flush(chunk_size=self.write_batch_size)
+
+    def begin_snapshot(self) -> None:
+        if self.bulk_load is not None:
+            self.projector.ensure_index()
+            self.bulk_load.apply()
+
+    def end_snapshot(self) -> None:
+        if self.bulk_load is not None:
+            self.bulk_load.restore()
+
+
+class GenreCategoryEventHandler(ProjectionEventHandler):
+    index = GENRE_CATEGORIES_INDEX
+    projected_fields = document_fields(GENRE_CATEGORIES_INDEX)
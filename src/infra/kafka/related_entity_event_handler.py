@@ -0,0 +1,88 @@
+import logging
+from typing import ClassVar
+
+from src.application.rename_video_relation import RenameVideoRelation, RenameVideoRelationInput
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+from src.infra.elasticsearch.mappings import CAST_MEMBERS_INDEX, CATEGORIES_INDEX, GENRES_INDEX, document_fields
+from src.infra.elasticsearch.update_by_query_tasks import UpdateByQueryTasks
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.projection_event_handler import ProjectionEventHandler
+
+logger = logging.getLogger(__name__)
+
+
+class RelatedEntityEventHandler(ProjectionEventHandler):
+    """
+    Indexes an entity videos are linked to (a category, genre or cast member) and propagates its name into the
+    video documents, with a background task rewriting every linked video.
+
+    Created and snapshot rows are only indexed: a new entity has no videos yet, their names are copied when videos
+    are linked to them, and a task per row would flood the cluster. Deletions need no cascade either, the rows
+    linking the entity to videos go with it.
+    """
+    # Relation field of the videos holding the ids of the entity
+    video_field: ClassVar[str]
+
+    def __init__(
+        self,
+        use_case: RenameVideoRelation | None = None,
+        tasks: UpdateByQueryTasks | None = None,
+        projector: BulkProjector | None = None,
+        bulk_load: BulkLoadSettings | None = None,
+    ) -> None:
+        """
+        :param use_case: Use case that renames the entity in its videos
+        :param tasks: Background tasks of the renames, polled to report their progress
+        :param projector: Buffers the documents of the entity and writes them in bulk
+        :param bulk_load: Index settings switched to bulk load mode while a snapshot is loaded
+        """
+        super().__init__(projector=projector, bulk_load=bulk_load)
+        if use_case is None:
+            repository = ElasticsearchVideoRepository(client=self.projector.client)
+            use_case = RenameVideoRelation(repository=repository)
+            tasks = tasks or repository.tasks
+        self.use_case = use_case
+        self.tasks = tasks
+
+    def _rename(self, event: ParsedEvent) -> None:
+        self.use_case.execute(
+            RenameVideoRelationInput(
+                field=self.video_field,
+                id=event.payload["id"],
+                name=event.payload["name"],
+                version=event.version,
+            )
+        )
+
+    def handle_updated(self, event: ParsedEvent) -> None:
+        super().handle_updated(event)
+        changed = self.changed_projected_fields(event)
+        if changed is not None and "name" not in changed:
+            return
+        logger.info(f"Renaming {event.entity.__name__} {event.payload['id']} in its videos")
+        self._rename(event)
+
+    def flush(self) -> None:
+        super().flush()
+        if self.tasks is not None:
+            self.tasks.poll()
+
+
+class CategoryEventHandler(RelatedEntityEventHandler):
+    index = CATEGORIES_INDEX
+    projected_fields = document_fields(CATEGORIES_INDEX)
+    video_field = "categories"
+
+
+class GenreEventHandler(RelatedEntityEventHandler):
+    index = GENRES_INDEX
+    projected_fields = document_fields(GENRES_INDEX)
+    video_field = "genres"
+
+
+class CastMemberEventHandler(RelatedEntityEventHandler):
+    index = CAST_MEMBERS_INDEX
+    projected_fields = document_fields(CAST_MEMBERS_INDEX)
+    video_field = "cast_members"
@@ -0,0 +1,275 @@
+import argparse
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Callable
+
+from elasticsearch import Elasticsearch
+
+from confluent_kafka import OFFSET_END, Consumer as KafkaConsumer, KafkaException, TopicPartition
+
+from src.application.delete_video import DeleteVideo
+from src.application.save_video import SaveVideo
+from src.application.update_video_relations import UpdateVideoRelations
+from src.infra.elasticsearch import ELASTICSEARCH_HOST
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+from src.infra.elasticsearch.reindex import Reindexer
+from src.infra.kafka.consumer import Consumer, config, entity_to_handler, state_store_indexes
+from src.infra.kafka.offset_manager import OffsetManager
+from src.infra.kafka.parser import parse_cdc_message
+from src.infra.kafka.router import TOPIC_PREFIX, TopicRouter
+from src.infra.kafka.state_store import StateStore, StateStoreUpdater
+from src.infra.kafka.video_event_handler import VideoEventHandler
+from src.infra.kafka.video_relation_event_handler import VideoRelationEventHandler
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Handlers are flushed every this many replayed events: larger batches than live, latency does not matter
+DEFAULT_REPLAY_BATCH_SIZE = 5000
+# Seconds between two progress reports
+DEFAULT_REPORT_INTERVAL = 10.0
+
+
+class ReplayOffsetManager(OffsetManager):
+    """
+    Paces the flushes of the handlers like the live offset manager, but never commits: the replay reads
+    with its own assignment and leaves the offsets of the live consumer group untouched.
+    """
+
+    def _commit(self, partitions: set[tuple[str, int]] | None, asynchronous: bool) -> None:
+        keys = [key for key in self._pending if partitions is None or key in partitions]
+        for key in keys:
+            del self._pending[key]
+        if partitions is None:
+            self._processed_since_commit = 0
+            self._last_commit_at = self._clock()
+
+
+@dataclass
+class ReplayProgress:
+    # Offset the replay started from and offset it stops at, the end of the partition when it started
+    start: int
+    end: int
+    position: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.position >= self.end
+
+    @property
+    def ratio(self) -> float:
+        return 1.0 if self.end <= self.start else min(1.0, (self.position - self.start) / (self.end - self.start))
+
+
+@dataclass
+class ReplayReport:
+    events: int = 0
+    seconds: float = 0.0
+    partitions: dict[tuple[str, int], ReplayProgress] = field(default_factory=dict)
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.seconds if self.seconds else 0.0
+
+
+def start_offsets(
+    client: KafkaConsumer,
+    topics: list[str],
+    offset: int | None = None,
+    timestamp: datetime | None = None,
+    timeout: float = 10.0,
+) -> list[TopicPartition]:
+    """Offset to start replaying each partition of the topics from: a given offset, or the first one at `timestamp`."""
+    metadata = client.list_topics(timeout=timeout)
+    partitions = [
+        TopicPartition(topic, partition)
+        for topic in topics
+        if topic in metadata.topics
+        for partition in metadata.topics[topic].partitions
+    ]
+    if timestamp is None:
+        return [TopicPartition(tp.topic, tp.partition, offset) for tp in partitions]
+
+    milliseconds = int(timestamp.timestamp() * 1000)
+    found = client.offsets_for_times(
+        [TopicPartition(tp.topic, tp.partition, milliseconds) for tp in partitions],
+        timeout=timeout,
+    )
+    # Partitions without any message since then have nothing to replay
+    return [TopicPartition(tp.topic, tp.partition, tp.offset if tp.offset >= 0 else OFFSET_END) for tp in found]
+
+
+class Replayer:
+    """
+    Replays a range of the CDC topics through the handlers of a `Consumer`, from given offsets up to the end of
+    each partition as of the start of the replay, e.g. to rebuild an index corrupted by a projection bug.
+    """
+
+    def __init__(
+        self,
+        consumer: Consumer,
+        bulk_load: BulkLoadSettings | None = None,
+        report_interval: float = DEFAULT_REPORT_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param consumer: Consumer whose client is not subscribed: partitions are assigned by `run`
+        :param bulk_load: Settings of the target index switched to bulk load mode during the replay
+        :param report_interval: Seconds between two progress reports
+        :param clock: Monotonic clock, injectable for tests
+        :param metrics: Registry where the throughput and the remaining messages are recorded
+        """
+        self.consumer = consumer
+        self.bulk_load = bulk_load
+        self.report_interval = report_interval
+        self._clock = clock
+        self.metrics = metrics or registry
+        self.report = ReplayReport()
+
+    def run(self, offsets: list[TopicPartition], timeout: float = 10.0) -> ReplayReport:
+        client = self.consumer.client
+        assignment = []
+        for tp in offsets:
+            low, high = client.get_watermark_offsets(tp, timeout=timeout)
+            # Out of range offsets would be reset by the consumer to the beginning of the partition
+            start = high if tp.offset == OFFSET_END else min(max(tp.offset, low), high)
+            self.report.partitions[(tp.topic, tp.partition)] = ReplayProgress(start=start, end=high, position=start)
+            assignment.append(TopicPartition(tp.topic, tp.partition, start))
+        client.assign(assignment)
+        logger.info(f"Replaying {sum(p.end - p.start for p in self.report.partitions.values())} messages")
+
+        if self.bulk_load is not None:
+            self.bulk_load.apply()
+        started_at = reported_at = self._clock()
+        processed_at_report = 0
+        try:
+            while not self._finished():
+                self.consumer.consume()
+                if self._clock() - reported_at >= self.report_interval:
+                    processed = self._processed()
+                    self._report(rate=(processed - processed_at_report) / (self._clock() - reported_at))
+                    reported_at, processed_at_report = self._clock(), processed
+        finally:
+            self.consumer.stop()
+            if self.bulk_load is not None:
+                self.bulk_load.restore()
+        self.report.events = self._processed()
+        self.report.seconds = self._clock() - started_at
+        self._report(rate=self.report.events_per_second)
+        logger.info(f"Replayed {self.report.events} events in {self.report.seconds:.1f}s")
+        return self.report
+
+    def _processed(self) -> int:
+        return self.consumer.processed_count + self.consumer.rejected_count
+
+    def _finished(self) -> bool:
+        """Whether every partition was replayed up to its end, refreshing their positions."""
+        pending = [key for key, progress in self.report.partitions.items() if not progress.done]
+        if not pending:
+            return True
+        try:
+            positions = self.consumer.client.position([TopicPartition(topic, partition) for topic, partition in pending])
+        except KafkaException as e:
+            logger.warning(f"Failed to read the replay positions: {e}")
+            return False
+        for tp in positions:
+            if tp.offset >= 0:
+                self.report.partitions[(tp.topic, tp.partition)].position = tp.offset
+        finished = [
+            TopicPartition(topic, partition)
+            for (topic, partition), progress in self.report.partitions.items()
+            if progress.done
+        ]
+        if finished:
+            # Messages written since the replay started are left to the live consumer. Paused again on every
+            # check, as the backpressure of the consumer resumes the whole assignment
+            self.consumer.client.pause(finished)
+        return all(progress.done for progress in self.report.partitions.values())
+
+    def _report(self, rate: float) -> None:
+        self.metrics.set("replay_events_per_second", rate)
+        for (topic, partition), progress in self.report.partitions.items():
+            self.metrics.set("replay_remaining_messages", max(0, progress.end - progress.position), topic=topic, partition=str(partition))
+            logger.info(f"{topic}[{partition}]: {progress.position} of {progress.end} ({progress.ratio:.0%})")
+        logger.info(f"{self._processed()} events replayed, {rate:.0f} events/s")
+
+
+def build_replayer(target_index: str | None = None, batch_size: int = DEFAULT_REPLAY_BATCH_SIZE) -> Replayer:
+    """
+    Replays the topics projected into the video index, writing to `target_index` instead of the live alias when
+    given. Names of categories, genres and cast members come from a state store restored from scratch.
+    """
+    repository = ElasticsearchVideoRepository(index=target_index, bulk_chunk_size=batch_size)
+    video_handler = VideoEventHandler(
+        save_use_case=SaveVideo(repository=repository),
+        delete_use_case=DeleteVideo(repository=repository),
+    )
+    relation_handler = VideoRelationEventHandler(use_case=UpdateVideoRelations(repository=repository))
+    for handler in (video_handler, relation_handler):
+        handler.batch_size = batch_size
+    handlers = {VideoEventHandler: lambda: video_handler, VideoRelationEventHandler: lambda: relation_handler}
+
+    state = StateStoreUpdater(
+        store=StateStore(indexes=state_store_indexes),
+        client=KafkaConsumer({**config, "group.id": f"{config['group.id']}-replay-state"}),
+        topics=[f"{TOPIC_PREFIX}.{table}" for table in state_store_indexes],
+    )
+    state.restore()
+
+    # Its own group, never committed: the live group keeps its offsets
+    kafka_consumer = KafkaConsumer({**config, "group.id": f"{config['group.id']}-replay"})
+    consumer = Consumer(
+        client=kafka_consumer,
+        parser=parse_cdc_message,
+        router=TopicRouter(
+            {entity: handlers[handler] for entity, handler in entity_to_handler.items() if handler in handlers},
+            state_store=state.store,
+        ),
+        offset_manager=ReplayOffsetManager(client=kafka_consumer, commit_every=batch_size, commit_interval=30.0),
+        lag_refresh_interval=float("inf"),
+        state=state,
+    )
+    # A target index that does not exist yet is created with the mapping of the videos, without the alias
+    bulk_load = BulkLoadSettings(client=repository.client, index=repository.index, alias=repository.INDEX)
+    return Replayer(consumer=consumer, bulk_load=bulk_load)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # Every message is logged at INFO by the consumer, which would cap the throughput of the replay
+    logging.getLogger("consumer").setLevel(logging.WARNING)
+    arg_parser = argparse.ArgumentParser(description="Rebuilds the video index by replaying the CDC topics")
+    start = arg_parser.add_mutually_exclusive_group(required=True)
+    start.add_argument("--from-offset", type=int, help="Offset to start each partition from, 0 for the beginning")
+    start.add_argument(
+        "--from-timestamp",
+        type=datetime.fromisoformat,
+        help="ISO 8601 date to start each partition from, UTC unless an offset is given",
+    )
+    arg_parser.add_argument("--target-index", default=None, help="Index to write to, the live alias by default")
+    arg_parser.add_argument("--batch-size", type=int, default=DEFAULT_REPLAY_BATCH_SIZE, help="Events per bulk write")
+    arg_parser.add_argument(
+        "--swap",
+        action="store_true",
+        help="Point the live alias to the target index once replayed from offset 0, as the reindex does",
+    )
+    args = arg_parser.parse_args()
+    if args.swap and args.target_index is None:
+        arg_parser.error("--swap requires --target-index")
+    if args.swap and args.from_offset != 0:
+        # Replayed from a later point, the target index misses the videos not changed since
+        arg_parser.error("--swap requires --from-offset 0")
+
+    timestamp = args.from_timestamp
+    if timestamp is not None and timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=UTC)
+    replayer = build_replayer(target_index=args.target_index, batch_size=args.batch_size)
+    topics = replayer.consumer.router.topics
+    replayer.run(start_offsets(replayer.consumer.client, topics, offset=args.from_offset, timestamp=timestamp))
+    if args.swap:
+        client = Elasticsearch(hosts=[ELASTICSEARCH_HOST])
+        Reindexer(client=client, alias=ElasticsearchVideoRepository.INDEX).swap(args.target_index)
@@ -0,0 +1,68 @@
+import logging
+import random
+import time
+from typing import Callable
+
+import httpx
+from elasticsearch import ApiError, TransportError
+
+from src.infra.codeflix_client.errors import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Elasticsearch and the admin API answer with these when overloaded or unavailable, retrying usually succeeds
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Transient errors are caused by the environment (network, overloaded services) and are worth retrying.
+    Everything else (malformed payloads, validation errors, bugs) fails the same way on every attempt.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, TransportError, httpx.TransportError, CircuitOpenError)):
+        return True
+    if isinstance(error, ApiError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        initial_backoff: float = 0.2,
+        max_backoff: float = 5.0,
+        classifier: Callable[[Exception], bool] = is_transient,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        :param max_attempts: Total attempts, including the first one
+        :param initial_backoff: Seconds to wait before the first retry, doubled on every retry
+        :param max_backoff: Upper bound for the wait between attempts
+        :param classifier: Tells whether an error is transient and should be retried
+        :param sleep: Sleep function, injectable for tests
+        """
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.classifier = classifier
+        self._sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries of many failing events instead of hammering in lockstep
+        return random.uniform(0, min(self.max_backoff, self.initial_backoff * 2 ** (attempt - 1)))
+
+    def run[T](self, fn: Callable[[], T]) -> T:
+        attempt = 1
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.classifier(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"Attempt {attempt}/{self.max_attempts} failed with {e!r}, retrying in {delay:.2f}s")
+                self._sleep(delay)
+                attempt += 1
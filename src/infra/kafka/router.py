@@ -0,0 +1,61 @@
+import os
+from typing import Callable, Type
+
+from src.domain.entity import Entity
+from src.domain.genre import GenreCategory
+from src.domain.video_relation import VideoRelation
+from src.infra.kafka.abstract_event_handler import AbstractEventHandler
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.parser import table_to_entity
+from src.infra.kafka.state_store import StateStore
+
+# Debezium names topics <topic.prefix>.<database>.<table>
+TOPIC_PREFIX = os.getenv("TOPIC_PREFIX", "catalog-db.codeflix")
+
+
+class TopicRouter:
+    """
+    Resolves the handler of a message from its topic, before its payload is decoded, so messages
+    nobody handles are skipped for free. Handlers are instantiated once, on their first message.
+    """
+
+    def __init__(
+        self,
+        entity_to_handler: dict[Type[Entity | VideoRelation | GenreCategory], Callable[[], AbstractEventHandler]],
+        topic_prefix: str = TOPIC_PREFIX,
+        state_store: StateStore | None = None,
+        references: IdIndex | None = None,
+    ) -> None:
+        """
+        :param entity_to_handler: Handler class, or factory, of each entity. Entities sharing one share its instance
+        :param topic_prefix: Prefix of the CDC topics, the table name is appended to it
+        :param state_store: Store handlers look related rows up in
+        :param references: Ids handlers check the references of the videos against
+        """
+        entity_to_table = {entity: table for table, entity in table_to_entity.items()}
+        self._topic_to_handler_class = {
+            f"{topic_prefix}.{entity_to_table[entity]}": handler_class
+            for entity, handler_class in entity_to_handler.items()
+        }
+        self._handlers: dict[Callable[[], AbstractEventHandler], AbstractEventHandler] = {}
+        self.state_store = state_store
+        self.references = references
+
+    @property
+    def topics(self) -> list[str]:
+        return list(self._topic_to_handler_class)
+
+    @property
+    def handlers(self) -> list[AbstractEventHandler]:
+        """Handlers that were already instantiated."""
+        return list(self._handlers.values())
+
+    def resolve(self, topic: str) -> AbstractEventHandler | None:
+        handler_class = self._topic_to_handler_class.get(topic)
+        if handler_class is None:
+            return None
+        if handler_class not in self._handlers:
+            handler = self._handlers[handler_class] = handler_class()
+            handler.state_store = self.state_store
+            handler.references = self.references
+        return self._handlers[handler_class]
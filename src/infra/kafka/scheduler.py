@@ -0,0 +1,122 @@
+import logging
+from collections import deque
+
+from confluent_kafka import Message, TopicPartition
+
+from src.infra.kafka.router import TOPIC_PREFIX
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Share of the consumer each topic gets while several have messages waiting. Live edits of the videos come
+# first, topics left out (categories, genres, cast members, often loaded in bulk) use the leftover capacity
+DEFAULT_TOPIC_WEIGHTS = {
+    f"{TOPIC_PREFIX}.videos": 10,
+    f"{TOPIC_PREFIX}.videos_categories": 5,
+    f"{TOPIC_PREFIX}.videos_genres": 5,
+    f"{TOPIC_PREFIX}.videos_cast_members": 5,
+    f"{TOPIC_PREFIX}.videos_banners": 5,
+}
+DEFAULT_WEIGHT = 1
+# Messages fetched from the client at once
+DEFAULT_FETCH_SIZE = 500
+# Messages buffered per topic before its partitions are paused
+DEFAULT_MAX_BUFFERED = 2000
+
+
+class PriorityScheduler:
+    """
+    Buffers the fetched messages per topic and hands them out by smooth weighted round robin: while several
+    topics have messages waiting, each one gets a share of the consumer proportional to its weight, so a
+    backfill of one table delays the live edits of another by a few messages at most. Messages of a
+    partition keep their order.
+
+    A topic whose buffer is full is reported in `full_topics`, for the consumer to pause its partitions
+    until half of it was drained.
+    """
+
+    def __init__(
+        self,
+        weights: dict[str, int] | None = None,
+        default_weight: int = DEFAULT_WEIGHT,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        """
+        :param weights: Weight of each topic, the share of the consumer it gets while others have messages waiting
+        :param default_weight: Weight of the topics missing from `weights`
+        :param fetch_size: Messages fetched from the client at once
+        :param max_buffered: Messages buffered per topic before its partitions should be paused
+        :param metrics: Registry where the buffered messages per topic are recorded
+        """
+        self.weights = DEFAULT_TOPIC_WEIGHTS if weights is None else weights
+        self.default_weight = default_weight
+        self.fetch_size = fetch_size
+        self.max_buffered = max_buffered
+        self.metrics = metrics or registry
+        self._buffers: dict[str, deque[Message]] = {}
+        self._credits: dict[str, int] = {}
+        # Errors are not tied to a topic, they are handed out first
+        self._errors: deque[Message] = deque()
+        self._full_topics: set[str] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._errors) + sum(len(buffer) for buffer in self._buffers.values())
+
+    @property
+    def full_topics(self) -> frozenset[str]:
+        return frozenset(self._full_topics)
+
+    def weight(self, topic: str) -> int:
+        return self.weights.get(topic, self.default_weight)
+
+    def add(self, messages: list[Message]) -> None:
+        for message in messages:
+            if message.error():
+                self._errors.append(message)
+            else:
+                self._buffers.setdefault(message.topic(), deque()).append(message)
+        for topic, buffer in self._buffers.items():
+            if len(buffer) >= self.max_buffered and topic not in self._full_topics:
+                logger.info(f"{len(buffer)} messages of {topic} waiting, pausing it")
+                self._full_topics.add(topic)
+            self.metrics.set("consumer_scheduled_messages", len(buffer), topic=topic)
+
+    def next(self) -> Message | None:
+        if self._errors:
+            return self._errors.popleft()
+        waiting = [topic for topic, buffer in self._buffers.items() if buffer]
+        if not waiting:
+            return None
+        # Smooth weighted round robin: every waiting topic earns its weight, the richest one is served and pays
+        # the total. Topics get their share interleaved instead of in bursts
+        for topic in waiting:
+            self._credits[topic] = self._credits.get(topic, 0) + self.weight(topic)
+        topic = max(waiting, key=lambda candidate: self._credits[candidate])
+        self._credits[topic] -= sum(self.weight(candidate) for candidate in waiting)
+
+        buffer = self._buffers[topic]
+        message = buffer.popleft()
+        if not buffer:
+            # Credits are not saved up while a topic has nothing waiting
+            self._credits[topic] = 0
+        if topic in self._full_topics and len(buffer) <= self.max_buffered // 2:
+            self._full_topics.discard(topic)
+        self.metrics.set("consumer_scheduled_messages", len(buffer), topic=topic)
+        return message
+
+    def drop(self, partitions: list[TopicPartition]) -> None:
+        """Forgets the buffered messages of partitions, e.g. revoked or rewound: they are consumed again."""
+        keys = {(tp.topic, tp.partition) for tp in partitions}
+        for topic, buffer in self._buffers.items():
+            kept = [message for message in buffer if (topic, message.partition()) not in keys]
+            if len(kept) == len(buffer):
+                continue
+            self._buffers[topic] = deque(kept)
+            if not kept:
+                self._credits[topic] = 0
+            if len(kept) <= self.max_buffered // 2:
+                self._full_topics.discard(topic)
+            self.metrics.set("consumer_scheduled_messages", len(kept), topic=topic)
@@ -0,0 +1,273 @@
+import logging
+import os
+import sqlite3
+import time
+
+import msgspec
+from confluent_kafka import OFFSET_BEGINNING, OFFSET_INVALID, Consumer as KafkaConsumer, Message, TopicPartition
+
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import parse_row_change, parse_row_key, table_from_topic
+from src.infra.metrics.registry import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+# Directory of the state store files, one per worker. The store is disabled when it is not set
+STATE_STORE_DIR = os.getenv("STATE_STORE_DIR")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    table_name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (table_name, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS row_index (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (table_name, column_name, value, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS positions (
+    topic TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    next_offset INTEGER NOT NULL,
+    PRIMARY KEY (topic, partition)
+) WITHOUT ROWID;
+"""
+
+
+def row_key(key: dict) -> str:
+    # Most tables have a single primary key column: its value alone is the key
+    if len(key) == 1:
+        return str(next(iter(key.values())))
+    return msgspec.json.encode(dict(sorted(key.items()))).decode()
+
+
+class StateStore:
+    """
+    Embedded key-value store holding the latest row of each key of some tables, so handlers can look up
+    related rows (the categories of a genre, the cast members of a video...) locally instead of querying
+    Elasticsearch or the admin API.
+
+    Rows are kept in SQLite, along with the position of the store in each topic it is built from. Writes
+    accumulate in a transaction until `checkpoint`: rows and positions are always consistent on disk.
+    """
+
+    def __init__(self, path: str = ":memory:", indexes: dict[str, tuple[str, ...]] | None = None) -> None:
+        """
+        :param path: SQLite database file
+        :param indexes: Columns of each table rows can be looked up by, besides their key
+        """
+        self.path = path
+        self.indexes = indexes or {}
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Losing the last checkpoints on a power failure is fine: they are restored from the topics
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+
+    @property
+    def positions(self) -> dict[tuple[str, int], int]:
+        """Offset of the next message of each topic partition to apply to the store."""
+        rows = self._connection.execute("SELECT topic, partition, next_offset FROM positions")
+        return {(topic, partition): next_offset for topic, partition, next_offset in rows}
+
+    def get(self, table: str, key: str) -> dict | None:
+        row = self._connection.execute(
+            "SELECT value FROM rows WHERE table_name = ? AND key = ?",
+            (table, key),
+        ).fetchone()
+        return msgspec.json.decode(row[0]) if row else None
+
+    def keys(self, table: str) -> list[str]:
+        rows = self._connection.execute("SELECT key FROM rows WHERE table_name = ?", (table,))
+        return [key for key, in rows]
+
+    def lookup(self, table: str, column: str, value) -> list[dict]:
+        """Rows of the table whose column has the value. The column must be indexed."""
+        if column not in self.indexes.get(table, ()):
+            raise ValueError(f"Column {column} of {table} is not indexed")
+        rows = self._connection.execute(
+            "SELECT rows.value FROM row_index JOIN rows USING (table_name, key)"
+            " WHERE row_index.table_name = ? AND row_index.column_name = ? AND row_index.value = ?",
+            (table, column, str(value)),
+        )
+        return [msgspec.json.decode(value) for value, in rows]
+
+    def put(self, table: str, key: str, row: dict) -> None:
+        self._unindex(table, key)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO rows (table_name, key, value) VALUES (?, ?, ?)",
+            (table, key, msgspec.json.encode(row)),
+        )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO row_index (table_name, column_name, value, key) VALUES (?, ?, ?, ?)",
+            [(table, column, str(row[column]), key) for column in self.indexes.get(table, ()) if row.get(column) is not None],
+        )
+
+    def delete(self, table: str, key: str) -> None:
+        self._unindex(table, key)
+        self._connection.execute("DELETE FROM rows WHERE table_name = ? AND key = ?", (table, key))
+
+    def advance(self, topic: str, partition: int, next_offset: int) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO positions (topic, partition, next_offset) VALUES (?, ?, ?)",
+            (topic, partition, next_offset),
+        )
+
+    def checkpoint(self) -> None:
+        """Makes the rows and positions written so far durable."""
+        self._connection.commit()
+
+    def close(self) -> None:
+        self.checkpoint()
+        self._connection.close()
+
+    def _unindex(self, table: str, key: str) -> None:
+        if table in self.indexes:
+            self._connection.execute("DELETE FROM row_index WHERE table_name = ? AND key = ?", (table, key))
+
+
+class StateStoreUpdater:
+    """
+    Keeps a state store current from the CDC topics of its tables, like a Kafka Streams global table.
+
+    It reads every partition of the topics with its own consumer, outside of the consumer group: each worker
+    has the whole tables, whatever partitions it was assigned. Topics should be compacted, so restoring
+    a store from scratch reads about one message per row.
+    """
+
+    def __init__(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+        topics: list[str],
+        max_poll_messages: int = 500,
+        metrics: MetricsRegistry | None = None,
+        references: IdIndex | None = None,
+    ) -> None:
+        """
+        :param store: Store the rows are written to
+        :param client: Kafka consumer client, without group: partitions are assigned, offsets never committed
+        :param topics: CDC topics of the tables kept in the store
+        :param max_poll_messages: Max number of messages applied per `poll`, bounds the time taken from the main loop
+        :param metrics: Registry where restored and applied messages are recorded
+        :param references: Ids loaded from the rows of the store at restore, then kept current with them
+        """
+        self.store = store
+        self.client = client
+        self.topics = topics
+        self.max_poll_messages = max_poll_messages
+        self.metrics = metrics or registry
+        self.references = references
+
+    def restore(self, timeout: float = 10.0) -> int:
+        """
+        Assigns every partition of the topics from the position saved in the store, or from the beginning,
+        and applies their messages up to the end of the partitions. Returns the number of messages applied.
+        """
+        started_at = time.monotonic()
+        if self.references is not None:
+            # Ids of the rows checkpointed, the messages after them are applied to both
+            for table in self._referenced_tables:
+                self.references.reset(table, self.store.keys(table))
+        metadata = self.client.list_topics(timeout=timeout)
+        positions = self.store.positions
+        partitions = [
+            TopicPartition(topic, partition, positions.get((topic, partition), OFFSET_BEGINNING))
+            for topic in self.topics
+            if topic in metadata.topics
+            for partition in metadata.topics[topic].partitions
+        ]
+        self.client.assign(partitions)
+
+        ends = {}
+        for partition in partitions:
+            low, high = self.client.get_watermark_offsets(partition, timeout=timeout)
+            # Empty partitions, e.g. new or whose messages all expired, and those applied up to their end
+            # have nothing to restore: their position would never move to their end
+            if low == high or partition.offset >= high:
+                continue
+            ends[(partition.topic, partition.partition)] = high
+
+        restored = 0
+        while ends:
+            message = self.client.poll(timeout=1.0)
+            if message is None:
+                # Compaction leaves gaps in offsets: a partition is also restored once its position reached the end
+                for partition in self.client.position([TopicPartition(topic, partition) for topic, partition in ends]):
+                    if partition.offset == OFFSET_INVALID:
+                        # Nothing fetched from the partition yet
+                        continue
+                    if partition.offset >= ends[(partition.topic, partition.partition)]:
+                        del ends[(partition.topic, partition.partition)]
+                continue
+            if message.error():
+                logger.error(f"Received message with error while restoring the state store: {message.error()}")
+                continue
+            self._apply(message)
+            restored += 1
+            key = (message.topic(), message.partition())
+            if key in ends and message.offset() + 1 >= ends[key]:
+                del ends[key]
+
+        self.store.checkpoint()
+        self.metrics.inc("state_store_restored_total", value=restored)
+        logger.info(f"Restored {restored} messages to the state store in {time.monotonic() - started_at:.1f}s")
+        return restored
+
+    def poll(self) -> int:
+        """Applies the messages already fetched, without waiting. Returns the number of messages applied."""
+        applied = 0
+        while applied < self.max_poll_messages:
+            message = self.client.poll(timeout=0)
+            if message is None:
+                break
+            if message.error():
+                logger.error(f"Received message with error for the state store: {message.error()}")
+                continue
+            self._apply(message)
+            applied += 1
+        if applied:
+            self.metrics.inc("state_store_applied_total", value=applied)
+        return applied
+
+    def checkpoint(self) -> None:
+        self.store.checkpoint()
+
+    def close(self) -> None:
+        self.store.close()
+        self.client.close()
+
+    def _apply(self, message: Message) -> None:
+        table = table_from_topic(message.topic())
+        key = parse_row_key(message.key()) if message.key() else None
+        if not message.value():
+            if key is not None:
+                self._delete(table, row_key(key))
+        else:
+            change = parse_row_change(message.value(), topic=message.topic(), headers=message.headers())
+            if change is None or key is None:
+                logger.error(f"Skipping message of {message.topic()}[{message.partition()}]@{message.offset()}")
+            elif change.operation == Operation.DELETE:
+                self._delete(change.table, row_key(key))
+            else:
+                self.store.put(change.table, row_key(key), change.payload)
+                if change.table in self._referenced_tables:
+                    self.references.add(change.table, row_key(key))
+        self.store.advance(message.topic(), message.partition(), message.offset() + 1)
+
+    def _delete(self, table: str, key: str) -> None:
+        self.store.delete(table, key)
+        if table in self._referenced_tables:
+            self.references.discard(table, key)
+
+    @property
+    def _referenced_tables(self) -> set[str]:
+        if self.references is None:
+            return set()
+        return {table_from_topic(topic) for topic in self.topics} & set(self.references.tables)
@@ -0,0 +1,201 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing.process import BaseProcess
+from typing import Callable
+
+from confluent_kafka.admin import AdminClient
+
+from src.infra.metrics.registry import merge, render
+from src.infra.metrics.server import MetricsServer
+
+logger = logging.getLogger("supervisor")
+
+HEARTBEAT_INTERVAL_SECONDS = 5.0
+
+
+def resolve_worker_count(bootstrap_servers: str, topics: list[str], max_workers: int | None = None) -> int:
+    """
+    One worker per partition is the most a consumer group can use: extra members would stay idle.
+    Workers are CPU bound, so there is no point in running more of them than cores either.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    metadata = AdminClient({"bootstrap.servers": bootstrap_servers}).list_topics(timeout=10)
+    partitions = sum(len(metadata.topics[topic].partitions) for topic in topics if topic in metadata.topics)
+    return max(1, min(partitions, max_workers))
+
+
+def run_worker(worker_id: int, status_queue: multiprocessing.Queue) -> None:
+    # Imported here so the supervisor process does not build handlers and clients it never uses
+    from src.infra.kafka.consumer import build_consumer
+
+    consumer = build_consumer(worker_id)
+    # The heartbeat clock starts once the state store is restored and the ids are loaded, which can take long
+    ready_at = time.time()
+    # Ctrl+C reaches the whole process group: let the supervisor decide when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: consumer.request_stop())
+
+    def report() -> None:
+        while True:
+            status_queue.put({
+                "worker_id": worker_id,
+                "pid": os.getpid(),
+                "ready_at": ready_at,
+                "reported_at": time.time(),
+                **consumer.stats(),
+            })
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+
+    threading.Thread(target=report, daemon=True).start()
+    consumer.start()
+
+
+class Supervisor:
+    """Runs N consumer processes in the same consumer group, so ingestion is not capped to one core by the GIL."""
+
+    def __init__(
+        self,
+        worker_count: int,
+        target: Callable[[int, multiprocessing.Queue], None] = run_worker,
+        heartbeat_timeout: float = 60.0,
+        startup_timeout: float = 900.0,
+        shutdown_timeout: float = 30.0,
+        context: multiprocessing.context.BaseContext | None = None,
+    ) -> None:
+        """
+        :param worker_count: Number of consumer processes to keep running
+        :param target: Function run by each worker process, receives the worker id and the status queue
+        :param heartbeat_timeout: Workers that have not polled Kafka for this long are considered stuck and restarted
+        :param startup_timeout: Workers that have not reported being ready after this long are restarted too
+        :param shutdown_timeout: Seconds to wait for workers to commit and exit before killing them
+        :param context: Multiprocessing context, `spawn` by default since librdkafka is not fork-safe
+        """
+        self.worker_count = worker_count
+        self.target = target
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._context = context or multiprocessing.get_context("spawn")
+        self._status_queue = self._context.Queue()
+        self._workers: dict[int, BaseProcess] = {}
+        self._status: dict[int, dict] = {}
+        self._started_at: dict[int, float] = {}
+        self.restarts = 0
+        self.running = False
+
+    def start(self) -> None:
+        logger.info(f"Starting {self.worker_count} consumer workers...")
+        self.running = True
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.request_stop())
+        for worker_id in range(self.worker_count):
+            self._spawn(worker_id)
+        try:
+            while self.running:
+                self.supervise()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            logger.info("Stopping supervisor...")
+        finally:
+            self.stop()
+
+    def request_stop(self) -> None:
+        self.running = False
+
+    def supervise(self) -> None:
+        self._collect_status()
+        for worker_id, process in list(self._workers.items()):
+            if not process.is_alive():
+                logger.error(f"Worker {worker_id} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                self.restarts += 1
+                self._spawn(worker_id)
+            elif self._is_stuck(worker_id):
+                logger.error(f"Worker {worker_id} (pid {process.pid}) stopped polling, restarting")
+                process.kill()
+                process.join()
+                self.restarts += 1
+                self._spawn(worker_id)
+
+    def stop(self) -> None:
+        logger.info("Stopping consumer workers...")
+        # SIGTERM lets each worker finish its message and commit its offsets
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for worker_id, process in self._workers.items():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"Worker {worker_id} (pid {process.pid}) did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+    def health(self) -> dict:
+        self._collect_status()
+        alive = sum(1 for process in self._workers.values() if process.is_alive())
+        return {
+            "status": "ok" if alive == self.worker_count else "degraded",
+            "workers": self.worker_count,
+            "alive": alive,
+            "restarts": self.restarts,
+            "processed": sum(status.get("processed", 0) for status in self._status.values()),
+            "rejected": sum(status.get("rejected", 0) for status in self._status.values()),
+            "by_worker": {
+                worker_id: {key: value for key, value in status.items() if key != "metrics"}
+                for worker_id, status in self._status.items()
+            },
+        }
+
+    def render_metrics(self) -> str:
+        self._collect_status()
+        return render(merge({
+            str(worker_id): status["metrics"] for worker_id, status in self._status.items() if "metrics" in status
+        }))
+
+    def _spawn(self, worker_id: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(worker_id, self._status_queue),
+            name=f"consumer-worker-{worker_id}",
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._started_at[worker_id] = time.time()
+        self._status.pop(worker_id, None)
+        logger.info(f"Worker {worker_id} started with pid {process.pid}")
+
+    def _collect_status(self) -> None:
+        while True:
+            try:
+                status = self._status_queue.get_nowait()
+            except queue.Empty:
+                return
+            # Ignore late reports from a worker that was already replaced
+            process = self._workers.get(status["worker_id"])
+            if process is not None and process.pid == status["pid"]:
+                self._status[status["worker_id"]] = status
+
+    def _is_stuck(self, worker_id: int) -> bool:
+        status = self._status.get(worker_id)
+        if status is None:
+            # Still starting: restoring its state store can take much longer than a heartbeat
+            return time.time() - self._started_at[worker_id] > self.startup_timeout
+        last_seen = status.get("last_poll_at") or status["ready_at"]
+        return time.time() - last_seen > self.heartbeat_timeout
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from src.infra.kafka.consumer import config, entity_to_handler, metrics_port
+    from src.infra.kafka.router import TopicRouter
+
+    topics = TopicRouter(entity_to_handler).topics
+    workers = int(os.getenv("CONSUMER_WORKERS", "0")) or resolve_worker_count(config["bootstrap.servers"], topics)
+    supervisor = Supervisor(worker_count=workers)
+    # Workers do not serve metrics themselves: the supervisor exposes the sum of all of them
+    MetricsServer(render_metrics=supervisor.render_metrics, health=supervisor.health, port=metrics_port).start()
+    supervisor.start()
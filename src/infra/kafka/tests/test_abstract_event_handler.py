@@ -1,5 +1,7 @@
 from unittest.mock import create_autospec
 
+import pytest
+
 from src.domain.category import Category
 from src.infra.kafka.abstract_event_handler import AbstractEventHandler
 from src.infra.kafka.operation import Operation
@@ -64,4 +66,113 @@ class TestAbstractEventHandler:
         logger = mocker.patch("src.infra.kafka.abstract_event_handler.logger")
         handler(event)
 
-        logger.info.assert_called_once_with(f"Unknown operation: {event.operation}")
\ No newline at end of file
+        logger.info.assert_called_once_with(f"Unknown operation: {event.operation}")
+
+class TestSnapshot:
+    @staticmethod
+    def read_event(id: int, snapshot: str = "true") -> ParsedEvent:
+        return ParsedEvent(entity=Category, operation=Operation.READ, payload={"id": id}, snapshot=snapshot)
+
+    @pytest.fixture
+    def handler(self) -> FakeHandler:
+        handler = FakeHandler()
+        handler.snapshot_batch_size = 2
+        handler.handle_snapshot = create_autospec(handler.handle_snapshot)
+        handler.begin_snapshot = create_autospec(handler.begin_snapshot)
+        handler.end_snapshot = create_autospec(handler.end_snapshot)
+        return handler
+
+    def test_read_events_are_handled_in_batches(self, handler: FakeHandler):
+        events = [self.read_event(id) for id in range(3)]
+        for event in events:
+            handler(event)
+
+        handler.begin_snapshot.assert_called_once()
+        handler.handle_snapshot.assert_called_once_with(events[:2])
+        assert handler.in_snapshot is True
+
+        handler.flush()
+
+        handler.handle_snapshot.assert_called_with(events[2:])
+        handler.end_snapshot.assert_not_called()
+
+    def test_last_snapshot_event_ends_the_snapshot(self, handler: FakeHandler):
+        events = [self.read_event(0, snapshot="first"), self.read_event(1, snapshot="last")]
+        for event in events:
+            handler(event)
+
+        handler.handle_snapshot.assert_called_once_with(events)
+        handler.end_snapshot.assert_called_once()
+        assert handler.in_snapshot is False
+
+    def test_streaming_event_ends_the_snapshot_before_being_handled(self, handler: FakeHandler):
+        snapshot_event = self.read_event(0)
+        update_event = ParsedEvent(entity=Category, operation=Operation.UPDATE, payload={"id": 0})
+        handler.handle_updated = create_autospec(handler.handle_updated)
+
+        handler(snapshot_event)
+        handler(update_event)
+
+        handler.handle_snapshot.assert_called_once_with([snapshot_event])
+        handler.end_snapshot.assert_called_once()
+        handler.handle_updated.assert_called_once_with(update_event)
+
+    def test_when_batch_fails_then_events_are_kept_for_the_next_flush(self, handler: FakeHandler):
+        event = self.read_event(0)
+        handler(event)
+        handler.handle_snapshot.side_effect = [ConnectionError, None]
+
+        with pytest.raises(ConnectionError):
+            handler.flush()
+        handler.flush()
+
+        assert handler.handle_snapshot.call_count == 2
+        handler.handle_snapshot.assert_called_with([event])
+
+    def test_close_ends_a_snapshot_in_progress(self, handler: FakeHandler):
+        handler(self.read_event(0))
+        handler.close()
+
+        handler.handle_snapshot.assert_called_once()
+        handler.end_snapshot.assert_called_once()
+        assert handler.in_snapshot is False
+
+
+class TestProjectedFields:
+    @pytest.fixture
+    def handler(self) -> FakeHandler:
+        handler = FakeHandler()
+        handler.projected_fields = frozenset({"name"})
+        handler.handle_updated = create_autospec(handler.handle_updated)
+        return handler
+
+    def test_when_no_projected_field_changed_then_skip_update(self, handler: FakeHandler):
+        event = ParsedEvent(
+            entity=Category,
+            operation=Operation.UPDATE,
+            payload={"name": "Movies", "internal_notes": "new"},
+            before={"name": "Movies", "internal_notes": "old"},
+            after={"name": "Movies", "internal_notes": "new"},
+        )
+        handler(event)
+
+        handler.handle_updated.assert_not_called()
+
+    def test_when_projected_field_changed_then_handle_update(self, handler: FakeHandler):
+        event = ParsedEvent(
+            entity=Category,
+            operation=Operation.UPDATE,
+            payload={"name": "Films", "internal_notes": "new"},
+            before={"name": "Movies", "internal_notes": "old"},
+            after={"name": "Films", "internal_notes": "new"},
+        )
+        handler(event)
+
+        handler.handle_updated.assert_called_once_with(event)
+        assert handler.changed_projected_fields(event) == {"name"}
+
+    def test_when_changes_are_unknown_then_handle_update(self, handler: FakeHandler):
+        event = ParsedEvent(entity=Category, operation=Operation.UPDATE, payload={"name": "Films"}, after={"name": "Films"})
+        handler(event)
+
+        handler.handle_updated.assert_called_once_with(event)
@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock
+
+import pytest
+from elasticsearch import ApiError, ConnectionTimeout
+from elasticsearch.helpers import BulkIndexError
+
+from src.infra.kafka.backpressure import Backpressure, BackpressureState, is_overloaded
+from src.infra.metrics.registry import MetricsRegistry
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def api_error(status: int) -> ApiError:
+    return ApiError(message="error", meta=MagicMock(status=status), body={})
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def backpressure(clock: Clock) -> Backpressure:
+    return Backpressure(
+        max_batch_size=400,
+        min_batch_size=50,
+        increase_step=100,
+        slow_flush_seconds=5.0,
+        pause_seconds=1.0,
+        max_pause_seconds=3.0,
+        clock=clock,
+        metrics=MetricsRegistry(),
+    )
+
+
+class TestIsOverloaded:
+    @pytest.mark.parametrize(
+        "error, expected",
+        [
+            (api_error(429), True),
+            (api_error(503), True),
+            (ConnectionTimeout("timed out"), True),
+            (BulkIndexError("failed", [{"index": {"_id": "1", "status": 429}}]), True),
+            (api_error(400), False),
+            (BulkIndexError("failed", [{"index": {"_id": "1", "status": 400}}]), False),
+            (ValueError("bug"), False),
+        ],
+    )
+    def test_rejections_and_timeouts_are_overload(self, error: Exception, expected: bool) -> None:
+        assert is_overloaded(error) is expected
+
+
+class TestBackpressure:
+    def test_throttle_halves_the_batch_size_and_pauses(self, backpressure: Backpressure, clock: Clock) -> None:
+        backpressure.throttle(reason="rejected")
+
+        assert backpressure.paused
+        assert backpressure.batch_size == 200
+        assert not backpressure.should_resume()
+        clock.now = 1.0
+        assert backpressure.should_resume()
+
+    def test_batch_size_never_drops_below_the_minimum(self, backpressure: Backpressure) -> None:
+        for _ in range(5):
+            backpressure.throttle(reason="rejected")
+
+        assert backpressure.batch_size == 50
+
+    def test_pauses_double_while_the_write_side_keeps_failing(self, backpressure: Backpressure, clock: Clock) -> None:
+        resume_after = []
+        for _ in range(3):
+            started_at = clock.now
+            backpressure.throttle(reason="rejected")
+            while not backpressure.should_resume():
+                clock.now += 0.5
+            resume_after.append(clock.now - started_at)
+            backpressure.resume()
+
+        assert resume_after == [1.0, 2.0, 3.0]
+
+    def test_batch_size_grows_back_step_by_step_after_resuming(self, backpressure: Backpressure) -> None:
+        backpressure.throttle(reason="rejected")
+        backpressure.resume()
+
+        sizes = []
+        for _ in range(3):
+            backpressure.record_flush(seconds=0.1, events=backpressure.batch_size)
+            sizes.append(backpressure.batch_size)
+
+        assert sizes == [300, 400, 400]
+        assert backpressure.state is BackpressureState.FLOWING
+
+    def test_slow_flush_throttles_without_rejection(self, backpressure: Backpressure) -> None:
+        backpressure.record_flush(seconds=6.0, events=400)
+
+        assert backpressure.paused
+        assert backpressure.metrics.counter("consumer_backpressure_pauses_total", reason="slow_flush") == 1
+
+    def test_state_and_batch_size_are_recorded(self, backpressure: Backpressure) -> None:
+        backpressure.throttle(reason="rejected")
+
+        assert backpressure.metrics.gauge("consumer_backpressure_state", state="paused") == 1.0
+        assert backpressure.metrics.gauge("consumer_backpressure_state", state="flowing") == 0.0
+        assert backpressure.metrics.gauge("consumer_batch_size") == 200
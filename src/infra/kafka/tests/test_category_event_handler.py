@@ -1,78 +1,53 @@
-import uuid
 from unittest.mock import create_autospec
+from uuid import uuid4
 
 import pytest
 
-from src.application.category.save_category import SaveCategory
-from src.domain.category.category import Category
-from src.infra.kafka.video_event_handler import CategoryEventHandler
-from src.infra.kafka.parser import ParsedEvent
+from src.application.rename_video_relation import RenameVideoRelation
+from src.domain.category import Category
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX
+from src.infra.elasticsearch.update_by_query_tasks import UpdateByQueryTasks
 from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.related_entity_event_handler import CategoryEventHandler
+
+
+@pytest.fixture
+def handler() -> CategoryEventHandler:
+    return CategoryEventHandler(
+        use_case=create_autospec(RenameVideoRelation),
+        tasks=create_autospec(UpdateByQueryTasks),
+        projector=create_autospec(BulkProjector),
+    )
+
+
+@pytest.fixture
+def row() -> dict:
+    return {"id": str(uuid4()), "name": "Drama", "description": "Dramas", "is_active": True}
 
 
 class TestHandleCreated:
-    def test_call_save_category_use_case(self):
-        payload_uuid = uuid.uuid4()
-        event = ParsedEvent(
-            entity=Category,
-            operation=Operation.CREATE,
-            payload={
-                "external_id": payload_uuid,
-                "name": "name",
-                "description": "description",
-                "created_at": "2021-08-21T00:00:00",
-                "updated_at": "2021-08-21T00:00:00",
-                "is_active": True,
-            },
-        )
-
-        save_category_use_case = create_autospec(SaveCategory)
-        handler = CategoryEventHandler(save_use_case=save_category_use_case)
-
-        handler.handle_created(event)
-
-        expected_input = SaveCategory.Input(
-            category=Category(
-                id=payload_uuid,
-                name="name",
-                description="description",
-                created_at="2021-08-21T00:00:00",
-                updated_at="2021-08-21T00:00:00",
-                is_active=True,
-            )
-        )
-        save_category_use_case.execute.assert_called_once_with(input=expected_input)
-
-
-class TestHandleUpdated:
-    def test_call_save_category_use_case(self):
-        payload_uuid = uuid.uuid4()
-        event = ParsedEvent(
-            entity=Category,
-            operation=Operation.UPDATE,
-            payload={
-                "external_id": payload_uuid,
-                "name": "name",
-                "description": "description",
-                "created_at": "2021-08-21T00:00:00",
-                "updated_at": "2021-08-21T00:00:00",
-                "is_active": True,
-            },
-        )
-
-        save_category_use_case = create_autospec(SaveCategory)
-        handler = CategoryEventHandler(save_use_case=save_category_use_case)
-
-        handler.handle_updated(event)
-
-        expected_input = SaveCategory.Input(
-            category=Category(
-                id=payload_uuid,
-                name="name",
-                description="description",
-                created_at="2021-08-21T00:00:00",
-                updated_at="2021-08-21T00:00:00",
-                is_active=True,
-            )
-        )
-        save_category_use_case.execute.assert_called_once_with(input=expected_input)
\ No newline at end of file
+    def test_category_is_indexed(self, handler: CategoryEventHandler, row: dict) -> None:
+        handler(ParsedEvent(entity=Category, operation=Operation.CREATE, payload=row, version=3))
+
+        handler.projector.index_document.assert_called_once_with(row["id"], row, version=3)
+
+    def test_no_rename_task_is_submitted(self, handler: CategoryEventHandler, row: dict) -> None:
+        handler(ParsedEvent(entity=Category, operation=Operation.CREATE, payload=row, version=3))
+
+        handler.use_case.execute.assert_not_called()
+
+
+class TestHandleDeleted:
+    def test_category_document_is_deleted(self, handler: CategoryEventHandler, row: dict) -> None:
+        handler(ParsedEvent(entity=Category, operation=Operation.DELETE, payload=row, version=4))
+
+        handler.projector.delete_document.assert_called_once_with(row["id"], version=4)
+        handler.use_case.execute.assert_not_called()
+
+
+class TestCategoryEventHandler:
+    def test_writes_the_categories_index_and_renames_the_categories_of_videos(self) -> None:
+        assert CategoryEventHandler.index == CATEGORIES_INDEX
+        assert CategoryEventHandler.video_field == "categories"
@@ -2,19 +2,31 @@ from unittest.mock import create_autospec, MagicMock
 
 import pytest
 from pytest_mock import MockFixture
-from confluent_kafka import KafkaException, Consumer as KafkaConsumer, Message
+from confluent_kafka import TIMESTAMP_CREATE_TIME, KafkaException, Consumer as KafkaConsumer, Message, TopicPartition
 
-from src.domain.category.category import Category
-from src.infra.kafka.consumer import Consumer
+from elasticsearch import ApiError
+
+from src.domain.category import Category
+from src.infra.kafka.backpressure import Backpressure
+from src.infra.kafka.consumer import Consumer, consumer_config
+from src.infra.kafka.dead_letter import DeadLetterPublisher
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.retry import RetryPolicy
+from src.infra.kafka.router import TopicRouter
+from src.infra.kafka.scheduler import PriorityScheduler
+from src.infra.kafka.state_store import StateStoreUpdater
+from src.infra.metrics.registry import MetricsRegistry
 
 # from src.infra.kafka.abstract_kafka_client import AbstractKafkaClient
-from src.infra.kafka.parser import parse_debezium_message
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent, parse_debezium_message
 
 
 @pytest.fixture
 def consumer() -> Consumer:
     client = create_autospec(KafkaConsumer)
-    return Consumer(client=client, parser=parse_debezium_message)
+    router = TopicRouter({Category: MagicMock()})
+    return Consumer(client=client, parser=parse_debezium_message, router=router, metrics=MetricsRegistry())
 
 
 @pytest.fixture
@@ -29,6 +41,7 @@ def empty_message() -> Message:
     message = create_autospec(Message)
     message.error.return_value = None
     message.value.return_value = None
+    message.key.return_value = None
     return message
 
 
@@ -37,6 +50,7 @@ def message_with_invalid_data() -> Message:
     message = create_autospec(Message)
     message.error.return_value = None
     message.value.return_value = b"not a json data"
+    message.topic.return_value = "catalog-db.codeflix.categories"
     return message
 
 
@@ -45,6 +59,23 @@ def message_with_create_data() -> Message:
     message = create_autospec(Message)
     message.error.return_value = None
     message.value.return_value = b'{"payload": {"source": {"table": "categories"}, "op": "c", "after": {"id": 1, "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "name": "Category 1", "description": "Description 1", "created_at": "2022-01-01", "updated_at": "2022-01-01", "is_active": true}}}'
+    message.topic.return_value = "catalog-db.codeflix.categories"
+    message.partition.return_value = 0
+    message.offset.return_value = 41
+    message.timestamp.return_value = (TIMESTAMP_CREATE_TIME, 1704067200000)
+    return message
+
+
+@pytest.fixture
+def tombstone_message() -> Message:
+    message = create_autospec(Message)
+    message.error.return_value = None
+    message.value.return_value = None
+    message.key.return_value = b'{"id": 1}'
+    message.topic.return_value = "catalog-db.codeflix.categories"
+    message.partition.return_value = 0
+    message.offset.return_value = 41
+    message.timestamp.return_value = (TIMESTAMP_CREATE_TIME, 1704067200000)
     return message
 
 
@@ -104,13 +135,461 @@ class TestConsume:
     ) -> None:
         consumer.client.poll.return_value = message_with_create_data
         mock_handler = mocker.MagicMock()
-        consumer.router = {Category: mock_handler}
+        consumer.router = TopicRouter({Category: mock_handler})
 
         consumer.consume()
 
         mock_handler.assert_called_once()
 
-        consumer.client.commit.assert_called_once_with(message=message_with_create_data)
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+        consumer.client.commit.assert_not_called()
+        assert consumer.metrics.counter("consumer_events_total", entity="Category", operation="c") == 1
+
+    def test_when_cannot_parse_message_data_then_send_to_dead_letter_and_move_on(
+        self,
+        consumer: Consumer,
+        message_with_invalid_data: Message,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_invalid_data
+        consumer.dead_letter = create_autospec(DeadLetterPublisher)
+        consumer.offset_manager = MagicMock()
+
+        consumer.consume()
+
+        consumer.dead_letter.publish.assert_called_once_with(message_with_invalid_data, reason="parse_error", error=None)
+        consumer.offset_manager.track.assert_called_once_with(message_with_invalid_data)
+
+    def test_when_handler_fails_with_transient_error_then_retry(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        mocker: MockFixture,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        mock_handler = mocker.MagicMock()
+        mock_handler.return_value.side_effect = [ConnectionError("refused"), None]
+        consumer.router = TopicRouter({Category: mock_handler})
+        consumer.retry_policy = RetryPolicy(sleep=mocker.MagicMock())
+        consumer.dead_letter = create_autospec(DeadLetterPublisher)
+
+        consumer.consume()
+
+        assert mock_handler.return_value.call_count == 2
+        consumer.dead_letter.publish.assert_not_called()
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+
+    def test_when_handler_fails_with_permanent_error_then_send_to_dead_letter(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        mocker: MockFixture,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        error = KeyError("title")
+        mock_handler = mocker.MagicMock()
+        mock_handler.return_value.side_effect = error
+        consumer.router = TopicRouter({Category: mock_handler})
+        consumer.dead_letter = create_autospec(DeadLetterPublisher)
+
+        consumer.consume()
+
+        assert mock_handler.return_value.call_count == 1
+        consumer.dead_letter.publish.assert_called_once_with(
+            message_with_create_data,
+            reason="handler_error",
+            error=error,
+        )
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+
+
+    def test_when_message_is_a_tombstone_then_handle_it_as_a_delete(
+        self,
+        consumer: Consumer,
+        tombstone_message: Message,
+        mocker: MockFixture,
+    ) -> None:
+        consumer.client.poll.return_value = tombstone_message
+        handler_class = mocker.MagicMock()
+        consumer.router = TopicRouter({Category: handler_class})
+
+        consumer.consume()
+
+        handler_class.return_value.assert_called_once_with(
+            ParsedEvent(entity=Category, operation=Operation.DELETE, payload={"id": 1}, tombstone=True)
+        )
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+
+    def test_when_no_handler_is_registered_for_topic_then_skip_without_parsing(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        mocker: MockFixture,
+    ) -> None:
+        message_with_create_data.topic.return_value = "catalog-db.codeflix.users"
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.parser = mocker.MagicMock()
+
+        consumer.consume()
+
+        consumer.parser.assert_not_called()
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.users", 0): 42}
+        assert consumer.metrics.counter("consumer_skipped_total", topic="catalog-db.codeflix.users") == 1
+
+    def test_referenced_ids_are_kept_current_before_handling(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.references = create_autospec(IdIndex, instance=True)
+
+        consumer.consume()
+
+        parsed_event = consumer.references.apply.call_args.args[0]
+        assert parsed_event.entity is Category
+        assert parsed_event.operation == Operation.CREATE
+
+
+class TestRefreshLag:
+    def test_record_lag_from_committed_offset_to_high_watermark(self, consumer: Consumer) -> None:
+        consumer.client.assignment.return_value = [
+            TopicPartition("catalog-db.codeflix.videos", 0),
+            TopicPartition("catalog-db.codeflix.videos", 1),
+        ]
+        consumer.client.committed.return_value = [
+            TopicPartition("catalog-db.codeflix.videos", 0, 90),
+            TopicPartition("catalog-db.codeflix.videos", 1, -1001),  # Nothing committed yet
+        ]
+        consumer.client.get_watermark_offsets.side_effect = [(0, 100), (10, 50)]
+
+        consumer.refresh_lag()
+
+        assert consumer.metrics.gauge("consumer_lag", topic="catalog-db.codeflix.videos", partition="0") == 10
+        assert consumer.metrics.gauge("consumer_lag", topic="catalog-db.codeflix.videos", partition="1") == 40
+
+
+class TestStateStore:
+    def test_state_store_is_updated_before_each_poll_and_checkpointed_before_commits(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.state = create_autospec(StateStoreUpdater)
+        consumer.offset_manager.commit_every = 1
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.state.checkpoint.side_effect = lambda: consumer.client.commit.assert_not_called()
+
+        consumer.consume()
+
+        consumer.state.poll.assert_called_once()
+        consumer.state.checkpoint.assert_called_once()
+        consumer.client.commit.assert_called_once()
+
+    def test_state_store_is_closed_with_the_consumer(self, consumer: Consumer) -> None:
+        consumer.state = create_autospec(StateStoreUpdater)
+
+        consumer.stop()
+
+        consumer.state.close.assert_called_once()
+
+
+class TestFlush:
+    @pytest.fixture
+    def handler(self, consumer: Consumer) -> MagicMock:
+        return consumer.router.resolve("catalog-db.codeflix.categories")
+
+    def test_buffered_events_are_flushed_before_offsets_are_committed(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+    ) -> None:
+        consumer.offset_manager.commit_every = 1
+        consumer.client.poll.return_value = message_with_create_data
+        handler.flush.side_effect = lambda: consumer.client.commit.assert_not_called()
+
+        consumer.consume()
+
+        handler.flush.assert_called_once()
+        consumer.client.commit.assert_called_once()
+
+    def test_when_flush_fails_then_offsets_are_not_committed(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+    ) -> None:
+        consumer.offset_manager.commit_every = 1
+        consumer.retry_policy = RetryPolicy(max_attempts=1)
+        consumer.client.poll.return_value = message_with_create_data
+        handler.flush.side_effect = ConnectionError
+
+        consumer.consume()
+
+        consumer.client.commit.assert_not_called()
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+        assert consumer.metrics.counter("consumer_flush_errors_total") == 1
+
+    def test_when_no_message_is_available_then_flush_handlers(self, consumer: Consumer, handler: MagicMock) -> None:
+        consumer.client.poll.return_value = None
+
+        consumer.consume()
+
+        handler.flush.assert_called_once()
+
+    def test_flush_before_committing_revoked_partitions(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.consume()
+
+        consumer.on_revoke(consumer.client, [TopicPartition("catalog-db.codeflix.categories", 0)])
+
+        handler.flush.assert_called_once()
+        consumer.client.commit.assert_called_once_with(
+            offsets=[TopicPartition("catalog-db.codeflix.categories", 0, 42)],
+            asynchronous=False,
+        )
+
+
+class TestRebalance:
+    PARTITION = TopicPartition("catalog-db.codeflix.categories", 0)
+
+    @pytest.fixture
+    def handler(self, consumer: Consumer) -> MagicMock:
+        return consumer.router.resolve("catalog-db.codeflix.categories")
+
+    def test_when_flush_fails_on_revoke_then_forget_offsets_without_committing(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+    ) -> None:
+        consumer.retry_policy = RetryPolicy(max_attempts=1)
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.consume()
+        handler.flush.side_effect = ConnectionError
+
+        consumer.on_revoke(consumer.client, [self.PARTITION])
+
+        consumer.client.commit.assert_not_called()
+        assert consumer.offset_manager.pending == {}
+
+    def test_lost_partitions_are_forgotten_without_committing(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.consume()
+
+        consumer.on_lost(consumer.client, [self.PARTITION])
+
+        consumer.client.commit.assert_not_called()
+        assert consumer.offset_manager.pending == {}
+        assert consumer.metrics.counter("consumer_rebalances_total", event="lost") == 1
+
+    def test_partitions_assigned_during_a_pause_are_paused(self, consumer: Consumer) -> None:
+        consumer.backpressure.throttle(reason="rejected")
+        consumer.client.assignment.return_value = [self.PARTITION]
+        consumer.client.committed.return_value = []
+        consumer.client.poll.return_value = None
+
+        consumer.on_assign(consumer.client, [self.PARTITION])
+        consumer.consume()
+
+        consumer.client.pause.assert_called_once_with([self.PARTITION])
+        assert consumer.metrics.gauge("consumer_assigned_partitions") == 1
+
+    def test_static_membership_gives_each_worker_its_own_instance_id(self, mocker: MockFixture) -> None:
+        mocker.patch("src.infra.kafka.consumer.group_instance_id", "consumer")
+
+        assert consumer_config(worker_id=2)["group.instance.id"] == "consumer-2"
+
+    def test_without_instance_id_workers_are_dynamic_members(self, mocker: MockFixture) -> None:
+        mocker.patch("src.infra.kafka.consumer.group_instance_id", None)
+
+        assert "group.instance.id" not in consumer_config(worker_id=2)
+
+
+class TestScheduler:
+    @pytest.fixture(autouse=True)
+    def setup(self, consumer: Consumer) -> None:
+        consumer.scheduler = PriorityScheduler(max_buffered=1, metrics=consumer.metrics)
+        consumer.client.assignment.return_value = [TopicPartition("catalog-db.codeflix.categories", 0)]
+
+    def test_messages_are_fetched_in_batches_and_handed_out_by_the_scheduler(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.client.consume.return_value = [message_with_create_data]
+
+        consumer.consume()
+
+        consumer.client.consume.assert_called_once_with(num_messages=500, timeout=1.0)
+        consumer.client.poll.assert_not_called()
+        assert consumer.offset_manager.pending == {("catalog-db.codeflix.categories", 0): 42}
+
+    def test_topics_with_too_many_messages_waiting_are_paused_until_drained(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.client.consume.return_value = [message_with_create_data, message_with_create_data]
+        consumer.consume()
+        consumer.client.pause.assert_called_once_with([TopicPartition("catalog-db.codeflix.categories", 0)])
+
+        consumer.client.consume.return_value = []
+        consumer.consume()
+
+        consumer.client.consume.assert_called_with(num_messages=500, timeout=0)
+        consumer.client.resume.assert_called_once_with([TopicPartition("catalog-db.codeflix.categories", 0)])
+
+    def test_end_to_end_latency_is_recorded_per_topic(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.client.consume.return_value = [message_with_create_data]
+
+        consumer.consume()
+
+        snapshot = consumer.metrics.snapshot()
+        histogram = snapshot.histograms[("consumer_end_to_end_seconds", (("topic", "catalog-db.codeflix.categories"),))]
+        assert histogram.count == 1
+
+
+class TestBackpressure:
+    @pytest.fixture
+    def handler(self, consumer: Consumer) -> MagicMock:
+        return consumer.router.resolve("catalog-db.codeflix.categories")
+
+    @pytest.fixture
+    def rejected(self) -> ApiError:
+        return ApiError(message="es_rejected_execution_exception", meta=MagicMock(status=429), body={})
+
+    @pytest.fixture(autouse=True)
+    def setup(self, consumer: Consumer) -> None:
+        consumer.retry_policy = RetryPolicy(max_attempts=1)
+        consumer.backpressure = Backpressure(max_batch_size=400, clock=lambda: 0.0, metrics=consumer.metrics)
+        consumer.client.assignment.return_value = [TopicPartition("catalog-db.codeflix.categories", 0)]
+
+    def test_when_writes_are_rejected_then_pause_the_assignment_and_shrink_batches(
+        self,
+        consumer: Consumer,
+        handler: MagicMock,
+        rejected: ApiError,
+    ) -> None:
+        handler.flush.side_effect = rejected
+        consumer.client.poll.return_value = None
+
+        consumer.consume()
+
+        consumer.client.pause.assert_called_once_with([TopicPartition("catalog-db.codeflix.categories", 0)])
+        assert consumer.offset_manager.commit_every == 200
+        assert consumer.metrics.gauge("consumer_paused_partitions") == 1
+
+    def test_when_a_message_is_rejected_then_rewind_instead_of_dead_lettering(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+        rejected: ApiError,
+    ) -> None:
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.dead_letter = create_autospec(DeadLetterPublisher)
+        handler.side_effect = rejected
+
+        consumer.consume()
+
+        consumer.client.seek.assert_called_once_with(TopicPartition("catalog-db.codeflix.categories", 0, 41))
+        consumer.dead_letter.publish.assert_not_called()
+        assert consumer.offset_manager.pending == {}
+        assert consumer.backpressure.paused
+
+    def test_assignment_is_resumed_once_the_pause_is_over(
+        self,
+        consumer: Consumer,
+        handler: MagicMock,
+        rejected: ApiError,
+    ) -> None:
+        now = 0.0
+        consumer.backpressure._clock = lambda: now
+        handler.flush.side_effect = [rejected, None]
+        consumer.client.poll.return_value = None
+        consumer.consume()
+
+        now = 10.0
+        consumer.consume()
+
+        consumer.client.resume.assert_called_once_with([TopicPartition("catalog-db.codeflix.categories", 0)])
+        assert consumer.metrics.gauge("consumer_paused_partitions") == 0
+
+    def test_scheduled_messages_wait_for_the_pause_to_be_over(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+        handler: MagicMock,
+        rejected: ApiError,
+    ) -> None:
+        now = 0.0
+        consumer.backpressure._clock = lambda: now
+        consumer.scheduler = PriorityScheduler(metrics=consumer.metrics)
+        consumer.scheduler.add([message_with_create_data])
+        consumer.backpressure.throttle(reason="rejected")
+        consumer.client.consume.return_value = []
+
+        consumer.consume()
+
+        handler.assert_not_called()
+        consumer.client.consume.assert_called_once_with(num_messages=500, timeout=1.0)
+        assert consumer.scheduler.pending == 1
+
+        now = 10.0
+        consumer.consume()
+
+        handler.assert_called_once()
+        assert consumer.scheduler.pending == 0
+
+    def test_buffers_are_not_written_again_during_the_pause(
+        self,
+        consumer: Consumer,
+        handler: MagicMock,
+        rejected: ApiError,
+    ) -> None:
+        now = 0.0
+        consumer.backpressure._clock = lambda: now
+        handler.flush.side_effect = [rejected, None]
+        consumer.client.poll.return_value = None
+        consumer.consume()
+
+        consumer.consume()
+        assert handler.flush.call_count == 1
+
+        now = 10.0
+        consumer.consume()
+
+        assert handler.flush.call_count == 2
+        assert handler.write_batch_size == 200
+
+    def test_batches_grow_back_with_healthy_flushes(
+        self,
+        consumer: Consumer,
+        message_with_create_data: Message,
+    ) -> None:
+        consumer.backpressure.throttle(reason="rejected")
+        consumer.backpressure.resume()
+        consumer.client.poll.return_value = message_with_create_data
+        consumer.consume()
+
+        consumer.flush()
+
+        assert consumer.offset_manager.commit_every == 250
 
 
 class TestStart:
@@ -125,6 +604,41 @@ class TestStart:
         assert consumer.consume.call_count == 2
         consumer.client.close.assert_called_once()
 
+    def test_commit_pending_offsets_synchronously_before_closing(
+        self,
+        consumer: Consumer,
+        mocker: MockFixture,
+    ) -> None:
+        consumer.offset_manager = mocker.MagicMock()
+        consumer.consume = mocker.MagicMock(side_effect=KeyboardInterrupt)
+        consumer.start()
+
+        consumer.offset_manager.commit.assert_called_once_with(asynchronous=False)
+        consumer.client.close.assert_called_once()
+
+    def test_close_handlers_before_committing(self, consumer: Consumer, mocker: MockFixture) -> None:
+        handler = consumer.router.resolve("catalog-db.codeflix.categories")
+        consumer.offset_manager = mocker.MagicMock()
+        consumer.consume = mocker.MagicMock(side_effect=KeyboardInterrupt)
+        consumer.start()
+
+        handler.close.assert_called_once()
+        consumer.offset_manager.commit.assert_called_once_with(asynchronous=False)
+
+    def test_when_handler_cannot_be_closed_then_offsets_are_not_committed(
+        self,
+        consumer: Consumer,
+        mocker: MockFixture,
+    ) -> None:
+        handler = consumer.router.resolve("catalog-db.codeflix.categories")
+        handler.close.side_effect = ConnectionError
+        consumer.offset_manager = mocker.MagicMock()
+        consumer.consume = mocker.MagicMock(side_effect=KeyboardInterrupt)
+        consumer.start()
+
+        consumer.offset_manager.commit.assert_not_called()
+        consumer.client.close.assert_called_once()
+
     def test_consume_message_until_kafka_exception(
         self,
         consumer: Consumer,
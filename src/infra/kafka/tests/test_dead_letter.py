@@ -0,0 +1,82 @@
+from unittest.mock import create_autospec
+
+import pytest
+from confluent_kafka import KafkaException, Consumer as KafkaConsumer, Message, Producer
+
+from src.infra.kafka.dead_letter import DeadLetterPublisher, DeadLetterReplayer
+
+
+@pytest.fixture
+def failed_message() -> Message:
+    message = create_autospec(Message)
+    message.topic.return_value = "catalog-db.codeflix.videos"
+    message.partition.return_value = 2
+    message.offset.return_value = 10
+    message.key.return_value = b'{"id": 1}'
+    message.value.return_value = b"not a json data"
+    message.headers.return_value = None
+    return message
+
+
+class TestPublish:
+    def test_forward_message_with_error_metadata(self, failed_message: Message) -> None:
+        producer = create_autospec(Producer)
+        producer.flush.return_value = 0
+        publisher = DeadLetterPublisher(producer=producer, topic="dlq")
+
+        publisher.publish(failed_message, reason="handler_error", error=KeyError("title"))
+
+        kwargs = producer.produce.call_args.kwargs
+        headers = dict(kwargs["headers"])
+        assert kwargs["topic"] == "dlq"
+        assert kwargs["key"] == b'{"id": 1}'
+        assert kwargs["value"] == b"not a json data"
+        assert headers["dlq.original.topic"] == "catalog-db.codeflix.videos"
+        assert headers["dlq.original.partition"] == "2"
+        assert headers["dlq.original.offset"] == "10"
+        assert headers["dlq.error.reason"] == "handler_error"
+        assert headers["dlq.error.class"] == "KeyError"
+
+    def test_when_broker_does_not_acknowledge_then_raise(self, failed_message: Message) -> None:
+        producer = create_autospec(Producer)
+        producer.flush.return_value = 1
+        publisher = DeadLetterPublisher(producer=producer, topic="dlq")
+
+        with pytest.raises(KafkaException):
+            publisher.publish(failed_message, reason="parse_error")
+
+
+class TestReplay:
+    def test_republish_messages_to_original_topic_and_commit(self) -> None:
+        dead_lettered = create_autospec(Message)
+        dead_lettered.error.return_value = None
+        dead_lettered.key.return_value = b'{"id": 1}'
+        dead_lettered.value.return_value = b"{}"
+        dead_lettered.headers.return_value = [
+            ("__op", b"u"),
+            ("__source_snapshot", b"false"),
+            ("dlq.original.topic", b"catalog-db.codeflix.videos"),
+            ("dlq.error.reason", b"handler_error"),
+            ("dlq.replayed", b"true"),
+        ]
+        client = create_autospec(KafkaConsumer)
+        client.poll.side_effect = [dead_lettered, None]
+        producer = create_autospec(Producer)
+
+        replayed = DeadLetterReplayer(client=client, producer=producer).replay()
+
+        assert replayed == 1
+        producer.produce.assert_called_once_with(
+            topic="catalog-db.codeflix.videos",
+            key=b'{"id": 1}',
+            value=b"{}",
+            headers=[("__op", b"u"), ("__source_snapshot", b"false"), ("dlq.replayed", b"true")],
+        )
+        client.commit.assert_called_once_with(asynchronous=False)
+
+    def test_when_nothing_was_dead_lettered_then_do_not_commit(self) -> None:
+        client = create_autospec(KafkaConsumer)
+        client.poll.return_value = None
+
+        assert DeadLetterReplayer(client=client, producer=create_autospec(Producer)).replay() == 0
+        client.commit.assert_not_called()
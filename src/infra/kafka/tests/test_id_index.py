@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import pytest
+from elasticsearch import Elasticsearch, NotFoundError
+from pytest_mock import MockFixture
+
+from src.domain.category import Category
+from src.domain.genre import Genre
+from src.domain.video import Video
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX, GENRES_INDEX
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.metrics.registry import MetricsRegistry
+
+
+@pytest.fixture
+def index() -> IdIndex:
+    return IdIndex(tables={"categories": CATEGORIES_INDEX, "genres": GENRES_INDEX}, metrics=MetricsRegistry())
+
+
+class TestIdIndex:
+    def test_ids_are_kept_per_table(self, index: IdIndex) -> None:
+        id = uuid4()
+        index.add("categories", id)
+
+        assert index.contains("categories", id)
+        assert index.contains("categories", str(id))
+        assert not index.contains("genres", id)
+
+    def test_created_rows_are_added_and_deleted_ones_removed(self, index: IdIndex) -> None:
+        id = str(uuid4())
+
+        index.apply(ParsedEvent(entity=Category, operation=Operation.READ, payload={"id": id}))
+        assert index.contains("categories", id)
+
+        index.apply(ParsedEvent(entity=Category, operation=Operation.DELETE, payload={"id": id}))
+        assert not index.contains("categories", id)
+        assert index.metrics.gauge("consumer_reference_ids", table="categories") == 0
+
+    def test_events_of_other_tables_and_invalid_ids_are_ignored(self, index: IdIndex) -> None:
+        index.apply(ParsedEvent(entity=Video, operation=Operation.CREATE, payload={"id": str(uuid4())}))
+        index.apply(ParsedEvent(entity=Genre, operation=Operation.CREATE, payload={"id": 1}))
+
+        assert len(index) == 0
+
+    def test_ids_are_rebuilt_from_the_projected_indices(self, index: IdIndex, mocker: MockFixture) -> None:
+        categories = [str(uuid4()), str(uuid4())]
+
+        def scan(client: Elasticsearch, index: str, **kwargs) -> list[dict]:
+            if index == GENRES_INDEX:
+                raise NotFoundError(message="no such index", meta=MagicMock(status=404), body={})
+            return [{"_id": id} for id in categories]
+
+        mocker.patch("src.infra.kafka.id_index.helpers.scan", side_effect=scan)
+        index.add("genres", uuid4())
+
+        assert index.rebuild(MagicMock(spec=Elasticsearch)) == 2
+        assert all(index.contains("categories", id) for id in categories)
+        assert index.metrics.gauge("consumer_reference_ids", table="genres") == 0
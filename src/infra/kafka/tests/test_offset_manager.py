@@ -0,0 +1,118 @@
+from unittest.mock import create_autospec
+
+import pytest
+from confluent_kafka import KafkaException, Consumer as KafkaConsumer, Message, TopicPartition
+
+from src.infra.kafka.offset_manager import OffsetManager
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_message(topic: str = "catalog-db.codeflix.videos", partition: int = 0, offset: int = 0) -> Message:
+    message = create_autospec(Message)
+    message.topic.return_value = topic
+    message.partition.return_value = partition
+    message.offset.return_value = offset
+    return message
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def offset_manager(clock: FakeClock) -> OffsetManager:
+    client = create_autospec(KafkaConsumer)
+    return OffsetManager(client=client, commit_interval=5.0, commit_every=3, clock=clock)
+
+
+class TestTrack:
+    def test_keep_next_offset_to_consume_per_partition(self, offset_manager: OffsetManager) -> None:
+        offset_manager.track(make_message(partition=0, offset=10))
+        offset_manager.track(make_message(partition=0, offset=11))
+        offset_manager.track(make_message(partition=1, offset=3))
+
+        assert offset_manager.pending == {
+            ("catalog-db.codeflix.videos", 0): 12,
+            ("catalog-db.codeflix.videos", 1): 4,
+        }
+
+
+class TestMaybeCommit:
+    def test_when_no_threshold_is_reached_then_do_not_commit(self, offset_manager: OffsetManager) -> None:
+        offset_manager.track(make_message(offset=1))
+        offset_manager.maybe_commit()
+
+        offset_manager.client.commit.assert_not_called()
+
+    def test_when_count_threshold_is_reached_then_commit_asynchronously(self, offset_manager: OffsetManager) -> None:
+        for offset in range(3):
+            offset_manager.track(make_message(offset=offset))
+        offset_manager.maybe_commit()
+
+        offset_manager.client.commit.assert_called_once_with(
+            offsets=[TopicPartition("catalog-db.codeflix.videos", 0, 3)],
+            asynchronous=True,
+        )
+        assert offset_manager.pending == {}
+
+    def test_when_interval_elapsed_then_commit_asynchronously(
+        self,
+        offset_manager: OffsetManager,
+        clock: FakeClock,
+    ) -> None:
+        offset_manager.track(make_message(offset=7))
+        clock.now = 5.0
+        offset_manager.maybe_commit()
+
+        offset_manager.client.commit.assert_called_once_with(
+            offsets=[TopicPartition("catalog-db.codeflix.videos", 0, 8)],
+            asynchronous=True,
+        )
+
+    def test_when_nothing_is_pending_then_do_not_commit(
+        self,
+        offset_manager: OffsetManager,
+        clock: FakeClock,
+    ) -> None:
+        clock.now = 60.0
+        offset_manager.maybe_commit()
+
+        offset_manager.client.commit.assert_not_called()
+
+    def test_when_commit_fails_then_keep_offsets_pending(self, offset_manager: OffsetManager) -> None:
+        offset_manager.client.commit.side_effect = KafkaException("error")
+        for offset in range(3):
+            offset_manager.track(make_message(offset=offset))
+        offset_manager.maybe_commit()
+
+        assert offset_manager.pending == {("catalog-db.codeflix.videos", 0): 3}
+
+
+class TestOnRevoke:
+    def test_commit_only_revoked_partitions_synchronously(self, offset_manager: OffsetManager) -> None:
+        offset_manager.track(make_message(partition=0, offset=1))
+        offset_manager.track(make_message(partition=1, offset=5))
+
+        offset_manager.on_revoke(offset_manager.client, [TopicPartition("catalog-db.codeflix.videos", 1)])
+
+        offset_manager.client.commit.assert_called_once_with(
+            offsets=[TopicPartition("catalog-db.codeflix.videos", 1, 6)],
+            asynchronous=False,
+        )
+        assert offset_manager.pending == {("catalog-db.codeflix.videos", 0): 2}
+
+    def test_when_commit_fails_then_forget_revoked_partitions_anyway(self, offset_manager: OffsetManager) -> None:
+        offset_manager.track(make_message(partition=1, offset=5))
+        offset_manager.client.commit.side_effect = KafkaException("rebalance in progress")
+
+        offset_manager.on_revoke(offset_manager.client, [TopicPartition("catalog-db.codeflix.videos", 1)])
+
+        assert offset_manager.pending == {}
@@ -1,28 +1,45 @@
+from pathlib import Path
+
+import pytest
 from pytest_mock import MockFixture
 
-from src.infra.kafka.consumer import Category
-from src.infra.kafka.parser import ParsedEvent, parse_debezium_message
+from src.domain.category import Category
+from src.domain.video import Video
+from src.domain.video_relation import VideoCategory
+from src.infra.kafka.parser import (
+    ParsedEvent,
+    event_version,
+    parse_cdc_message,
+    parse_debezium_envelope,
+    parse_debezium_message,
+    parse_tombstone,
+)
 from src.infra.kafka.operation import Operation
 
 
 class TestParseDebeziumMessage:
+    row = {
+        "id": 1,
+        "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006",
+        "name": "Category 1",
+        "description": "Description 1",
+        "created_at": "2022-01-01",
+        "updated_at": "2022-01-01",
+        "is_active": True,
+    }
+    updated_row = {**row, "name": "Category 1 Updated", "description": "Description 1 Updated"}
+
     def test_parse_created_message(self):
         data = b'{"payload": {"source": {"table": "categories"}, "op": "c", "after": {"id": 1, "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "name": "Category 1", "description": "Description 1", "created_at": "2022-01-01", "updated_at": "2022-01-01", "is_active": true}}}'
         parsed_event = parse_debezium_message(data)
         expected_event = ParsedEvent(
             entity=Category,
             operation=Operation.CREATE,
-            payload={
-                "id": 1,
-                "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006",
-                "name": "Category 1",
-                "description": "Description 1",
-                "created_at": "2022-01-01",
-                "updated_at": "2022-01-01",
-                "is_active": True,
-            },
+            payload=self.row,
+            after=self.row,
         )
         assert parsed_event == expected_event
+        assert parsed_event.changed_fields is None
 
     def test_parse_updated_message(self):
         data = b'{"payload": {"source": {"table": "categories"}, "op": "u", "before": {"id": 1, "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "name": "Category 1", "description": "Description 1", "created_at": "2022-01-01", "updated_at": "2022-01-01", "is_active": true}, "after": {"id": 1, "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "name": "Category 1 Updated", "description": "Description 1 Updated", "created_at": "2022-01-01", "updated_at": "2022-01-01", "is_active": true}}}'
@@ -30,17 +47,12 @@ class TestParseDebeziumMessage:
         expected_event = ParsedEvent(
             entity=Category,
             operation=Operation.UPDATE,
-            payload={
-                "id": 1,
-                "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006",
-                "name": "Category 1 Updated",
-                "description": "Description 1 Updated",
-                "created_at": "2022-01-01",
-                "updated_at": "2022-01-01",
-                "is_active": True,
-            },
+            payload=self.updated_row,
+            before=self.row,
+            after=self.updated_row,
         )
         assert parsed_event == expected_event
+        assert parsed_event.changed_fields == {"name", "description"}
 
     def test_parse_deleted_message(self):
         data = b'{"payload": {"source": {"table": "categories"}, "op": "d", "before": {"id": 1, "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "name": "Category 1", "description": "Description 1", "created_at": "2022-01-01", "updated_at": "2022-01-01", "is_active": true}, "after": null }}'
@@ -48,15 +60,8 @@ class TestParseDebeziumMessage:
         expected_event = ParsedEvent(
             entity=Category,
             operation=Operation.DELETE,
-            payload={
-                "id": 1,
-                "external_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006",
-                "name": "Category 1",
-                "description": "Description 1",
-                "created_at": "2022-01-01",
-                "updated_at": "2022-01-01",
-                "is_active": True,
-            },
+            payload=self.row,
+            before=self.row,
         )
         assert parsed_event == expected_event
 
@@ -72,4 +77,159 @@ class TestParseDebeziumMessage:
         data = b'{"payload": {}}'
         parsed_event = parse_debezium_message(data)
         assert parsed_event is None
-        log_error.assert_called_once()
\ No newline at end of file
+        log_error.assert_called_once()
+
+
+class TestParseDebeziumEnvelope:
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b'{"payload": {"source": {"table": "categories"}, "op": "c", "after": {"id": 1, "name": "Category 1"}}}',
+            b'{"payload": {"source": {"table": "categories"}, "op": "u", "before": {"id": 1, "name": "Category 1"}, "after": {"id": 1, "name": "Category 1 Updated"}}}',
+            b'{"payload": {"source": {"table": "categories"}, "op": "d", "before": {"id": 1, "name": "Category 1"}, "after": null }}',
+        ],
+    )
+    def test_parse_same_event_as_parse_debezium_message(self, data: bytes):
+        assert parse_debezium_envelope(data) == parse_debezium_message(data)
+
+    def test_skip_schema_and_unused_source_fields(self):
+        data = (Path(__file__).parent.parent / "benchmarks" / "envelopes" / "videos_create.json").read_bytes()
+        parsed_event = parse_debezium_envelope(data)
+
+        assert parsed_event.entity is Video
+        assert parsed_event.operation == Operation.CREATE
+        assert parsed_event.payload["title"] == "The Godfather"
+
+    def test_when_message_is_invalid_json_then_return_none_and_log_error(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        parsed_event = parse_debezium_envelope(b'{"payload": {"source": {"table": "categories"}, "op": "c"')
+        assert parsed_event is None
+        log_error.assert_called_once()
+
+    def test_when_message_is_missing_required_key_then_return_none(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        parsed_event = parse_debezium_envelope(b'{"payload": {}}')
+        assert parsed_event is None
+        log_error.assert_called_once()
+
+    def test_when_table_is_unknown_then_return_none(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        parsed_event = parse_debezium_envelope(b'{"payload": {"source": {"table": "unknown"}, "op": "c", "after": {}}}')
+        assert parsed_event is None
+        log_error.assert_called_once()
+
+
+class TestEventVersion:
+    def test_version_from_binlog_position(self):
+        assert event_version("mysql-bin.000003", 1543) == (3 << 32) | 1543
+
+    def test_later_binlog_file_is_a_higher_version(self):
+        assert event_version("mysql-bin.000004", 4) > event_version("mysql-bin.000003", 2**32 - 1)
+
+    def test_without_position_there_is_no_version(self, mocker: MockFixture):
+        log_warning = mocker.patch("src.infra.kafka.parser.logger.warning")
+        assert event_version(None, None) is None
+        log_warning.assert_called_once()
+
+    def test_updated_at_is_not_a_version(self):
+        data = b'{"id": 1, "updated_at": 1640995200000, "__op": "u"}'
+        assert parse_cdc_message(data, topic="catalog-db.codeflix.categories").version is None
+
+
+class TestParseCdcMessage:
+    def test_parse_envelope_with_schema(self):
+        data = b'{"schema": {"type": "struct"}, "payload": {"source": {"table": "categories"}, "op": "c", "after": {"id": 1, "name": "Category 1"}}}'
+        assert parse_cdc_message(data) == parse_debezium_message(data)
+
+    def test_parse_schemaless_envelope(self):
+        data = b'{"source": {"table": "categories"}, "op": "d", "before": {"id": 1, "name": "Category 1"}, "after": null}'
+        parsed_event = parse_cdc_message(data)
+        row = {"id": 1, "name": "Category 1"}
+        assert parsed_event == ParsedEvent(entity=Category, operation=Operation.DELETE, payload=row, before=row)
+
+    def test_parse_relation_table_envelope(self):
+        data = b'{"source": {"table": "videos_categories", "file": "mysql-bin.000002", "pos": 10}, "op": "c", "before": null, "after": {"id": 1, "video_id": "d5889ed5-3d3f-11ef-baf5-0242ac130006", "category_id": "142f2b4b-1b7b-4f3b-8eab-3f2f2b4b1b7b"}}'
+        parsed_event = parse_cdc_message(data)
+        assert parsed_event.entity is VideoCategory
+        assert parsed_event.operation == Operation.CREATE
+        assert parsed_event.version == (2 << 32) | 10
+
+    def test_parse_unwrapped_message_with_operation_header_and_table_from_topic(self):
+        data = b'{"id": 1, "name": "Category 1", "__deleted": "false"}'
+        parsed_event = parse_cdc_message(data, topic="catalog-db.codeflix.categories", headers=[("__op", b"u")])
+        row = {"id": 1, "name": "Category 1"}
+        assert parsed_event == ParsedEvent(entity=Category, operation=Operation.UPDATE, payload=row, after=row)
+        assert parsed_event.changed_fields is None
+
+    def test_parse_unwrapped_message_with_operation_and_table_fields(self):
+        data = b'{"id": 1, "name": "Category 1", "__op": "c", "__table": "categories"}'
+        parsed_event = parse_cdc_message(data, topic="anything")
+        row = {"id": 1, "name": "Category 1"}
+        assert parsed_event == ParsedEvent(entity=Category, operation=Operation.CREATE, payload=row, after=row)
+
+    def test_parse_rewritten_delete_of_unwrapped_message(self):
+        data = b'{"id": 1, "name": "Category 1", "__deleted": "true"}'
+        parsed_event = parse_cdc_message(data, topic="catalog-db.codeflix.categories", headers=[("__op", b"d")])
+        assert parsed_event.operation == Operation.DELETE
+        assert parsed_event.payload == {"id": 1, "name": "Category 1"}
+
+    def test_parse_binlog_position_of_unwrapped_message(self):
+        data = b'{"id": 1, "__op": "u", "__source_file": "mysql-bin.000002", "__source_pos": 10}'
+        parsed_event = parse_cdc_message(data, topic="catalog-db.codeflix.categories")
+        assert parsed_event.payload == {"id": 1}
+        assert parsed_event.version == (2 << 32) | 10
+
+    def test_parse_envelope_with_spaces_before_its_colons(self):
+        data = b'{"source" : {"table": "categories"}, "op" : "c", "after" : {"id": 1}}'
+        parsed_event = parse_cdc_message(data)
+        assert parsed_event.entity is Category
+        assert parsed_event.payload == {"id": 1}
+
+    def test_when_binlog_position_of_unwrapped_message_is_not_a_number_then_return_none(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        data = b'{"id": 1, "__op": "u", "__source_file": "mysql-bin.000002", "__source_pos": "10"}'
+        assert parse_cdc_message(data, topic="catalog-db.codeflix.categories") is None
+        log_error.assert_called_once()
+
+    def test_when_unwrapped_message_has_no_operation_then_treat_as_upsert(self):
+        data = b'{"id": 1, "name": "Category 1"}'
+        parsed_event = parse_cdc_message(data, topic="catalog-db.codeflix.categories")
+        assert parsed_event.operation == Operation.UPDATE
+
+    def test_parse_snapshot_marker_of_unwrapped_message(self):
+        data = b'{"id": 1, "name": "Category 1", "__deleted": "false"}'
+        headers = [("__op", b"r"), ("__source_snapshot", b"last")]
+        parsed_event = parse_cdc_message(data, topic="catalog-db.codeflix.categories", headers=headers)
+        assert parsed_event.operation == Operation.READ
+        assert parsed_event.is_last_snapshot_event
+
+    def test_parse_snapshot_marker_of_envelope(self):
+        data = b'{"op": "r", "source": {"table": "categories", "snapshot": "true"}, "after": {"id": 1}}'
+        parsed_event = parse_cdc_message(data)
+        assert parsed_event.snapshot == "true"
+        assert not parsed_event.is_last_snapshot_event
+
+    def test_when_unwrapped_message_has_no_topic_nor_table_then_return_none(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        assert parse_cdc_message(b'{"id": 1}') is None
+        log_error.assert_called_once()
+
+    def test_when_message_is_invalid_json_then_return_none_and_log_error(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        assert parse_cdc_message(b"not a json data") is None
+        log_error.assert_called_once()
+
+
+class TestParseTombstone:
+    def test_parse_schemaless_key(self):
+        parsed_event = parse_tombstone(b'{"id": 1}', topic="catalog-db.codeflix.categories")
+        assert parsed_event == ParsedEvent(entity=Category, operation=Operation.DELETE, payload={"id": 1}, tombstone=True)
+
+    def test_parse_key_with_schema(self):
+        parsed_event = parse_tombstone(b'{"schema": {"type": "struct"}, "payload": {"id": 1}}', topic="catalog-db.codeflix.videos")
+        assert parsed_event == ParsedEvent(entity=Video, operation=Operation.DELETE, payload={"id": 1}, tombstone=True)
+
+    def test_when_topic_is_unknown_then_return_none(self, mocker: MockFixture):
+        log_error = mocker.patch("src.infra.kafka.parser.logger.error")
+        assert parse_tombstone(b'{"id": 1}', topic="catalog-db.codeflix.unknown") is None
+        log_error.assert_called_once()
@@ -0,0 +1,63 @@
+from unittest.mock import create_autospec
+from uuid import uuid4
+
+import pytest
+
+from src.domain.genre import GenreCategory
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX, to_document
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.projection_event_handler import GenreCategoryEventHandler
+
+
+def genre_category_row(**fields) -> dict:
+    return {"id": 1, "genre_id": str(uuid4()), "category_id": str(uuid4()), **fields}
+
+
+@pytest.fixture
+def handler() -> GenreCategoryEventHandler:
+    return GenreCategoryEventHandler(
+        projector=create_autospec(BulkProjector),
+        bulk_load=create_autospec(BulkLoadSettings),
+    )
+
+
+class TestProjectionEventHandler:
+    def test_created_row_is_indexed_with_its_version(self, handler: GenreCategoryEventHandler) -> None:
+        row = genre_category_row()
+
+        handler(ParsedEvent(entity=GenreCategory, operation=Operation.CREATE, payload=row, version=10))
+
+        handler.projector.index_document.assert_called_once_with("1", row, version=10)
+
+    def test_deleted_row_is_deleted_with_its_version(self, handler: GenreCategoryEventHandler) -> None:
+        row = genre_category_row()
+
+        handler(ParsedEvent(entity=GenreCategory, operation=Operation.DELETE, payload=row, version=11))
+
+        handler.projector.delete_document.assert_called_once_with("1", version=11)
+
+    def test_flush_writes_the_buffered_documents(self, handler: GenreCategoryEventHandler) -> None:
+        handler.flush()
+
+        handler.projector.flush.assert_called_once()
+
+    def test_snapshot_is_loaded_with_bulk_load_settings(self, handler: GenreCategoryEventHandler) -> None:
+        rows = [genre_category_row(id=1), genre_category_row(id=2)]
+
+        handler(ParsedEvent(entity=GenreCategory, operation=Operation.READ, payload=rows[0], snapshot="first"))
+        handler(ParsedEvent(entity=GenreCategory, operation=Operation.READ, payload=rows[1], snapshot="last"))
+
+        assert [call.args[0] for call in handler.projector.index_document.call_args_list] == ["1", "2"]
+        handler.projector.flush.assert_called_once()
+        handler.bulk_load.apply.assert_called_once()
+        handler.bulk_load.restore.assert_called_once()
+
+
+class TestToDocument:
+    def test_only_mapped_columns_are_kept_and_booleans_cast(self) -> None:
+        row = {"id": "1", "name": "Drama", "description": "", "is_active": 1, "deleted_at": None}
+
+        assert to_document(CATEGORIES_INDEX, row) == {"id": "1", "name": "Drama", "description": "", "is_active": True}
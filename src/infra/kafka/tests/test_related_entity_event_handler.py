@@ -0,0 +1,66 @@
+from unittest.mock import create_autospec
+from uuid import uuid4
+
+import pytest
+
+from src.application.rename_video_relation import RenameVideoRelation, RenameVideoRelationInput
+from src.domain.category import Category
+from src.infra.elasticsearch.bulk_projector import BulkProjector
+from src.infra.elasticsearch.update_by_query_tasks import UpdateByQueryTasks
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.related_entity_event_handler import CategoryEventHandler
+
+
+def category_row(**fields) -> dict:
+    return {"id": str(uuid4()), "name": "Drama", "description": "Dramas", "is_active": True, **fields}
+
+
+@pytest.fixture
+def handler() -> CategoryEventHandler:
+    return CategoryEventHandler(
+        use_case=create_autospec(RenameVideoRelation),
+        tasks=create_autospec(UpdateByQueryTasks),
+        projector=create_autospec(BulkProjector),
+    )
+
+
+class TestRelatedEntityEventHandler:
+    def test_renamed_category_is_renamed_in_its_videos(self, handler: CategoryEventHandler) -> None:
+        before = category_row()
+        after = {**before, "name": "Dramas"}
+
+        handler(ParsedEvent(entity=Category, operation=Operation.UPDATE, payload=after, before=before, after=after, version=7))
+
+        handler.use_case.execute.assert_called_once_with(
+            RenameVideoRelationInput(field="categories", id=after["id"], name="Dramas", version=7)
+        )
+
+    def test_update_not_changing_the_name_is_only_indexed(self, handler: CategoryEventHandler) -> None:
+        before = category_row()
+        after = {**before, "description": "Other"}
+
+        handler(ParsedEvent(entity=Category, operation=Operation.UPDATE, payload=after, before=before, after=after, version=8))
+
+        handler.use_case.execute.assert_not_called()
+        handler.projector.index_document.assert_called_once_with(after["id"], after, version=8)
+
+    def test_update_of_an_unindexed_column_is_skipped(self, handler: CategoryEventHandler) -> None:
+        before = category_row()
+        after = {**before, "deleted_at": 1700000000000}
+
+        handler(ParsedEvent(entity=Category, operation=Operation.UPDATE, payload=after, before=before, after=after))
+
+        handler.projector.index_document.assert_not_called()
+
+    def test_snapshot_rows_are_indexed_but_not_cascaded(self, handler: CategoryEventHandler) -> None:
+        handler(ParsedEvent(entity=Category, operation=Operation.READ, payload=category_row(), snapshot="last"))
+
+        handler.use_case.execute.assert_not_called()
+        handler.projector.index_document.assert_called_once()
+
+    def test_flush_writes_the_documents_and_reports_progress_of_the_tasks(self, handler: CategoryEventHandler) -> None:
+        handler.flush()
+
+        handler.projector.flush.assert_called_once()
+        handler.tasks.poll.assert_called_once()
@@ -0,0 +1,126 @@
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, create_autospec
+
+import pytest
+from confluent_kafka import OFFSET_END, Consumer as KafkaConsumer, Message, TopicPartition
+
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.kafka.replay import ReplayOffsetManager, Replayer, start_offsets
+from src.infra.metrics.registry import MetricsRegistry
+
+TOPIC = "catalog-db.codeflix.videos"
+
+
+class FakeConsumer:
+    """Stands for a `Consumer` whose client moves one offset forward on each partition at every consume."""
+
+    def __init__(self, client: KafkaConsumer) -> None:
+        self.client = client
+        self.processed_count = 0
+        self.rejected_count = 0
+        self.stop = MagicMock()
+        self.offsets: dict[int, int] = {}
+
+    def consume(self) -> None:
+        for partition in self.offsets:
+            self.offsets[partition] += 1
+            self.processed_count += 1
+
+
+@pytest.fixture
+def client() -> KafkaConsumer:
+    return create_autospec(KafkaConsumer, instance=True)
+
+
+@pytest.fixture
+def consumer(client: KafkaConsumer) -> FakeConsumer:
+    consumer = FakeConsumer(client)
+    client.position.side_effect = lambda partitions: [
+        TopicPartition(tp.topic, tp.partition, consumer.offsets[tp.partition]) for tp in partitions
+    ]
+    client.assign.side_effect = lambda partitions: consumer.offsets.update({tp.partition: tp.offset for tp in partitions})
+    return consumer
+
+
+@pytest.fixture
+def replayer(consumer: FakeConsumer) -> Replayer:
+    return Replayer(consumer=consumer, bulk_load=create_autospec(BulkLoadSettings), metrics=MetricsRegistry())
+
+
+class TestReplayOffsetManager:
+    def test_offsets_are_never_committed(self, client: KafkaConsumer) -> None:
+        offset_manager = ReplayOffsetManager(client=client, commit_every=1)
+        message = create_autospec(Message, instance=True)
+        message.topic.return_value, message.partition.return_value, message.offset.return_value = TOPIC, 0, 41
+
+        offset_manager.track(message)
+        offset_manager.maybe_commit()
+        offset_manager.commit(asynchronous=False)
+
+        client.commit.assert_not_called()
+        assert offset_manager.pending == {}
+        assert not offset_manager.should_commit()
+
+
+class TestStartOffsets:
+    def test_every_partition_starts_from_the_given_offset(self, client: KafkaConsumer) -> None:
+        client.list_topics.return_value.topics = {TOPIC: MagicMock(partitions={0: None, 1: None})}
+
+        assert start_offsets(client, [TOPIC], offset=10) == [TopicPartition(TOPIC, 0, 10), TopicPartition(TOPIC, 1, 10)]
+
+    def test_partitions_start_from_the_first_message_at_the_timestamp(self, client: KafkaConsumer) -> None:
+        client.list_topics.return_value.topics = {TOPIC: MagicMock(partitions={0: None, 1: None})}
+        client.offsets_for_times.return_value = [TopicPartition(TOPIC, 0, 120), TopicPartition(TOPIC, 1, -1)]
+
+        offsets = start_offsets(client, [TOPIC], timestamp=datetime(2024, 1, 1, tzinfo=UTC))
+
+        assert [tp.offset for tp in client.offsets_for_times.call_args.args[0]] == [1704067200000] * 2
+        assert offsets == [TopicPartition(TOPIC, 0, 120), TopicPartition(TOPIC, 1, OFFSET_END)]
+
+
+class TestReplayer:
+    def test_partitions_are_replayed_up_to_their_end_when_the_replay_started(
+        self,
+        replayer: Replayer,
+        consumer: FakeConsumer,
+        client: KafkaConsumer,
+    ) -> None:
+        client.get_watermark_offsets.return_value = (0, 5)
+
+        report = replayer.run([TopicPartition(TOPIC, 0, 2), TopicPartition(TOPIC, 1, 4)])
+
+        client.assign.assert_called_once_with([TopicPartition(TOPIC, 0, 2), TopicPartition(TOPIC, 1, 4)])
+        assert [progress.position for progress in report.partitions.values()] == [5, 5]
+        assert [progress.ratio for progress in report.partitions.values()] == [1.0, 1.0]
+        consumer.stop.assert_called_once()
+
+    def test_finished_partitions_are_paused(self, replayer: Replayer, client: KafkaConsumer) -> None:
+        client.get_watermark_offsets.side_effect = [(0, 1), (0, 3)]
+
+        replayer.run([TopicPartition(TOPIC, 0, 0), TopicPartition(TOPIC, 1, 0)])
+
+        assert client.pause.call_args_list[0].args[0] == [TopicPartition(TOPIC, 0)]
+
+    def test_out_of_range_offsets_are_clamped_to_the_partition(self, replayer: Replayer, client: KafkaConsumer) -> None:
+        client.get_watermark_offsets.side_effect = [(10, 20), (10, 20), (10, 20)]
+
+        replayer.run([TopicPartition(TOPIC, 0, 0), TopicPartition(TOPIC, 1, 50), TopicPartition(TOPIC, 2, OFFSET_END)])
+
+        assert [tp.offset for tp in client.assign.call_args.args[0]] == [10, 20, 20]
+
+    def test_target_index_is_in_bulk_load_mode_during_the_replay(self, replayer: Replayer, client: KafkaConsumer) -> None:
+        client.get_watermark_offsets.return_value = (0, 1)
+
+        replayer.run([TopicPartition(TOPIC, 0, 0)])
+
+        replayer.bulk_load.apply.assert_called_once()
+        replayer.bulk_load.restore.assert_called_once()
+
+    def test_throughput_and_remaining_messages_are_reported(self, replayer: Replayer, client: KafkaConsumer) -> None:
+        client.get_watermark_offsets.return_value = (0, 4)
+
+        report = replayer.run([TopicPartition(TOPIC, 0, 0)])
+
+        assert report.events == 4
+        assert replayer.metrics.gauge("replay_remaining_messages", topic=TOPIC, partition="0") == 0
+        assert replayer.metrics.gauge("replay_events_per_second") == report.events_per_second
@@ -0,0 +1,58 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.infra.kafka.retry import RetryPolicy, is_transient
+
+
+@pytest.fixture
+def sleep() -> MagicMock:
+    return MagicMock()
+
+
+class TestIsTransient:
+    @pytest.mark.parametrize("error", [ConnectionError("refused"), TimeoutError("timed out")])
+    def test_network_errors_are_transient(self, error: Exception) -> None:
+        assert is_transient(error) is True
+
+    @pytest.mark.parametrize("error", [KeyError("id"), ValueError("invalid rating")])
+    def test_data_errors_are_not_transient(self, error: Exception) -> None:
+        assert is_transient(error) is False
+
+
+class TestRun:
+    def test_when_call_succeeds_then_return_its_result(self, sleep: MagicMock) -> None:
+        policy = RetryPolicy(sleep=sleep)
+
+        assert policy.run(lambda: "ok") == "ok"
+        sleep.assert_not_called()
+
+    def test_when_error_is_transient_then_retry_until_success(self, sleep: MagicMock) -> None:
+        fn = MagicMock(side_effect=[ConnectionError("refused"), ConnectionError("refused"), "ok"])
+        policy = RetryPolicy(max_attempts=3, sleep=sleep)
+
+        assert policy.run(fn) == "ok"
+        assert fn.call_count == 3
+        assert sleep.call_count == 2
+
+    def test_when_attempts_are_exhausted_then_raise_last_error(self, sleep: MagicMock) -> None:
+        fn = MagicMock(side_effect=ConnectionError("refused"))
+        policy = RetryPolicy(max_attempts=2, sleep=sleep)
+
+        with pytest.raises(ConnectionError):
+            policy.run(fn)
+        assert fn.call_count == 2
+
+    def test_when_error_is_not_transient_then_do_not_retry(self, sleep: MagicMock) -> None:
+        fn = MagicMock(side_effect=KeyError("id"))
+        policy = RetryPolicy(max_attempts=3, sleep=sleep)
+
+        with pytest.raises(KeyError):
+            policy.run(fn)
+        assert fn.call_count == 1
+        sleep.assert_not_called()
+
+    def test_backoff_is_bounded_by_max_backoff(self) -> None:
+        policy = RetryPolicy(initial_backoff=1.0, max_backoff=2.0)
+
+        assert all(0 <= policy.backoff(attempt) <= 2.0 for attempt in range(1, 10))
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+from src.domain.category import Category
+from src.domain.video import Video
+from src.domain.video_relation import VideoCategory, VideoGenre
+from src.infra.kafka.router import TopicRouter
+from src.infra.kafka.state_store import StateStore
+
+
+class TestTopicRouter:
+    def test_subscribe_to_topic_of_each_routed_entity(self) -> None:
+        router = TopicRouter({Category: MagicMock(), Video: MagicMock()}, topic_prefix="catalog-db.codeflix")
+
+        assert router.topics == ["catalog-db.codeflix.categories", "catalog-db.codeflix.videos"]
+
+    def test_resolve_handler_from_topic(self) -> None:
+        video_handler = MagicMock()
+        router = TopicRouter({Video: video_handler}, topic_prefix="catalog-db.codeflix")
+
+        assert router.resolve("catalog-db.codeflix.videos") is video_handler.return_value
+
+    def test_when_topic_is_not_routed_then_return_none(self) -> None:
+        router = TopicRouter({Video: MagicMock()}, topic_prefix="catalog-db.codeflix")
+
+        assert router.resolve("catalog-db.codeflix.categories") is None
+
+    def test_instantiate_each_handler_once(self) -> None:
+        video_handler = MagicMock()
+        router = TopicRouter({Video: video_handler}, topic_prefix="catalog-db.codeflix")
+
+        router.resolve("catalog-db.codeflix.videos")
+        router.resolve("catalog-db.codeflix.videos")
+
+        video_handler.assert_called_once_with()
+        assert router.handlers == [video_handler.return_value]
+
+    def test_entities_sharing_a_handler_class_share_its_instance(self) -> None:
+        relation_handler = MagicMock()
+        router = TopicRouter({VideoCategory: relation_handler, VideoGenre: relation_handler}, topic_prefix="catalog-db.codeflix")
+
+        assert router.topics == ["catalog-db.codeflix.videos_categories", "catalog-db.codeflix.videos_genres"]
+        assert router.resolve("catalog-db.codeflix.videos_categories") is router.resolve("catalog-db.codeflix.videos_genres")
+        relation_handler.assert_called_once_with()
+
+    def test_handlers_get_the_state_store(self) -> None:
+        state_store = StateStore()
+        router = TopicRouter({Video: MagicMock()}, topic_prefix="catalog-db.codeflix", state_store=state_store)
+
+        assert router.resolve("catalog-db.codeflix.videos").state_store is state_store
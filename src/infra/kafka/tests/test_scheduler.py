@@ -0,0 +1,81 @@
+from unittest.mock import create_autospec
+
+import pytest
+from confluent_kafka import Message, TopicPartition
+
+from src.infra.kafka.scheduler import PriorityScheduler
+from src.infra.metrics.registry import MetricsRegistry
+
+VIDEOS = "catalog-db.codeflix.videos"
+CATEGORIES = "catalog-db.codeflix.categories"
+
+
+def make_message(topic: str, offset: int = 0, partition: int = 0, error: str | None = None) -> Message:
+    message = create_autospec(Message, instance=True)
+    message.error.return_value = error
+    message.topic.return_value = topic
+    message.partition.return_value = partition
+    message.offset.return_value = offset
+    return message
+
+
+def drain(scheduler: PriorityScheduler) -> list[tuple[str, int]]:
+    served = []
+    while (message := scheduler.next()) is not None:
+        served.append((message.topic(), message.offset()))
+    return served
+
+
+@pytest.fixture
+def scheduler() -> PriorityScheduler:
+    return PriorityScheduler(weights={VIDEOS: 3}, default_weight=1, max_buffered=4, metrics=MetricsRegistry())
+
+
+class TestPriorityScheduler:
+    def test_topics_are_served_in_proportion_to_their_weight(self, scheduler: PriorityScheduler) -> None:
+        scheduler.add([make_message(CATEGORIES, offset) for offset in range(3)])
+        scheduler.add([make_message(VIDEOS, offset) for offset in range(3)])
+
+        topics = [topic for topic, _ in drain(scheduler)]
+
+        assert topics[:4].count(VIDEOS) == 3
+        assert topics == [VIDEOS, CATEGORIES, VIDEOS, VIDEOS, CATEGORIES, CATEGORIES]
+
+    def test_low_priority_topics_use_the_leftover_capacity(self, scheduler: PriorityScheduler) -> None:
+        scheduler.add([make_message(CATEGORIES, offset) for offset in range(3)])
+
+        assert drain(scheduler) == [(CATEGORIES, 0), (CATEGORIES, 1), (CATEGORIES, 2)]
+
+    def test_messages_of_a_partition_keep_their_order(self, scheduler: PriorityScheduler) -> None:
+        scheduler.add([make_message(VIDEOS, 0), make_message(CATEGORIES, 0)])
+        scheduler.add([make_message(VIDEOS, 1), make_message(CATEGORIES, 1)])
+
+        served = drain(scheduler)
+
+        assert [offset for topic, offset in served if topic == CATEGORIES] == [0, 1]
+        assert [offset for topic, offset in served if topic == VIDEOS] == [0, 1]
+
+    def test_errors_are_served_first(self, scheduler: PriorityScheduler) -> None:
+        error = make_message(VIDEOS, error="broker down")
+        scheduler.add([make_message(VIDEOS, 0), error])
+
+        assert scheduler.next() is error
+
+    def test_topic_is_full_until_half_drained(self, scheduler: PriorityScheduler) -> None:
+        scheduler.add([make_message(CATEGORIES, offset) for offset in range(4)])
+        assert scheduler.full_topics == {CATEGORIES}
+
+        scheduler.next()
+        assert scheduler.full_topics == {CATEGORIES}
+        scheduler.next()
+
+        assert scheduler.full_topics == frozenset()
+        assert scheduler.metrics.gauge("consumer_scheduled_messages", topic=CATEGORIES) == 2
+
+    def test_dropped_partitions_are_forgotten(self, scheduler: PriorityScheduler) -> None:
+        scheduler.add([make_message(VIDEOS, 0, partition=0), make_message(VIDEOS, 0, partition=1)])
+
+        scheduler.drop([TopicPartition(VIDEOS, 1)])
+
+        assert scheduler.pending == 1
+        assert scheduler.next().partition() == 0
@@ -0,0 +1,193 @@
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, create_autospec
+from uuid import uuid4
+
+import pytest
+from confluent_kafka import OFFSET_INVALID, Consumer as KafkaConsumer, Message, TopicPartition
+
+from src.infra.elasticsearch.mappings import CATEGORIES_INDEX
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.state_store import StateStore, StateStoreUpdater
+from src.infra.metrics.registry import MetricsRegistry
+
+TOPIC = "catalog-db.codeflix.genre_categories"
+
+
+def cdc_message(offset: int, key: int | str, row: dict | None, op: str = "c", table: str = "genre_categories") -> Message:
+    message = create_autospec(Message)
+    message.error.return_value = None
+    message.topic.return_value = f"catalog-db.codeflix.{table}"
+    message.partition.return_value = 0
+    message.offset.return_value = offset
+    message.headers.return_value = None
+    message.key.return_value = json.dumps({"id": key}).encode()
+    if row is None:
+        message.value.return_value = None
+    else:
+        before, after = (row, None) if op == "d" else (None, row)
+        envelope = {"source": {"table": table}, "op": op, "before": before, "after": after}
+        message.value.return_value = json.dumps(envelope).encode()
+    return message
+
+
+@pytest.fixture
+def store() -> StateStore:
+    return StateStore(indexes={"genre_categories": ("genre_id",)})
+
+
+@pytest.fixture
+def client() -> KafkaConsumer:
+    client = create_autospec(KafkaConsumer)
+    client.list_topics.return_value.topics = {TOPIC: MagicMock(partitions={0: MagicMock()})}
+    return client
+
+
+class TestStateStore:
+    def test_get_latest_row_of_key(self, store: StateStore) -> None:
+        store.put("genre_categories", "1", {"id": 1, "genre_id": "g1", "category_id": "c1"})
+        store.put("genre_categories", "1", {"id": 1, "genre_id": "g1", "category_id": "c2"})
+
+        assert store.get("genre_categories", "1") == {"id": 1, "genre_id": "g1", "category_id": "c2"}
+        assert store.get("genre_categories", "2") is None
+
+    def test_lookup_rows_by_indexed_column(self, store: StateStore) -> None:
+        store.put("genre_categories", "1", {"id": 1, "genre_id": "g1", "category_id": "c1"})
+        store.put("genre_categories", "2", {"id": 2, "genre_id": "g1", "category_id": "c2"})
+        store.put("genre_categories", "3", {"id": 3, "genre_id": "g2", "category_id": "c1"})
+        # Moved to another genre: no longer found by the previous one
+        store.put("genre_categories", "2", {"id": 2, "genre_id": "g2", "category_id": "c2"})
+        store.delete("genre_categories", "3")
+
+        assert [row["id"] for row in store.lookup("genre_categories", "genre_id", "g1")] == [1]
+        assert [row["id"] for row in store.lookup("genre_categories", "genre_id", "g2")] == [2]
+
+    def test_when_column_is_not_indexed_then_raise(self, store: StateStore) -> None:
+        with pytest.raises(ValueError):
+            store.lookup("genre_categories", "category_id", "c1")
+
+    def test_only_checkpointed_writes_survive_a_restart(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "state.db")
+        store = StateStore(path=path)
+        store.put("categories", "1", {"id": 1})
+        store.advance(TOPIC, 0, 10)
+        store.checkpoint()
+        store.put("categories", "2", {"id": 2})
+        store.advance(TOPIC, 0, 11)
+
+        reopened = StateStore(path=path)
+
+        assert reopened.get("categories", "1") == {"id": 1}
+        assert reopened.get("categories", "2") is None
+        assert reopened.positions == {(TOPIC, 0): 10}
+
+
+class TestStateStoreUpdater:
+    def test_restore_from_checkpointed_position_to_end_of_partitions(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+    ) -> None:
+        store.advance(TOPIC, 0, 5)
+        client.get_watermark_offsets.return_value = (0, 7)
+        client.poll.side_effect = [
+            cdc_message(5, key=1, row={"id": 1, "genre_id": "g1", "category_id": "c1"}),
+            cdc_message(6, key=2, row={"id": 2, "genre_id": "g1", "category_id": "c2"}),
+        ]
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], metrics=MetricsRegistry())
+
+        assert updater.restore() == 2
+
+        client.assign.assert_called_once_with([TopicPartition(TOPIC, 0, 5)])
+        assert len(store.lookup("genre_categories", "genre_id", "g1")) == 2
+        assert store.positions == {(TOPIC, 0): 7}
+
+    def test_restore_ends_when_position_reached_end_despite_compaction_gaps(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+    ) -> None:
+        client.get_watermark_offsets.return_value = (0, 10)
+        client.poll.side_effect = [cdc_message(3, key=1, row={"id": 1, "genre_id": "g1"}), None]
+        client.position.return_value = [TopicPartition(TOPIC, 0, 10)]
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], metrics=MetricsRegistry())
+
+        assert updater.restore() == 1
+
+    @pytest.mark.parametrize("saved_offset, watermarks", [(None, (0, 0)), (None, (12, 12)), (12, (0, 12))])
+    def test_restore_skips_partitions_with_nothing_to_restore(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+        saved_offset: int | None,
+        watermarks: tuple[int, int],
+    ) -> None:
+        if saved_offset is not None:
+            store.advance(TOPIC, 0, saved_offset)
+        client.get_watermark_offsets.return_value = watermarks
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], metrics=MetricsRegistry())
+
+        assert updater.restore() == 0
+
+        client.poll.assert_not_called()
+
+    def test_restore_waits_for_a_partition_nothing_was_fetched_from_yet(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+    ) -> None:
+        client.get_watermark_offsets.return_value = (0, 10)
+        client.poll.side_effect = [None, cdc_message(9, key=1, row={"id": 1, "genre_id": "g1"})]
+        client.position.return_value = [TopicPartition(TOPIC, 0, OFFSET_INVALID)]
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], metrics=MetricsRegistry())
+
+        assert updater.restore() == 1
+
+    def test_referenced_ids_are_loaded_from_the_store_then_kept_current(
+        self,
+        store: StateStore,
+        client: KafkaConsumer,
+    ) -> None:
+        topic = "catalog-db.codeflix.categories"
+        kept, deleted, created = (str(uuid4()) for _ in range(3))
+        store.put("categories", kept, {"id": kept})
+        store.put("categories", deleted, {"id": deleted})
+        store.advance(topic, 0, 2)
+        client.list_topics.return_value.topics = {topic: MagicMock(partitions={0: MagicMock()})}
+        client.get_watermark_offsets.return_value = (0, 4)
+        client.poll.side_effect = [
+            cdc_message(2, key=created, row={"id": created}, table="categories"),
+            cdc_message(3, key=deleted, row=None, table="categories"),
+        ]
+        references = IdIndex(tables={"categories": CATEGORIES_INDEX}, metrics=MetricsRegistry())
+        updater = StateStoreUpdater(
+            store=store,
+            client=client,
+            topics=[topic],
+            metrics=MetricsRegistry(),
+            references=references,
+        )
+
+        updater.restore()
+
+        assert references.contains("categories", kept)
+        assert references.contains("categories", created)
+        assert not references.contains("categories", deleted)
+
+    def test_poll_applies_deletes_and_tombstones(self, store: StateStore, client: KafkaConsumer) -> None:
+        row = {"id": 1, "genre_id": "g1", "category_id": "c1"}
+        store.put("genre_categories", "1", row)
+        store.put("genre_categories", "2", {**row, "id": 2})
+        client.poll.side_effect = [cdc_message(0, key=1, row=row, op="d"), cdc_message(1, key=2, row=None), None]
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], metrics=MetricsRegistry())
+
+        assert updater.poll() == 2
+
+        assert store.lookup("genre_categories", "genre_id", "g1") == []
+        client.poll.assert_called_with(timeout=0)
+
+    def test_poll_applies_at_most_max_poll_messages(self, store: StateStore, client: KafkaConsumer) -> None:
+        client.poll.side_effect = [cdc_message(offset, key=offset, row={"id": offset}) for offset in range(3)]
+        updater = StateStoreUpdater(store=store, client=client, topics=[TOPIC], max_poll_messages=2)
+
+        assert updater.poll() == 2
@@ -0,0 +1,116 @@
+import multiprocessing
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockFixture
+
+from src.infra.kafka.supervisor import Supervisor, resolve_worker_count
+
+
+def crashing_worker(worker_id: int, status_queue: multiprocessing.Queue) -> None:
+    raise SystemExit(1)
+
+
+def idle_worker(worker_id: int, status_queue: multiprocessing.Queue) -> None:
+    while True:
+        time.sleep(0.1)
+
+
+def reporting_worker(worker_id: int, status_queue: multiprocessing.Queue) -> None:
+    import os
+
+    status_queue.put({"worker_id": worker_id, "pid": os.getpid(), "processed": 10 * (worker_id + 1), "rejected": 1,
+                      "last_poll_at": time.time()})
+    while True:
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def context() -> multiprocessing.context.BaseContext:
+    return multiprocessing.get_context("fork")
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+class TestResolveWorkerCount:
+    def test_one_worker_per_partition_bounded_by_max_workers(self, mocker: MockFixture) -> None:
+        admin_client = mocker.patch("src.infra.kafka.supervisor.AdminClient")
+        metadata = admin_client.return_value.list_topics.return_value
+        metadata.topics = {"catalog-db.codeflix.videos": MagicMock(partitions={0: None, 1: None, 2: None})}
+
+        assert resolve_worker_count("kafka:19092", ["catalog-db.codeflix.videos"], max_workers=8) == 3
+        assert resolve_worker_count("kafka:19092", ["catalog-db.codeflix.videos"], max_workers=2) == 2
+
+    def test_at_least_one_worker(self, mocker: MockFixture) -> None:
+        admin_client = mocker.patch("src.infra.kafka.supervisor.AdminClient")
+        admin_client.return_value.list_topics.return_value.topics = {}
+
+        assert resolve_worker_count("kafka:19092", ["catalog-db.codeflix.videos"], max_workers=8) == 1
+
+
+class TestSupervise:
+    def test_restart_crashed_workers(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=1, target=crashing_worker, context=context)
+        supervisor._spawn(0)
+        supervisor._workers[0].join(timeout=5)
+
+        supervisor.supervise()
+
+        assert supervisor.restarts == 1
+        supervisor.stop()
+
+    def test_worker_still_starting_is_not_stuck(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=1, target=idle_worker, context=context, heartbeat_timeout=0.0)
+        supervisor._spawn(0)
+
+        supervisor.supervise()
+
+        assert supervisor.restarts == 0
+        supervisor.stop()
+
+    def test_restart_workers_that_never_get_ready(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=1, target=idle_worker, context=context, startup_timeout=0.0)
+        supervisor._spawn(0)
+
+        supervisor.supervise()
+
+        assert supervisor.restarts == 1
+        supervisor.stop()
+
+    def test_restart_workers_that_stopped_polling_once_ready(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=1, target=idle_worker, context=context, heartbeat_timeout=10.0)
+        supervisor._spawn(0)
+        supervisor._status[0] = {"worker_id": 0, "ready_at": time.time() - 60, "last_poll_at": None}
+
+        supervisor.supervise()
+
+        assert supervisor.restarts == 1
+        supervisor.stop()
+
+    def test_stop_terminates_workers(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=2, target=idle_worker, context=context, shutdown_timeout=5)
+        supervisor._spawn(0)
+        supervisor._spawn(1)
+
+        supervisor.stop()
+
+        assert all(not process.is_alive() for process in supervisor._workers.values())
+
+    def test_health_aggregates_worker_reports(self, context: multiprocessing.context.BaseContext) -> None:
+        supervisor = Supervisor(worker_count=2, target=reporting_worker, context=context)
+        supervisor._spawn(0)
+        supervisor._spawn(1)
+
+        wait_until(lambda: len(supervisor.health()["by_worker"]) == 2)
+        health = supervisor.health()
+        supervisor.stop()
+
+        assert health["status"] == "ok"
+        assert health["alive"] == 2
+        assert health["processed"] == 30
+        assert health["rejected"] == 2
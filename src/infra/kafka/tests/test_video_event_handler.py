@@ -0,0 +1,202 @@
+from unittest.mock import MagicMock, create_autospec
+from uuid import uuid4
+
+import pytest
+from elasticsearch import Elasticsearch, NotFoundError
+
+from src.application.delete_video import DeleteVideo
+from src.application.save_video import SaveVideo
+from src.domain.video import Video
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+from src.infra.elasticsearch.mappings import MAPPINGS, VIDEOS_INDEX
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.video_event_handler import VideoEventHandler
+
+
+def video_row(**fields) -> dict:
+    return {
+        "id": str(uuid4()),
+        "title": "The Godfather",
+        "launch_year": 1972,
+        "rating": "AGE_18",
+        "description": "A mafia family",
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+        "is_active": True,
+        **fields,
+    }
+
+
+def video_event(operation: Operation, snapshot: str | None = None) -> ParsedEvent:
+    return ParsedEvent(entity=Video, operation=operation, payload=video_row(), snapshot=snapshot)
+
+
+@pytest.fixture
+def handler() -> VideoEventHandler:
+    return VideoEventHandler(
+        save_use_case=create_autospec(SaveVideo),
+        delete_use_case=create_autospec(DeleteVideo),
+        bulk_load=create_autospec(BulkLoadSettings),
+    )
+
+
+class TestVideoEventHandlerSnapshot:
+    def test_snapshot_is_loaded_in_bulk_with_bulk_load_settings(self, handler: VideoEventHandler) -> None:
+        events = [video_event(Operation.READ, snapshot="first"), video_event(Operation.READ, snapshot="last")]
+        for event in events:
+            handler(event)
+
+        handler.bulk_load.apply.assert_called_once()
+        inputs = handler.save_use_case.execute_many.call_args.kwargs["inputs"]
+        assert [str(input.id) for input in inputs] == [event.payload["id"] for event in events]
+        handler.save_use_case.execute.assert_not_called()
+        handler.bulk_load.restore.assert_called_once()
+
+    def test_streaming_events_do_not_use_bulk_load_settings(self, handler: VideoEventHandler) -> None:
+        handler(video_event(Operation.UPDATE))
+        handler.flush()
+
+        handler.save_use_case.execute_many.assert_called_once()
+        handler.bulk_load.apply.assert_not_called()
+
+    def test_on_a_fresh_install_the_index_is_created_before_bulk_load_settings(self) -> None:
+        client = MagicMock(spec=Elasticsearch)
+        client.indices = MagicMock()
+        client.indices.exists.return_value = False
+
+        def get_settings(index: str, **kwargs) -> dict:
+            if not client.indices.create.called:
+                raise NotFoundError(message="no such index", meta=MagicMock(status=404), body={})
+            return {f"{index}_v1": {"settings": {}}}
+
+        client.indices.get_settings.side_effect = get_settings
+        client.indices.get_mapping.return_value = {f"{VIDEOS_INDEX}_v1": {"mappings": {}}}
+        repository = ElasticsearchVideoRepository(client=client)
+        handler = VideoEventHandler(
+            save_use_case=create_autospec(SaveVideo),
+            delete_use_case=create_autospec(DeleteVideo),
+            bulk_load=BulkLoadSettings(client=client, index=repository.index, alias=repository.INDEX),
+        )
+
+        handler(video_event(Operation.READ, snapshot="first"))
+
+        assert client.indices.create.call_args.kwargs["mappings"] == MAPPINGS[VIDEOS_INDEX]
+        client.indices.put_settings.assert_called_once()
+
+
+class TestVideoEventHandlerBuffering:
+    def test_events_are_written_on_flush(self, handler: VideoEventHandler) -> None:
+        handler(video_event(Operation.CREATE))
+
+        handler.save_use_case.execute_many.assert_not_called()
+        handler.flush()
+        handler.save_use_case.execute_many.assert_called_once()
+
+    def test_events_are_written_once_the_batch_is_full(self, handler: VideoEventHandler) -> None:
+        handler.batch_size = 2
+        handler(video_event(Operation.CREATE))
+        handler(video_event(Operation.CREATE))
+
+        assert len(handler.save_use_case.execute_many.call_args.kwargs["inputs"]) == 2
+
+    def test_only_changed_projected_fields_are_updated(self, handler: VideoEventHandler) -> None:
+        before = video_row()
+        after = {**before, "title": "The Godfather Part II", "description": "Ignored", "updated_at": "2024-02-01T00:00:00"}
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=after, before=before, after=after))
+        handler.flush()
+
+        [(input, fields)] = handler.save_use_case.execute_partial_many.call_args.kwargs["updates"]
+        assert input.title == "The Godfather Part II"
+        assert fields == {"title"}
+        handler.save_use_case.execute_many.assert_not_called()
+
+    def test_update_of_unprojected_fields_is_skipped(self, handler: VideoEventHandler) -> None:
+        before = video_row()
+        after = {**before, "description": "Another description", "updated_at": "2024-02-01T00:00:00"}
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=after, before=before, after=after))
+        handler.flush()
+
+        handler.save_use_case.execute_partial_many.assert_not_called()
+        handler.save_use_case.execute_many.assert_not_called()
+
+    def test_changes_of_the_same_video_are_coalesced(self, handler: VideoEventHandler) -> None:
+        first = video_row()
+        second = {**first, "title": "The Godfather Part II"}
+        third = {**second, "rating": "AGE_16"}
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=second, before=first, after=second))
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=third, before=second, after=third))
+        handler.flush()
+
+        [(input, fields)] = handler.save_use_case.execute_partial_many.call_args.kwargs["updates"]
+        assert (input.title, input.rating) == ("The Godfather Part II", "AGE_16")
+        assert fields == {"title", "rating"}
+
+    def test_update_of_a_pending_creation_saves_the_whole_video(self, handler: VideoEventHandler) -> None:
+        created = video_row()
+        updated = {**created, "title": "The Godfather Part II"}
+        handler(ParsedEvent(entity=Video, operation=Operation.CREATE, payload=created, after=created))
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=updated, before=created, after=updated))
+        handler.flush()
+
+        [input] = handler.save_use_case.execute_many.call_args.kwargs["inputs"]
+        assert input.title == "The Godfather Part II"
+        handler.save_use_case.execute_partial_many.assert_not_called()
+
+    def test_when_write_fails_then_events_are_kept_for_the_next_flush(self, handler: VideoEventHandler) -> None:
+        handler.save_use_case.execute_many.side_effect = [ConnectionError, None]
+        handler(video_event(Operation.CREATE))
+
+        with pytest.raises(ConnectionError):
+            handler.flush()
+        handler.flush()
+
+        assert handler.save_use_case.execute_many.call_count == 2
+
+    def test_failed_buffer_is_written_again_in_chunks_of_the_write_batch_size(
+        self,
+        handler: VideoEventHandler,
+    ) -> None:
+        handler.save_use_case.execute_many.side_effect = [ConnectionError, None, None, None]
+        for _ in range(3):
+            handler(video_event(Operation.CREATE))
+        with pytest.raises(ConnectionError):
+            handler.flush()
+
+        handler.write_batch_size = 2
+        handler.flush()
+
+        assert [len(call.kwargs["inputs"]) for call in handler.save_use_case.execute_many.call_args_list] == [3, 2, 1]
+
+
+class TestVideoEventHandlerDelete:
+    def test_deletes_are_written_in_batch(self, handler: VideoEventHandler) -> None:
+        events = [video_event(Operation.DELETE), video_event(Operation.DELETE)]
+        for event in events:
+            handler(event)
+        handler.flush()
+
+        inputs = handler.delete_use_case.execute_many.call_args.kwargs["inputs"]
+        assert [str(input.id) for input in inputs] == [event.payload["id"] for event in events]
+
+    def test_delete_replaces_a_pending_save(self, handler: VideoEventHandler) -> None:
+        row = video_row()
+        handler(ParsedEvent(entity=Video, operation=Operation.CREATE, payload=row, after=row))
+        handler(ParsedEvent(entity=Video, operation=Operation.DELETE, payload=row, before=row))
+        # Tombstone following the delete event: only the key is known
+        handler(ParsedEvent(entity=Video, operation=Operation.DELETE, payload={"id": row["id"]}))
+        handler.flush()
+
+        assert len(handler.delete_use_case.execute_many.call_args.kwargs["inputs"]) == 1
+        handler.save_use_case.execute_many.assert_not_called()
+
+    def test_update_after_a_pending_delete_saves_the_whole_video(self, handler: VideoEventHandler) -> None:
+        row = video_row()
+        updated = {**row, "title": "The Godfather Part II"}
+        handler(ParsedEvent(entity=Video, operation=Operation.DELETE, payload=row, before=row))
+        handler(ParsedEvent(entity=Video, operation=Operation.UPDATE, payload=updated, before=row, after=updated))
+        handler.flush()
+
+        handler.delete_use_case.execute_many.assert_not_called()
+        handler.save_use_case.execute_many.assert_called_once()
@@ -0,0 +1,189 @@
+from unittest.mock import create_autospec
+from uuid import UUID, uuid4
+
+import pytest
+from pytest_mock import MockFixture
+
+from src.application.update_video_relations import UpdateVideoRelations
+from src.domain.video_relation import VideoBanner, VideoCategory, VideoRelationChange
+from src.infra.codeflix_client.codeflix_client import CodeflixClient
+from src.infra.codeflix_client.dtos import VideoResponse
+from src.infra.codeflix_client.errors import CircuitOpenError
+from src.infra.kafka.id_index import IdIndex
+from src.infra.kafka.operation import Operation
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.kafka.state_store import StateStore
+from src.infra.kafka.video_relation_event_handler import VideoRelationEventHandler
+from src.infra.metrics.registry import MetricsRegistry
+
+
+def category_row(**fields) -> dict:
+    return {"id": 1, "video_id": str(uuid4()), "category_id": str(uuid4()), **fields}
+
+
+def banner_row(**fields) -> dict:
+    return {"id": 1, "video_id": str(uuid4()), "name": "Banner", "raw_location": "https://banner.com/1", **fields}
+
+
+def video_response(id: str, categories: list[dict]) -> VideoResponse:
+    return VideoResponse(
+        id=id,
+        title="The Godfather",
+        launch_year=1972,
+        rating="AGE_18",
+        is_active=True,
+        categories=categories,
+        cast_members=[],
+        genres=[],
+        banner={"name": "The Godfather", "raw_location": "https://banner.com/the-godfather"},
+    )
+
+
+@pytest.fixture
+def handler() -> VideoRelationEventHandler:
+    return VideoRelationEventHandler(use_case=create_autospec(UpdateVideoRelations))
+
+
+def applied_changes(handler: VideoRelationEventHandler) -> list[VideoRelationChange]:
+    handler.flush()
+    return handler.use_case.execute_many.call_args.kwargs["changes"]
+
+
+class TestVideoRelationEventHandler:
+    def test_created_row_links_its_value(self, handler: VideoRelationEventHandler) -> None:
+        row = category_row()
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=row, version=10))
+
+        assert applied_changes(handler) == [
+            VideoRelationChange(
+                video_id=row["video_id"],
+                field="categories",
+                value=row["category_id"],
+                linked=True,
+                version=10,
+            ),
+        ]
+
+    def test_linked_value_is_named_from_the_state_store(self, handler: VideoRelationEventHandler) -> None:
+        row = category_row()
+        handler.state_store = StateStore()
+        handler.state_store.put("categories", row["category_id"], {"id": row["category_id"], "name": "Drama"})
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=row))
+
+        assert applied_changes(handler)[0].name == "Drama"
+
+    def test_name_missing_from_the_state_store_is_fetched_from_the_admin_api(
+        self,
+        handler: VideoRelationEventHandler,
+    ) -> None:
+        row, other = category_row(), category_row()
+        handler.codeflix_client = create_autospec(CodeflixClient)
+        handler.codeflix_client.get_videos.return_value = {
+            UUID(row["video_id"]): video_response(row["video_id"], [{"id": row["category_id"], "name": "Drama"}]),
+        }
+
+        for payload in (row, other):
+            handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=payload))
+
+        assert [change.name for change in applied_changes(handler)] == ["Drama", None]
+        handler.codeflix_client.get_videos.assert_called_once_with(
+            ids=[UUID(row["video_id"]), UUID(other["video_id"])],
+        )
+
+    def test_value_is_linked_unnamed_when_the_admin_api_is_down(self, handler: VideoRelationEventHandler) -> None:
+        handler.codeflix_client = create_autospec(CodeflixClient)
+        handler.codeflix_client.get_videos.side_effect = CircuitOpenError("Circuit of codeflix-api is open")
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=category_row()))
+
+        change, = applied_changes(handler)
+        assert change.linked is True
+        assert change.name is None
+
+    def test_dangling_references_are_counted_and_linked_anyway(
+        self,
+        handler: VideoRelationEventHandler,
+        mocker: MockFixture,
+    ) -> None:
+        metrics = mocker.patch("src.infra.kafka.video_relation_event_handler.registry", MetricsRegistry())
+        known, dangling = category_row(), category_row()
+        handler.references = IdIndex()
+        handler.references.add("categories", known["category_id"])
+
+        for row in (known, dangling):
+            handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=row))
+
+        assert metrics.counter("ingestion_dangling_references_total", table="categories") == 1
+        assert len(applied_changes(handler)) == 2
+
+    def test_deleted_row_unlinks_its_value(self, handler: VideoRelationEventHandler) -> None:
+        row = category_row()
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.DELETE, payload=row, before=row))
+
+        change, = applied_changes(handler)
+        assert change.linked is False
+        assert change.value == row["category_id"]
+
+    def test_updated_row_unlinks_the_previous_value_then_links_the_new_one(
+        self,
+        handler: VideoRelationEventHandler,
+    ) -> None:
+        before, after = category_row(), category_row()
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.UPDATE, payload=after, before=before, after=after))
+
+        assert [(str(change.video_id), change.value, change.linked) for change in applied_changes(handler)] == [
+            (before["video_id"], before["category_id"], False),
+            (after["video_id"], after["category_id"], True),
+        ]
+
+    def test_replaced_banner_is_overwritten(self, handler: VideoRelationEventHandler) -> None:
+        before = banner_row()
+        after = {**before, "raw_location": "https://banner.com/2"}
+
+        handler(ParsedEvent(entity=VideoBanner, operation=Operation.UPDATE, payload=after, before=before, after=after))
+
+        change, = applied_changes(handler)
+        assert (change.field, change.value, change.multiple) == ("banner_url", "https://banner.com/2", False)
+
+    @pytest.mark.parametrize("key", [{"id": 1}, {"video_id": str(uuid4()), "category_id": str(uuid4())}])
+    def test_tombstones_are_skipped(self, handler: VideoRelationEventHandler, key: dict) -> None:
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.DELETE, payload=key, tombstone=True))
+        handler.flush()
+
+        handler.use_case.execute_many.assert_not_called()
+
+    def test_changes_are_written_in_batches_in_order(self, handler: VideoRelationEventHandler) -> None:
+        handler.batch_size = 2
+        row = category_row()
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=row))
+        handler.use_case.execute_many.assert_not_called()
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.DELETE, payload=row))
+
+        changes = handler.use_case.execute_many.call_args.kwargs["changes"]
+        assert [change.linked for change in changes] == [True, False]
+
+    def test_when_write_fails_then_keep_changes_for_next_flush(self, handler: VideoRelationEventHandler) -> None:
+        handler.use_case.execute_many.side_effect = [ConnectionError, None]
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.CREATE, payload=category_row()))
+
+        with pytest.raises(ConnectionError):
+            handler.flush()
+        handler.flush()
+
+        assert handler.use_case.execute_many.call_count == 2
+        assert handler.use_case.execute_many.call_args_list[0] == handler.use_case.execute_many.call_args_list[1]
+
+    def test_snapshot_rows_are_linked_in_bulk(self, handler: VideoRelationEventHandler) -> None:
+        rows = [category_row(), category_row()]
+
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.READ, payload=rows[0], snapshot="first"))
+        handler(ParsedEvent(entity=VideoCategory, operation=Operation.READ, payload=rows[1], snapshot="last"))
+
+        changes = handler.use_case.execute_many.call_args.kwargs["changes"]
+        assert [change.value for change in changes] == [row["category_id"] for row in rows]
+        assert all(change.linked for change in changes)
@@ -1,8 +1,11 @@
 import logging
+from uuid import UUID
 
+from src.application.delete_video import DeleteVideo, DeleteVideoInput
 from src.application.save_video import SaveVideoInput, SaveVideo
 from src.domain.video import Rating
-from src.infra.codeflix_client.http_client import HttpClient
+from src.infra.codeflix_client.cached_client import shared_client
+from src.infra.elasticsearch.bulk_load import BulkLoadSettings
 from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
 from src.infra.kafka.abstract_event_handler import AbstractEventHandler
 from src.infra.kafka.parser import ParsedEvent
@@ -11,14 +14,47 @@ logger = logging.getLogger(__name__)
 
 
 class VideoEventHandler(AbstractEventHandler):  # Similar to a View in Django
-    def __init__(self, save_use_case: SaveVideo | None = None):
-        self.save_use_case = save_use_case or SaveVideo(
-            repository=ElasticsearchVideoRepository(),
-            codeflix_client=HttpClient(),
-        )
+    # Columns of the videos table that end up in the index. Relations and the banner live in other tables,
+    # see VideoRelationEventHandler
+    projected_fields = frozenset({"title", "launch_year", "rating", "is_active"})
+    # Streaming changes are buffered, coalesced per video and written in batches of this size
+    batch_size = 500
+
+    def __init__(
+        self,
+        save_use_case: SaveVideo | None = None,
+        delete_use_case: DeleteVideo | None = None,
+        bulk_load: BulkLoadSettings | None = None,
+    ):
+        """
+        :param save_use_case: Use case that saves the videos
+        :param delete_use_case: Use case that deletes the videos
+        :param bulk_load: Index settings switched to bulk load mode while a snapshot is loaded
+        """
+        super().__init__()
+        if save_use_case is None or delete_use_case is None:
+            repository = ElasticsearchVideoRepository()
+            save_use_case = save_use_case or SaveVideo(repository=repository)
+            # Deleted videos are evicted from the responses of the admin API cached for their relations
+            codeflix_client = shared_client()
+            delete_use_case = delete_use_case or DeleteVideo(
+                repository=repository,
+                invalidations=[codeflix_client.invalidate] if codeflix_client else None,
+            )
+            bulk_load = bulk_load or BulkLoadSettings(
+                client=repository.client,
+                index=repository.index,
+                alias=repository.INDEX,
+            )
+        self.save_use_case = save_use_case
+        self.delete_use_case = delete_use_case
+        self.bulk_load = bulk_load
+        # Latest change of each video: a deletion, or a save of the given fields, None meaning the whole row
+        self._pending: dict[UUID, tuple[SaveVideoInput | DeleteVideoInput, frozenset[str] | None]] = {}
 
-    def _handle_update_or_create(self, event: ParsedEvent) -> None:
-        input = SaveVideoInput(
+    @staticmethod
+    def _to_input(event: ParsedEvent) -> SaveVideoInput:
+        return SaveVideoInput(
             id=event.payload["id"],
             title=event.payload["title"],
             launch_year=event.payload["launch_year"],
@@ -26,17 +62,74 @@ class VideoEventHandler(AbstractEventHandler):  # Similar to a View in Django
             created_at=event.payload["created_at"],
             updated_at=event.payload["updated_at"],
             is_active=event.payload["is_active"],
+            version=event.version,
         )
-        self.save_use_case.execute(input=input)
+
+    def _buffer(self, input: SaveVideoInput | DeleteVideoInput, fields: frozenset[str] | None = None) -> None:
+        previous = self._pending.get(input.id)
+        if previous is not None and isinstance(input, SaveVideoInput):
+            # Only the latest change is written, its row holds the fields of the previous ones: a pending save
+            # of the whole row (or re-creation) stays whole, partial updates add up their fields
+            previous_input, previous_fields = previous
+            if isinstance(previous_input, DeleteVideoInput) or previous_fields is None or fields is None:
+                fields = None
+            else:
+                fields = previous_fields | fields
+        self._pending[input.id] = (input, fields)
+        if len(self._pending) >= self.batch_size:
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        chunks, self._pending = self.chunks(list(self._pending.items())), {}
+        for index, chunk in enumerate(chunks):
+            try:
+                self._write(dict(chunk))
+            except Exception:
+                # Written again on the next flush, the external versions make it idempotent
+                self._pending = {video_id: change for chunk in chunks[index:] for video_id, change in chunk}
+                raise
+
+    def _write(self, pending: dict[UUID, tuple[SaveVideoInput | DeleteVideoInput, frozenset[str] | None]]) -> None:
+        deletes = [input for input, _ in pending.values() if isinstance(input, DeleteVideoInput)]
+        saves = [input for input, fields in pending.values() if isinstance(input, SaveVideoInput) and fields is None]
+        updates = [(input, fields) for input, fields in pending.values() if fields is not None]
+        if deletes:
+            self.delete_use_case.execute_many(inputs=deletes)
+        if saves:
+            self.save_use_case.execute_many(inputs=saves)
+        if updates:
+            self.save_use_case.execute_partial_many(updates=updates)
+
+    def flush(self) -> None:
+        super().flush()
+        self._flush_pending()
 
     def handle_created(self, event: ParsedEvent) -> None:
         logger.info(f"Creating video with payload: {event.payload}")
-        self._handle_update_or_create(event)
+        self._buffer(self._to_input(event))
 
     def handle_updated(self, event: ParsedEvent) -> None:
         logger.info(f"Updating video with payload: {event.payload}")
-        self._handle_update_or_create(event)
+        # When the changed fields are known, only those are written. The repository falls back to the whole
+        # row for a document that does not hold it yet, e.g. created by the relations streamed before it
+        self._buffer(self._to_input(event), fields=self.changed_projected_fields(event))
 
     def handle_deleted(self, event: ParsedEvent) -> None:
-        print(f"Deleting video: {event.payload}")
-        # TODO: implement delete use case
\ No newline at end of file
+        logger.info(f"Deleting video: {event.payload}")
+        # Tombstones come without a version. Video ids are UUIDs, never reused: deleting without a version
+        # cannot remove a newer video, only a document the versioned delete event already removed
+        self._buffer(DeleteVideoInput(id=event.payload["id"], version=event.version))
+
+    def handle_snapshot(self, events: list[ParsedEvent]) -> None:
+        logger.info(f"Loading {len(events)} videos from the snapshot")
+        self.save_use_case.execute_many(inputs=[self._to_input(event) for event in events])
+
+    def begin_snapshot(self) -> None:
+        if self.bulk_load is not None:
+            self.bulk_load.apply()
+
+    def end_snapshot(self) -> None:
+        if self.bulk_load is not None:
+            self.bulk_load.restore()
@@ -0,0 +1,146 @@
+import logging
+
+import httpx
+
+from src.application.update_video_relations import UpdateVideoRelations
+from src.domain.video_relation import VideoRelation, VideoRelationChange
+from src.infra.codeflix_client.cached_client import shared_client
+from src.infra.codeflix_client.codeflix_client import CodeflixClient
+from src.infra.codeflix_client.errors import CodeflixClientError
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+from src.infra.kafka.abstract_event_handler import AbstractEventHandler
+from src.infra.kafka.parser import ParsedEvent
+from src.infra.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Fields of the videos holding the ids of named entities, listed with their names by the admin API
+NAMED = frozenset({"categories", "genres", "cast_members"})
+
+
+class VideoRelationEventHandler(AbstractEventHandler):
+    """
+    Keeps the categories, genres, cast members and banner of the indexed videos current from the rows of
+    the tables linking them to the videos, so videos need no call to the admin API to be enriched.
+
+    Linked categories, genres and cast members are named from the state store. When a name is not there yet,
+    e.g. its row is streamed behind the link, it is fetched from the admin API if one is configured.
+    """
+    # Changes are buffered and written in batches of this size, a single update per video
+    batch_size = 500
+
+    def __init__(
+        self,
+        use_case: UpdateVideoRelations | None = None,
+        codeflix_client: CodeflixClient | None = None,
+    ) -> None:
+        """
+        :param use_case: Use case that links and unlinks the values of the video relations
+        :param codeflix_client: Admin API client the names missing from the state store are fetched from
+        """
+        super().__init__()
+        if use_case is None:
+            use_case = UpdateVideoRelations(repository=ElasticsearchVideoRepository())
+            codeflix_client = codeflix_client or shared_client()
+        self.use_case = use_case
+        self.codeflix_client = codeflix_client
+        # Changes are applied in the order they were streamed: unlinking then linking back a value must keep it
+        self._pending: list[VideoRelationChange] = []
+
+    def _change(self, event: ParsedEvent, row: dict, linked: bool) -> VideoRelationChange:
+        relation: VideoRelation = event.entity.model_validate(row)
+        if linked:
+            self._check_reference(relation)
+        return VideoRelationChange(
+            video_id=relation.video_id,
+            field=relation.video_field,
+            value=relation.value,
+            linked=linked,
+            multiple=relation.multiple,
+            name=self._name(relation) if linked else None,
+            version=event.version,
+        )
+
+    def _check_reference(self, relation: VideoRelation) -> None:
+        if self.references is None or relation.related_table is None:
+            return
+        if not self.references.contains(relation.related_table, relation.value):
+            # Linked anyway: the row may still be on its way, its topic being consumed behind this one
+            registry.inc("ingestion_dangling_references_total", table=relation.related_table)
+            logger.warning(f"Video {relation.video_id} references missing {relation.related_table} {relation.value}")
+
+    def _name(self, relation: VideoRelation) -> str | None:
+        # Copied into the video when known locally. Otherwise, it is fetched with the video from the admin API
+        # or written by the rename cascade of the entity
+        if self.state_store is None or relation.related_table is None:
+            return None
+        row = self.state_store.get(relation.related_table, relation.value)
+        return row.get("name") if row else None
+
+    def _name_from_admin_api(self, changes: list[VideoRelationChange]) -> None:
+        """Names the linked values the state store did not know, from the videos served by the admin API."""
+        unnamed = [change for change in changes if change.linked and change.name is None and change.field in NAMED]
+        if self.codeflix_client is None or not unnamed:
+            return
+        try:
+            # One round trip per chunk of videos for the whole batch, videos that no longer exist are left out
+            videos = self.codeflix_client.get_videos(ids=[change.video_id for change in unnamed])
+        except (CodeflixClientError, httpx.HTTPError) as e:
+            # Names are optional: the links are written without them, the rename cascade fills them in
+            logger.warning(f"Could not name {len(unnamed)} linked values from the admin API: {e!r}")
+            return
+        for change in unnamed:
+            if change.video_id in videos:
+                names = {str(item["id"]): item.get("name") for item in getattr(videos[change.video_id], change.field)}
+                change.name = names.get(change.value)
+
+    def _buffer(self, changes: list[VideoRelationChange]) -> None:
+        self._pending.extend(changes)
+        if len(self._pending) >= self.batch_size:
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        chunks, self._pending = self.chunks(self._pending), []
+        for index, chunk in enumerate(chunks):
+            try:
+                self._name_from_admin_api(chunk)
+                self.use_case.execute_many(changes=chunk)
+            except Exception:
+                # Applied again on the next flush, the versions of the changes make it idempotent
+                self._pending = [change for chunk in chunks[index:] for change in chunk] + self._pending
+                raise
+
+    def flush(self) -> None:
+        super().flush()
+        self._flush_pending()
+
+    def handle_created(self, event: ParsedEvent) -> None:
+        logger.info(f"Linking {event.entity.__name__}: {event.payload}")
+        self._buffer([self._change(event, event.payload, linked=True)])
+
+    def handle_updated(self, event: ParsedEvent) -> None:
+        logger.info(f"Updating {event.entity.__name__}: {event.payload}")
+        changes = [self._change(event, event.payload, linked=True)]
+        if event.before is not None:
+            previous = self._change(event, event.before, linked=False)
+            # A banner replaced by the update is overwritten by the link of the new one
+            if previous.video_id != changes[0].video_id or (previous.multiple and previous.value != changes[0].value):
+                changes.insert(0, previous)
+        self._buffer(changes)
+
+    def handle_deleted(self, event: ParsedEvent) -> None:
+        if event.tombstone:
+            # Its delete event already unlinked the row. Tombstones of the link tables carry both ids in their
+            # key, but no version: unlinking again could not be ordered against later changes of the row
+            logger.debug(f"Skipping {event.entity.__name__} tombstone: {event.payload}")
+            return
+        logger.info(f"Unlinking {event.entity.__name__}: {event.payload}")
+        self._buffer([self._change(event, event.payload, linked=False)])
+
+    def handle_snapshot(self, events: list[ParsedEvent]) -> None:
+        logger.info(f"Loading {len(events)} video relations from the snapshot")
+        changes = [self._change(event, event.payload, linked=True) for event in events]
+        self._name_from_admin_api(changes)
+        self.use_case.execute_many(changes=changes)
@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Mapping
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+type Labels = tuple[tuple[str, str], ...]
+type MetricKey = tuple[str, Labels]
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        # One counter per bucket, plus the +Inf one
+        self.counts = self.counts or [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class Snapshot:
+    counters: dict[MetricKey, float] = field(default_factory=dict)
+    gauges: dict[MetricKey, float] = field(default_factory=dict)
+    histograms: dict[MetricKey, Histogram] = field(default_factory=dict)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process metrics, rendered in the Prometheus text format.
+    Snapshots are plain picklable data, so they can be shipped across processes and merged.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data = Snapshot()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._data.counters[key] = self._data.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._data.gauges[(name, _labels(labels))] = value
+
+    def clear(self, name: str) -> None:
+        with self._lock:
+            for metrics in (self._data.counters, self._data.gauges, self._data.histograms):
+                for key in [key for key in metrics if key[0] == name]:
+                    del metrics[key]
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._data.histograms.get(key)
+            if histogram is None:
+                histogram = self._data.histograms[key] = Histogram(buckets=buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at, **labels)
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self._data.counters.get((name, _labels(labels)), 0.0)
+
+    def gauge(self, name: str, **labels: str) -> float | None:
+        return self._data.gauges.get((name, _labels(labels)))
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            return Snapshot(
+                counters=dict(self._data.counters),
+                gauges=dict(self._data.gauges),
+                histograms={
+                    key: Histogram(buckets=h.buckets, counts=list(h.counts), sum=h.sum, count=h.count)
+                    for key, h in self._data.histograms.items()
+                },
+            )
+
+    def render(self) -> str:
+        return render(self.snapshot())
+
+
+def merge(snapshots: Mapping[str, Snapshot], label: str = "worker") -> Snapshot:
+    """
+    Merges the metrics of several processes, e.g. the workers of the consumer supervisor, keyed by their name.
+    Counters and histograms are summed. Gauges are not: the batch sizes or backpressure states of two workers
+    do not add up. They are kept per process, under the `label` label.
+    """
+    merged = Snapshot()
+    for process, snapshot in snapshots.items():
+        for key, value in snapshot.counters.items():
+            merged.counters[key] = merged.counters.get(key, 0.0) + value
+        for (name, labels), value in snapshot.gauges.items():
+            merged.gauges[(name, tuple(sorted((*labels, (label, process)))))] = value
+        for key, histogram in snapshot.histograms.items():
+            target = merged.histograms.setdefault(key, Histogram(buckets=histogram.buckets))
+            target.counts = [a + b for a, b in zip(target.counts, histogram.counts)]
+            target.sum += histogram.sum
+            target.count += histogram.count
+    return merged
+
+
+def render(snapshot: Snapshot) -> str:
+    lines = []
+    for kind, metrics in (("counter", snapshot.counters), ("gauge", snapshot.gauges)):
+        for name in sorted({name for name, _ in metrics}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric_name, labels), value in sorted(metrics.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{_format(labels)} {value}")
+
+    for name in sorted({name for name, _ in snapshot.histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric_name, labels), histogram in sorted(snapshot.histograms.items(), key=lambda item: item[0]):
+            if metric_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format((*labels, ('le', str(bound))))} {cumulative}")
+            lines.append(f"{name}_sum{_format(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format(labels)} {histogram.count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+# Process-wide default registry, like the root logger
+registry = MetricsRegistry()
@@ -0,0 +1,69 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """Serves `/metrics` (Prometheus text format) and `/health` (JSON) from a background thread."""
+
+    def __init__(
+        self,
+        render_metrics: Callable[[], str],
+        health: Callable[[], dict] | None = None,
+        host: str = "0.0.0.0",
+        port: int = 9100,
+    ) -> None:
+        """
+        :param render_metrics: Returns the metrics to expose, e.g. `registry.render`
+        :param health: Returns the health report. The status code is 503 unless its "status" is "ok"
+        :param host: Interface to bind to
+        :param port: Port to listen on, 0 picks a free one
+        """
+        self.render_metrics = render_metrics
+        self.health = health or (lambda: {"status": "ok"})
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on port {self.port}")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    self._reply(200, "text/plain; version=0.0.4", server.render_metrics())
+                elif self.path == "/health":
+                    report = server.health()
+                    self._reply(200 if report.get("status") == "ok" else 503, "application/json", json.dumps(report))
+                else:
+                    self._reply(404, "text/plain", "Not found")
+
+            def _reply(self, status: int, content_type: str, body: str) -> None:
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                # Scrapes every few seconds would flood the logs
+                pass
+
+        return Handler
@@ -0,0 +1,71 @@
+from src.infra.metrics.registry import MetricsRegistry, merge, render
+
+
+class TestMetricsRegistry:
+    def test_counters_are_kept_per_label_set(self) -> None:
+        metrics = MetricsRegistry()
+        metrics.inc("consumer_events_total", entity="Video", operation="c")
+        metrics.inc("consumer_events_total", entity="Video", operation="c")
+        metrics.inc("consumer_events_total", entity="Video", operation="d")
+
+        assert metrics.counter("consumer_events_total", entity="Video", operation="c") == 2
+        assert metrics.counter("consumer_events_total", operation="d", entity="Video") == 1
+
+    def test_clear_removes_every_label_set_of_a_metric(self) -> None:
+        metrics = MetricsRegistry()
+        metrics.set("consumer_lag", 10, partition="0")
+        metrics.set("consumer_lag", 20, partition="1")
+
+        metrics.clear("consumer_lag")
+
+        assert metrics.gauge("consumer_lag", partition="0") is None
+        assert metrics.gauge("consumer_lag", partition="1") is None
+
+    def test_render_histogram_with_cumulative_buckets(self) -> None:
+        metrics = MetricsRegistry()
+        metrics.observe("consumer_commit_batch_size", 3, buckets=(1, 5, 10))
+        metrics.observe("consumer_commit_batch_size", 7, buckets=(1, 5, 10))
+
+        assert metrics.render() == (
+            "# TYPE consumer_commit_batch_size histogram\n"
+            'consumer_commit_batch_size_bucket{le="1"} 0\n'
+            'consumer_commit_batch_size_bucket{le="5"} 1\n'
+            'consumer_commit_batch_size_bucket{le="10"} 2\n'
+            'consumer_commit_batch_size_bucket{le="+Inf"} 2\n'
+            "consumer_commit_batch_size_sum 10.0\n"
+            "consumer_commit_batch_size_count 2\n"
+        )
+
+    def test_time_records_elapsed_seconds(self) -> None:
+        metrics = MetricsRegistry()
+        with metrics.time("ingestion_stage_seconds", stage="parse"):
+            pass
+
+        histogram = metrics.snapshot().histograms[("ingestion_stage_seconds", (("stage", "parse"),))]
+        assert histogram.count == 1
+
+
+class TestMerge:
+    def test_sum_counters_of_every_snapshot(self) -> None:
+        worker_1, worker_2 = MetricsRegistry(), MetricsRegistry()
+        worker_1.inc("consumer_events_total", 3)
+        worker_2.inc("consumer_events_total", 4)
+        worker_1.observe("consumer_flush_seconds", 0.1, buckets=(1,))
+        worker_2.observe("consumer_flush_seconds", 0.2, buckets=(1,))
+
+        merged = merge({"0": worker_1.snapshot(), "1": worker_2.snapshot()})
+
+        assert merged.counters[("consumer_events_total", ())] == 7
+        assert merged.histograms[("consumer_flush_seconds", ())].count == 2
+
+    def test_gauges_are_kept_per_worker(self) -> None:
+        worker_1, worker_2 = MetricsRegistry(), MetricsRegistry()
+        worker_1.set("consumer_batch_size", 500)
+        worker_2.set("consumer_batch_size", 250)
+        worker_1.set("consumer_lag", 5, partition="0")
+
+        output = render(merge({"0": worker_1.snapshot(), "1": worker_2.snapshot()}))
+
+        assert 'consumer_batch_size{worker="0"} 500' in output
+        assert 'consumer_batch_size{worker="1"} 250' in output
+        assert 'consumer_lag{partition="0",worker="0"} 5' in output
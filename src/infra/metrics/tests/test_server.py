@@ -0,0 +1,33 @@
+from typing import Generator
+
+import httpx
+import pytest
+
+from src.infra.metrics.server import MetricsServer
+
+
+@pytest.fixture
+def server() -> Generator[MetricsServer, None, None]:
+    server = MetricsServer(
+        render_metrics=lambda: "consumer_events_total 1.0\n",
+        health=lambda: {"status": "degraded"},
+        host="127.0.0.1",
+        port=0,
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+class TestMetricsServer:
+    def test_serve_metrics(self, server: MetricsServer) -> None:
+        response = httpx.get(f"http://127.0.0.1:{server.port}/metrics")
+
+        assert response.status_code == 200
+        assert response.text == "consumer_events_total 1.0\n"
+
+    def test_when_not_healthy_then_return_service_unavailable(self, server: MetricsServer) -> None:
+        response = httpx.get(f"http://127.0.0.1:{server.port}/health")
+
+        assert response.status_code == 503
+        assert response.json() == {"status": "degraded"}
@@ -0,0 +1,242 @@
+import time
+from datetime import datetime
+from typing import Generator
+from uuid import uuid4
+
+import pytest
+from elasticsearch import Elasticsearch
+
+from src.domain.video import Rating, Video
+from src.domain.video_relation import VideoRelationChange
+from src.infra.elasticsearch import ELASTICSEARCH_HOST_TEST
+from src.infra.elasticsearch.elasticsearch_video_repository import ElasticsearchVideoRepository
+
+
+@pytest.fixture
+def es() -> Generator[Elasticsearch, None, None]:
+    client = Elasticsearch(hosts=[ELASTICSEARCH_HOST_TEST])
+    if not client.indices.exists(index=ElasticsearchVideoRepository.INDEX):
+        client.indices.create(index=ElasticsearchVideoRepository.INDEX)
+
+    yield client
+
+    client.indices.delete(index=ElasticsearchVideoRepository.INDEX)
+
+
+@pytest.fixture
+def godfather() -> Video:
+    return Video(
+        id=uuid4(),
+        title="The Godfather",
+        launch_year=1972,
+        rating=Rating.AGE_18,
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        is_active=True,
+    )
+
+
+def stored_title(es: Elasticsearch, video: Video) -> str:
+    return es.get(index=ElasticsearchVideoRepository.INDEX, id=str(video.id))["_source"]["title"]
+
+
+class TestVersionedWrites:
+    def test_when_saving_an_older_version_then_keep_the_newer_document(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+
+        repository.save(godfather.model_copy(update={"title": "Newer"}), version=20)
+        repository.save(godfather.model_copy(update={"title": "Older"}), version=10)
+
+        assert stored_title(es, godfather) == "Newer"
+
+    def test_when_bulk_saving_older_versions_then_skip_them(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        other = godfather.model_copy(update={"id": uuid4()})
+
+        repository.save(godfather.model_copy(update={"title": "Newer"}), version=20)
+        repository.save_many([godfather, other], versions={godfather.id: 10, other.id: 10})
+
+        assert stored_title(es, godfather) == "Newer"
+        assert stored_title(es, other) == "The Godfather"
+
+    def test_when_updating_with_an_older_version_then_ignore_it(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.save(godfather, version=20)
+
+        assert repository.update(godfather.id, {"title": "Older"}, version=10) is True
+        assert stored_title(es, godfather) == "The Godfather"
+
+        repository.update(godfather.id, {"title": "Newer"}, version=30)
+        assert stored_title(es, godfather) == "Newer"
+
+    def test_version_is_not_returned_by_search(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.save(godfather, version=20)
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+
+        assert repository.search() == [godfather]
+
+
+class TestBulkWrites:
+    def test_save_many_then_delete_many(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es, bulk_chunk_size=1)
+        sequel = godfather.model_copy(update={"id": uuid4(), "title": "The Godfather Part II"})
+
+        repository.save_many([godfather, sequel])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+        assert len(repository.search()) == 2
+
+        repository.delete_many([godfather.id, sequel.id, uuid4()])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+        assert repository.search() == []
+
+    def test_update_many_returns_videos_that_are_not_saved(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.save(godfather)
+        unknown_id = uuid4()
+
+        missing = repository.update_many({godfather.id: {"title": "Updated"}, unknown_id: {"title": "Unknown"}})
+
+        assert missing == {unknown_id}
+        assert stored_title(es, godfather) == "Updated"
+
+    def test_delete_of_missing_video_is_ignored(self, es: Elasticsearch) -> None:
+        ElasticsearchVideoRepository(client=es).delete(uuid4())
+
+
+class TestSearch:
+    def test_search_by_title_with_sort_and_pagination(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        sequel = godfather.model_copy(update={"id": uuid4(), "title": "The Godfather Part II"})
+        other = godfather.model_copy(update={"id": uuid4(), "title": "Casablanca"})
+        repository.save_many([godfather, sequel, other])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+
+        assert repository.search(search="godfather", sort="title", direction="desc") == [sequel, godfather]
+        assert repository.search(sort="title", page=2, per_page=2) == [sequel]
+
+
+def link(video: Video, field: str, value: str, linked: bool = True, version: int | None = None) -> VideoRelationChange:
+    return VideoRelationChange(
+        video_id=video.id,
+        field=field,
+        value=value,
+        linked=linked,
+        multiple=field != "banner_url",
+        version=version,
+    )
+
+
+def stored_video(es: Elasticsearch, video: Video) -> dict:
+    return es.get(index=ElasticsearchVideoRepository.INDEX, id=str(video.id))["_source"]
+
+
+class TestRelations:
+    def test_relations_streamed_before_the_video_are_kept(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        category_id = uuid4()
+
+        repository.update_relations([link(godfather, "categories", str(category_id), version=10)])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+        assert repository.search() == []
+
+        repository.save(godfather, version=20)
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+        assert repository.search() == [godfather.model_copy(update={"categories": {category_id}})]
+
+    def test_link_and_unlink_values(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.save(godfather)
+        action, drama = str(uuid4()), str(uuid4())
+
+        repository.update_relations([
+            link(godfather, "categories", action, version=10),
+            link(godfather, "categories", drama, version=11),
+            link(godfather, "banner_url", "https://banner.com/1", version=12),
+            link(godfather, "categories", action, linked=False, version=13),
+        ])
+
+        assert stored_video(es, godfather)["categories"] == [drama]
+        assert stored_video(es, godfather)["banner_url"] == "https://banner.com/1"
+
+    def test_stale_relation_changes_are_ignored(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.save(godfather)
+        genre = str(uuid4())
+
+        repository.update_relations([link(godfather, "genres", genre, linked=False, version=20)])
+        repository.update_relations([link(godfather, "genres", genre, version=10)])
+
+        assert stored_video(es, godfather)["genres"] == []
+
+    def test_saving_the_video_row_keeps_its_relations(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        cast_member = str(uuid4())
+        repository.save(godfather, version=10)
+        repository.update_relations([link(godfather, "cast_members", cast_member, version=11)])
+
+        repository.save(godfather.model_copy(update={"title": "Updated"}), version=12)
+
+        assert stored_video(es, godfather)["cast_members"] == [cast_member]
+        assert stored_video(es, godfather)["title"] == "Updated"
+
+    def test_partial_update_of_a_video_only_holding_relations_writes_its_whole_row(
+        self,
+        es: Elasticsearch,
+        godfather: Video,
+    ) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        repository.update_relations([link(godfather, "categories", str(uuid4()), version=10)])
+
+        repository.update_many({godfather.id: {"title": "Updated"}}, versions={godfather.id: 20}, videos={
+            godfather.id: godfather.model_copy(update={"title": "Updated"}),
+        })
+
+        assert stored_video(es, godfather)["launch_year"] == 1972
+        assert stored_video(es, godfather)["title"] == "Updated"
+
+    def test_unlinking_from_a_missing_video_does_not_create_it(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+
+        repository.update_relations([link(godfather, "categories", str(uuid4()), linked=False, version=10)])
+
+        assert not es.exists(index=ElasticsearchVideoRepository.INDEX, id=str(godfather.id))
+
+
+def wait_for_tasks(repository: ElasticsearchVideoRepository) -> None:
+    while repository.tasks.progress:
+        time.sleep(0.1)
+        repository.tasks.poll()
+
+
+class TestRename:
+    def test_rename_category_in_its_videos(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        category_id = uuid4()
+        repository.save(godfather)
+        repository.update_relations([
+            VideoRelationChange(video_id=godfather.id, field="categories", value=str(category_id), linked=True, name="Drama"),
+        ])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+
+        repository.rename_relation("categories", category_id, "Dramas", version=10)
+        wait_for_tasks(repository)
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+
+        assert stored_video(es, godfather)["category_names"] == [{"id": str(category_id), "name": "Dramas", "version": 10}]
+        assert repository.search(search="dramas") == [godfather.model_copy(update={"categories": {category_id}})]
+
+    def test_older_rename_is_ignored(self, es: Elasticsearch, godfather: Video) -> None:
+        repository = ElasticsearchVideoRepository(client=es)
+        genre_id = uuid4()
+        repository.save(godfather)
+        repository.update_relations([link(godfather, "genres", str(genre_id))])
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+
+        repository.rename_relation("genres", genre_id, "Newer", version=20)
+        wait_for_tasks(repository)
+        es.indices.refresh(index=ElasticsearchVideoRepository.INDEX)
+        repository.rename_relation("genres", genre_id, "Older", version=10)
+        wait_for_tasks(repository)
+
+        assert stored_video(es, godfather)["genre_names"][0]["name"] == "Newer"
@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock, create_autospec
+from uuid import uuid4
+
+from src.application.delete_video import DeleteVideo, DeleteVideoInput
+from src.domain.video_repository import VideoRepository
+
+
+class TestDeleteVideo:
+    def test_delete_video_and_invalidate_caches(self) -> None:
+        repository = create_autospec(VideoRepository)
+        invalidate = MagicMock()
+        input = DeleteVideoInput(id=uuid4(), version=10)
+
+        DeleteVideo(repository=repository, invalidations=[invalidate]).execute(input)
+
+        repository.delete.assert_called_once_with(input.id, version=10)
+        invalidate.assert_called_once_with(input.id)
+
+    def test_delete_many_videos_with_a_single_repository_call(self) -> None:
+        repository = create_autospec(VideoRepository)
+        invalidate = MagicMock()
+        versioned, unversioned = DeleteVideoInput(id=uuid4(), version=10), DeleteVideoInput(id=uuid4())
+
+        DeleteVideo(repository=repository, invalidations=[invalidate]).execute_many([versioned, unversioned])
+
+        repository.delete_many.assert_called_once_with([versioned.id, unversioned.id], versions={versioned.id: 10})
+        assert [call.args[0] for call in invalidate.call_args_list] == [versioned.id, unversioned.id]
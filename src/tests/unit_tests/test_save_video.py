@@ -0,0 +1,64 @@
+from datetime import datetime
+from unittest.mock import create_autospec
+from uuid import uuid4
+
+import pytest
+
+from src.application.save_video import SaveVideo, SaveVideoInput
+from src.domain.video import Rating, Video
+from src.domain.video_repository import VideoRepository
+
+
+class TestSaveVideoPartial:
+    @pytest.fixture
+    def input(self) -> SaveVideoInput:
+        return SaveVideoInput(
+            id=uuid4(),
+            title="The Godfather",
+            launch_year=1972,
+            rating=Rating.AGE_18,
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 2, 1),
+            is_active=True,
+        )
+
+    def test_update_only_the_given_fields(self, input: SaveVideoInput) -> None:
+        repository = create_autospec(VideoRepository)
+
+        SaveVideo(repository=repository).execute_partial_many(updates=[(input, frozenset({"title"}))])
+
+        updates = repository.update_many.call_args.args[0]
+        assert updates == {input.id: {"title": "The Godfather", "updated_at": "2024-02-01T00:00:00"}}
+
+    def test_whole_row_is_given_for_videos_without_one(self, input: SaveVideoInput) -> None:
+        repository = create_autospec(VideoRepository)
+
+        SaveVideo(repository=repository).execute_partial_many(updates=[(input, frozenset({"title"}))])
+
+        videos = repository.update_many.call_args.kwargs["videos"]
+        assert videos[input.id].model_dump() == Video(**input.model_dump(exclude={"version"})).model_dump()
+
+
+class TestSaveVideoMany:
+    def test_save_the_video_rows_with_a_single_write(self) -> None:
+        repository = create_autospec(VideoRepository)
+        inputs = [
+            SaveVideoInput(
+                id=uuid4(),
+                title=title,
+                launch_year=1972,
+                rating=Rating.AGE_18,
+                created_at=datetime(2024, 1, 1),
+                updated_at=datetime(2024, 2, 1),
+                is_active=True,
+                version=version,
+            )
+            for title, version in (("The Godfather", 1), ("The Godfather II", None))
+        ]
+
+        SaveVideo(repository=repository).execute_many(inputs)
+
+        videos, = repository.save_many.call_args.args
+        assert [video.title for video in videos] == ["The Godfather", "The Godfather II"]
+        assert videos[0].categories == set() and videos[0].banner_url is None
+        assert repository.save_many.call_args.kwargs == {"versions": {inputs[0].id: 1}}